@@ -0,0 +1,10 @@
+"""
+Runs the ExpressYeaself command line interface, i.e.:
+    python -m expressyeaself --help
+"""
+import sys
+
+from expressyeaself.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
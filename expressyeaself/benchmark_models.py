@@ -0,0 +1,269 @@
+"""
+This script contains a benchmark of the inference latency and
+throughput of the saved models in MODELS_TO_USE. Each available model
+is loaded, for each runtime and thread count, in a new process (so
+that its load is cold and its peak memory is its own), and run on
+synthetic sequences over a sweep of batch sizes, on the CPU. The
+results are written to a comparison table.
+"""
+from expressyeaself.utilities import atomic_open as atomic_open
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import (get_saved_model_path as
+                                      get_saved_model_path)
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import MODELS_TO_USE as MODELS_TO_USE
+import numpy as np
+import os
+import time
+
+RUNTIMES = ['numpy', 'tensorflow']
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                    'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS']
+COLUMNS = ['model', 'runtime', 'threads', 'batch_size', 'load_s',
+           'first_ms', 'p50_ms', 'p99_ms', 'seqs_per_second', 'peak_rss_mb']
+
+
+def make_synthetic_seqs(num_seqs, len_seq, seed=0):
+    """
+    Returns a list of random nucleotide sequences.
+    """
+    random_state = np.random.RandomState(seed)
+    bases = np.array(list('ATGC'))
+    seqs = bases[random_state.randint(0, 4, size=(num_seqs, len_seq))]
+
+    return [''.join(seq) for seq in seqs]
+
+
+def get_peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process, in
+    MB.
+    """
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, and in kB elsewhere
+    if sys.platform == 'darwin':
+        peak /= 1024
+
+    return peak / 1024
+
+
+def load_model_for_benchmark(saved_model, runtime, num_threads):
+    """
+    Loads a saved model into the NumPy runtime, or into TensorFlow
+    limited to the CPU and to 'num_threads' threads.
+    """
+    if runtime == 'numpy':
+        import expressyeaself.numpy_inference as numpy_inference
+        return numpy_inference.load_numpy_model(saved_model)
+    import expressyeaself.construct_neural_net as construct
+    import tensorflow as tf
+    config = tf.ConfigProto(intra_op_parallelism_threads=num_threads,
+                            inter_op_parallelism_threads=num_threads,
+                            device_count={'GPU': 0})
+    tf.keras.backend.set_session(tf.Session(config=config))
+
+    return construct.load_saved_model(saved_model)
+
+
+def benchmark_model(saved_model, runtime='numpy', num_threads=1,
+                    batch_sizes=(1, 32, 256, 1024), num_batches=20,
+                    seed=0):
+    """
+    Benchmarks one saved model in the current process: the time to
+    load it, the latency of its first prediction (of a single
+    sequence) and, for each batch size, the latencies of predicting
+    'num_batches' batches of synthetic sequences after a warm-up
+    batch. Runs in a new process in benchmark_models, so that the
+    load is cold.
+
+    Args:
+    -----
+        saved_model (str) -- the absolute path of the saved .hdf5
+        model.
+
+        runtime (str) -- 'numpy' or 'tensorflow'. Default: 'numpy'.
+
+        num_threads (int) -- the number of threads TensorFlow may
+        use. The NumPy runtime's threads are set by the environment
+        it is started in. Default: 1.
+
+        batch_sizes (tuple) -- the batch sizes (int) to time.
+        Default: (1, 32, 256, 1024).
+
+        num_batches (int) -- the number of batches timed for each
+        batch size. Default: 20.
+
+        seed (int) -- the seed of the synthetic sequences.
+        Default: 0.
+
+    Returns:
+    -----
+        results (list) -- a dict for each batch size, with the
+        load time in seconds ('load_s'), the first prediction's
+        latency ('first_ms'), the median and 99th percentile batch
+        latencies ('p50_ms', 'p99_ms'), the sequences predicted per
+        second and the peak resident memory of the process so far
+        ('peak_rss_mb').
+    """
+    # Assertions
+    assert runtime in RUNTIMES, 'runtime must be one of %s.' % (RUNTIMES)
+    assert isinstance(num_batches, int) and num_batches > 0, 'num_batches \
+    must be a positive integer.'
+    # Functionality
+    import expressyeaself.construct_neural_net as construct
+    t0 = time.perf_counter()
+    model = load_model_for_benchmark(saved_model, runtime, num_threads)
+    load_s = time.perf_counter() - t0
+    seqs = make_synthetic_seqs(max(batch_sizes), model.input_shape[1], seed)
+    t0 = time.perf_counter()
+    construct.get_batch_predictions(model, seqs[:1], batch_size=1)
+    first_ms = 1000 * (time.perf_counter() - t0)
+    results = []
+    for batch_size in sorted(batch_sizes):
+        batch = seqs[:batch_size]
+        construct.get_batch_predictions(model, batch, batch_size=batch_size)
+        latencies = []
+        for i in range(0, num_batches):
+            t0 = time.perf_counter()
+            construct.get_batch_predictions(model, batch,
+                                            batch_size=batch_size)
+            latencies.append(time.perf_counter() - t0)
+        latencies = 1000 * np.array(latencies)
+        results.append({'batch_size': batch_size, 'load_s': load_s,
+                        'first_ms': first_ms,
+                        'p50_ms': np.percentile(latencies, 50),
+                        'p99_ms': np.percentile(latencies, 99),
+                        'seqs_per_second': 1000 * batch_size /
+                        max(latencies.mean(), 1e-9),
+                        'peak_rss_mb': get_peak_rss_mb()})
+
+    return results
+
+
+def run_in_new_process(num_threads, *args):
+    """
+    Runs benchmark_model in a new process, with the thread count
+    environment variables of the BLAS libraries set to 'num_threads'
+    and no GPUs visible.
+    """
+    import multiprocessing
+    env = {name: os.environ.get(name) for name in
+           THREAD_VARIABLES + ['CUDA_VISIBLE_DEVICES']}
+    os.environ.update({name: str(num_threads) for name in THREAD_VARIABLES})
+    os.environ['CUDA_VISIBLE_DEVICES'] = ''
+    try:
+        # Spawned, so the new process imports NumPy with these settings
+        pool = multiprocessing.get_context('spawn').Pool(1)
+    finally:
+        for name, value in env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    try:
+        results = pool.apply(benchmark_model, (args[0], args[1],
+                                               num_threads) + args[2:])
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+
+def format_table(rows):
+    """
+    Formats the benchmark results into a tab separated table, one
+    line per model, runtime, thread count and batch size.
+    """
+    lines = ['\t'.join(COLUMNS)]
+    for row in rows:
+        lines.append('%s\t%s\t%d\t%d\t%.3f\t%.2f\t%.3f\t%.3f\t%.1f\t%.1f' %
+                     tuple(row[column] for column in COLUMNS))
+    table = '\n'.join(lines)
+
+    return table
+
+
+def benchmark_models(models=None, runtimes=('numpy',),
+                     batch_sizes=(1, 32, 256, 1024), thread_counts=None,
+                     num_batches=20, out_path=None, seed=0):
+    """
+    Benchmarks the inference of each available saved model, for
+    each runtime and thread count, over a sweep of batch sizes (see
+    benchmark_model), and writes a comparison table. Models whose
+    saved file is missing, or that can't be run with a runtime, are
+    skipped with a message.
+
+    Args:
+    -----
+        models (list) -- the models (str) to benchmark, each one of
+        MODELS_TO_USE or the absolute path of a saved .hdf5 model.
+        Default: None (all of MODELS_TO_USE).
+
+        runtimes (tuple) -- the runtimes (str) to benchmark, 'numpy'
+        and/or 'tensorflow'. Default: ('numpy',).
+
+        batch_sizes (tuple) -- the batch sizes (int) to time.
+        Default: (1, 32, 256, 1024).
+
+        thread_counts (tuple) -- the thread counts (int) to time.
+        Default: None (1 and the number of CPUs).
+
+        num_batches (int) -- the number of batches timed for each
+        batch size. Default: 20.
+
+        out_path (str) -- the absolute path of the output table.
+        Default: None (a time stamped file in
+        expressyeaself/models/benchmarks/ under the work directory).
+
+        seed (int) -- the seed of the synthetic sequences.
+        Default: 0.
+
+    Returns:
+    -----
+        out_path (str) -- the absolute path of the table.
+
+        table (str) -- the comparison table (see format_table).
+    """
+    # Assertions
+    for runtime in runtimes:
+        assert runtime in RUNTIMES, 'runtime must be one of %s.' % (RUNTIMES)
+    assert len(batch_sizes) > 0, 'At least one batch size must be given.'
+    # Functionality
+    if models is None:
+        models = MODELS_TO_USE
+    if thread_counts is None:
+        thread_counts = sorted(set([1, os.cpu_count() or 1]))
+    if out_path is None:
+        out_path = get_output_path('expressyeaself/models/benchmarks/' +
+                                   get_time_stamp() + '_benchmark.txt')
+    rows = []
+    for model in models:
+        name = model
+        if model in MODELS_TO_USE:
+            model = get_saved_model_path(model)
+        else:
+            name = os.path.splitext(os.path.basename(model))[0]
+        if not os.path.exists(model):
+            print('Skipping %s: no saved model at %s' % (name, model))
+            continue
+        for runtime in runtimes:
+            for num_threads in thread_counts:
+                try:
+                    results = run_in_new_process(num_threads, model, runtime,
+                                                 tuple(batch_sizes),
+                                                 num_batches, seed)
+                except Exception as e:
+                    print('Skipping %s with the %s runtime: %s' %
+                          (name, runtime, e))
+                    break
+                for result in results:
+                    rows.append(dict(result, model=name, runtime=runtime,
+                                     threads=num_threads))
+    table = format_table(rows)
+    with atomic_open(out_path, 'w') as outfile:
+        outfile.write(table + '\n')
+
+    return out_path, table
@@ -5,15 +5,16 @@ For example: ATGCATGC inserted into AAAANNNNNNNNTTTT would give
 AAAAATGCATGCTTTT.
 """
 import expressyeaself.organize_data as organize
+from expressyeaself.utilities import atomic_open as atomic_open
 from expressyeaself.utilities import check_valid_line as check_valid_line
+from expressyeaself.utilities import get_output_path as get_output_path
 from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import ROOT_DIR as ROOT_DIR
 from expressyeaself.utilities import (separate_seq_and_el_data as
                                       separate_seq_and_el_data)
 from expressyeaself.utilities import smart_open as smart_open
 import os
 
-ROOT_DIR = os.getcwd()[:os.getcwd().rfind('Express')] + 'ExpressYeaself/'
-
 
 def remove_flanks_from_seq(oligo_seq, scaffold_type='pTpA'):
     """
@@ -109,10 +110,10 @@ def remove_flanks_from_all_seqs(input_seqs, scaffold_type='pTpA'):
     time_stamp = get_time_stamp()  # Get unique time stamp for file naming
     relative_path = ('example/' + scaffold_type + '_data/' + time_stamp +
                      '_' + scaffold_type + '_seqs_flanks_removed.txt')
-    absolute_path = os.path.join(ROOT_DIR, relative_path)
+    absolute_path = get_output_path(relative_path)
     # Opening the input and output files.
     infile = smart_open(input_seqs, 'r')
-    outfile = smart_open(absolute_path, 'w')
+    outfile = atomic_open(absolute_path, 'w')
     # Remove flanks and write data to output file.
     for line in infile:
         line = check_valid_line(line)
@@ -199,10 +200,10 @@ def insert_all_seq_into_one_scaffold(input_seqs, scaffold_type='pTpA'):
     time_stamp = get_time_stamp()  # get time stamp for unique file naming
     relative_path = ('example/' + scaffold_type + '_data/' + time_stamp +
                      '_' + scaffold_type + '_seqs_inserted_into_scaffold.txt')
-    absolute_path = os.path.join(ROOT_DIR, relative_path)
+    absolute_path = get_output_path(relative_path)
     # Open input and output files
     infile = smart_open(input_seqs, 'r')
-    outfile = smart_open(absolute_path, 'w')
+    outfile = atomic_open(absolute_path, 'w')
     # Retrieve the scaffold sequence
     scaff_directory = 'example/' + scaffold_type + '_data/'
     scaff_rel_path = scaff_directory + scaffold_type + '_scaffold.txt'
@@ -264,7 +265,7 @@ def pad_sequences(input_seqs, pad_front=False, extra_padding=0):
     # Functionality
     # Define and open the output file
     absolute_path = input_seqs.replace('.txt', '_padded.txt')
-    outfile = smart_open(absolute_path, 'w')
+    outfile = atomic_open(absolute_path, 'w')
     # Retrieve input sequences, pad them, and write them to output file
     max_length, _, _ = organize.get_max_min_mode_length_of_seqs(input_seqs)
     pad_length = max_length + extra_padding
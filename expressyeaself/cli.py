@@ -0,0 +1,638 @@
+"""
+This script contains the command line interface of ExpressYeaself,
+so the data processing, encoding, training and prediction steps
+can be run (and scheduled) without the interactive notebooks, i.e.:
+    python -m expressyeaself process raw_data.txt --scaffold-type pTpA
+    python -m expressyeaself encode processed.txt --method K-mer
+    python -m expressyeaself train processed.txt --model ridge
+    cat seqs.txt | python -m expressyeaself predict - --sort
+Heavy dependencies are only imported by the subcommand that needs
+them, so startup stays fast.
+"""
+import argparse
+import collections
+import contextlib
+import os
+import shutil
+import sys
+
+BYTES_PER_RAW_SEQ = 200  # memory used per distinct sequence when merging
+BYTES_PER_SEQ = 16000  # memory used per ~100 bp encoded sequence in a batch
+LINEAR_MODELS = ['ridge', 'logistic']
+NEURAL_MODELS = ['1d_cnn_sequential', 'lstm_sequential_2d']
+
+worker_predict = None  # the predict function of each worker process
+
+
+def get_batch_size(memory_mb, bytes_per_item, default, minimum=1):
+    """
+    Returns the number of items that fit into a memory budget.
+
+    Args:
+    -----
+        memory_mb (int) -- the memory budget in MB, or None.
+
+        bytes_per_item (int) -- the approximate memory used per item.
+
+        default (int) -- the number of items to return if no memory
+        budget is given.
+
+        minimum (int) -- the smallest number of items to return.
+        Default: 1.
+
+    Returns:
+    -----
+        batch_size (int) -- the number of items.
+    """
+    # Functionality
+    if memory_mb is None:
+        return default
+    batch_size = max(minimum, int(memory_mb * 2 ** 20 // bytes_per_item))
+
+    return batch_size
+
+
+def read_input_to_file(input_seqs, name):
+    """
+    Returns the path of an input file, first copying standard input
+    to a file in example/processed_data/ (under the work directory)
+    if 'input_seqs' is '-'.
+
+    Args:
+    -----
+        input_seqs (str) -- the path of the input file, or '-'.
+
+        name (str) -- the name the copy of standard input is given,
+        after its time stamp.
+
+    Returns:
+    -----
+        input_path (str) -- the absolute path of the input file.
+
+        is_copy (bool) -- whether the file is a copy of standard
+        input, to be removed when no longer needed.
+    """
+    from expressyeaself.utilities import atomic_open as atomic_open
+    from expressyeaself.utilities import get_output_path as get_output_path
+    from expressyeaself.utilities import get_time_stamp as get_time_stamp
+    # Functionality
+    if input_seqs != '-':
+        return os.path.abspath(input_seqs), False
+    input_path = get_output_path('example/processed_data/' +
+                                 get_time_stamp() + '_' + name)
+    with atomic_open(input_path, 'wb') as outfile:
+        shutil.copyfileobj(sys.stdin.buffer, outfile)
+
+    return input_path, True
+
+
+def write_output_file(path, output):
+    """
+    Writes the contents of a file to the output: standard output if
+    'output' is '-', otherwise the given path (if it is not None).
+    """
+    from expressyeaself.utilities import atomic_open as atomic_open
+    from expressyeaself.utilities import smart_open as smart_open
+    if output is None:
+        return
+    if output == '-':
+        with smart_open(path, 'rb') as infile:
+            shutil.copyfileobj(infile, sys.stdout.buffer)
+        sys.stdout.flush()
+    else:
+        with open(path, 'rb') as infile, atomic_open(output, 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+
+
+def run_process(args):
+    """
+    Runs the 'process' subcommand: process_data.process_raw_data.
+    """
+    import expressyeaself.process_data as process
+    input_path, is_copy = read_input_to_file(args.input_seqs,
+                                             'stdin_raw_data.txt')
+    max_seqs = get_batch_size(args.memory_mb, BYTES_PER_RAW_SEQ, 5000000)
+    # Progress reports go to stderr, so stdout can carry the data
+    with contextlib.redirect_stdout(sys.stderr):
+        processed_data = process.process_raw_data(
+            input_path, scaffold_type=args.scaffold_type,
+            percentile=args.percentile, binarize_els=not args.no_binarize,
+            homogeneous=args.homogeneous, deflank=not args.no_deflank,
+            insert_into_scaffold=not args.no_scaffold,
+            extra_padding=args.extra_padding, pad_front=args.pad_front,
+            report_loss=not args.quiet, report_times=not args.quiet,
+            remove_files=not args.keep_files,
+            create_sample_of_size=args.sample_size,
+            deduplicate=args.deduplicate, aggregate=args.aggregate,
+            max_seqs_in_memory=max_seqs)
+    if is_copy:
+        os.remove(input_path)
+    write_output_file(processed_data, args.output)
+    print(processed_data, file=sys.stderr)
+
+    return processed_data
+
+
+def run_encode(args):
+    """
+    Runs the 'encode' subcommand: encodes a processed file with
+    encode_sequences.encode_sequences_with_method and saves the
+    encoded sequences and expression levels to an .npz cache.
+    """
+    import expressyeaself.encode_sequences as encode
+    import numpy as np
+    input_path, is_copy = read_input_to_file(args.input_seqs,
+                                             'stdin_processed_data.txt')
+    encoded_seqs, exp_levels, abs_max_el = encode.encode_sequences_with_method(
+        input_path, method=args.method, model_type=args.model_type,
+        binarized_els=args.binarized, k=args.k, num_workers=args.workers,
+        num_targets=args.num_targets)
+    if is_copy:
+        os.remove(input_path)
+    output = args.output
+    if output is None:
+        output = os.path.splitext(input_path)[0] + '_encoded.npz'
+    if args.method == 'K-mer':
+        # Same layout as scipy.sparse.save_npz, so load_npz can read it
+        np.savez(output, format=np.array('csr'), shape=encoded_seqs.shape,
+                 data=encoded_seqs.data, indices=encoded_seqs.indices,
+                 indptr=encoded_seqs.indptr, exp_levels=exp_levels,
+                 abs_max_el=abs_max_el)
+    else:
+        np.savez(output, encoded_seqs=encoded_seqs, exp_levels=exp_levels,
+                 abs_max_el=abs_max_el)
+    print(output, file=sys.stderr)
+
+    return output
+
+
+def run_train(args):
+    """
+    Runs the 'train' subcommand: trains a linear baseline
+    (construct_linear_model) or one of the neural network
+    architectures (construct_neural_net) on a processed file, and
+    saves the trained model.
+    """
+    input_path, is_copy = read_input_to_file(args.input_seqs,
+                                             'stdin_processed_data.txt')
+    batch_size = get_batch_size(args.memory_mb, BYTES_PER_SEQ,
+                                args.batch_size)
+    if args.model in LINEAR_MODELS:
+        import expressyeaself.construct_linear_model as linear
+        from expressyeaself.utilities import atomic_open as atomic_open
+        import pickle
+        task = 'regression' if args.model == 'ridge' else 'classification'
+        model, scores = linear.train_linear_model(
+            input_path, task=task, method=args.method, k=args.k,
+            epochs=args.epochs, batch_size=batch_size, seed=args.seed)
+        output = args.output or args.model + '_model.pkl'
+        with atomic_open(output, 'wb') as f:
+            pickle.dump({'model': model, 'method': args.method, 'k': args.k},
+                        f)
+    elif args.checkpoint_dir or args.warm_start:
+        import expressyeaself.train_model as train_model
+        model_type = '1d_cnn' if args.model == '1d_cnn_sequential' else 'lstm'
+        model, state = train_model.train_with_checkpoints(
+            input_path, checkpoint_dir=args.checkpoint_dir,
+            model_type=model_type, warm_start=args.warm_start,
+            learning_rate=args.learning_rate, epochs=args.epochs,
+            batch_size=min(batch_size, 1024), num_targets=args.num_targets,
+            seed=args.seed or 0)
+        scores = 'Values: loss: ' + str(state['history'][-1])
+        output = args.output or args.model + '_model.hdf5'
+        model.save(output)
+    else:
+        import expressyeaself.construct_neural_net as construct
+        import expressyeaself.encode_sequences as encode
+        encoded_seqs, exp_levels, _ = encode.encode_sequences_with_method(
+            input_path, binarized_els=args.binarized,
+            num_targets=args.num_targets)
+        if args.model == '1d_cnn_sequential':
+            model = construct.build_1d_cnn_sequential(
+                encoded_seqs.shape[1], num_outputs=args.num_targets)
+        else:
+            model = construct.build_lstm_sequential_2d(
+                encoded_seqs.shape[1], num_outputs=args.num_targets)
+        hist = model.fit(encoded_seqs, exp_levels, epochs=args.epochs,
+                         batch_size=min(batch_size, 1024),
+                         validation_split=0.2, verbose=2)
+        scores = ('Values: ' + ' '.join(name + ': ' + str(values[-1]) for
+                                        name, values in hist.history.items()))
+        output = args.output or args.model + '_model.hdf5'
+        model.save(output)
+    if is_copy:
+        os.remove(input_path)
+    print(scores, file=sys.stderr)
+    print(output, file=sys.stderr)
+
+    return output
+
+
+def load_predictor(model, runtime, all_targets=False, mc_samples=None):
+    """
+    Loads a model for the 'predict' subcommand, returning a function
+    that maps a batch of sequences to their predictions (or, if
+    'all_targets=True', to the predictions of every target of a
+    multi-output model, from one forward pass). If 'mc_samples' is
+    given, each prediction is the mean of that many Monte Carlo
+    dropout samples followed by their standard deviation.
+    """
+    import expressyeaself.utilities as utilities
+    if model.endswith('.pkl'):
+        assert mc_samples is None, 'Monte Carlo dropout needs a neural \
+        model.'
+        import expressyeaself.construct_linear_model as linear
+        import pickle
+        with open(model, 'rb') as f:
+            saved = pickle.load(f)
+
+        def predict(seqs):
+            features = linear.featurize_seqs(seqs, saved['method'],
+                                             saved['k'])
+            if hasattr(saved['model'], 'predict_proba'):
+                return saved['model'].predict_proba(features)[:, 1]
+            return saved['model'].predict(features)
+
+        return predict, None
+    import expressyeaself.construct_neural_net as construct
+    import numpy as np
+    if model in utilities.MODELS_TO_USE:
+        model = utilities.get_saved_model_path(model)
+    if runtime == 'numpy':
+        import expressyeaself.numpy_inference as numpy_inference
+        loaded_model = numpy_inference.load_numpy_model(model)
+    else:
+        loaded_model = construct.load_saved_model(model)
+    mc_dropout_fn = None
+    if mc_samples is not None and \
+            not hasattr(loaded_model, 'predict_mc_dropout'):
+        # Split the Keras model once, not once per batch
+        mc_dropout_fn = construct.get_keras_mc_dropout_fn(loaded_model)
+
+    def predict(seqs, cache=None, fingerprint=None):
+        if mc_samples is not None:
+            mean, std = construct.get_mc_dropout_predictions(
+                loaded_model, seqs, num_samples=mc_samples,
+                mc_dropout_fn=mc_dropout_fn)
+            mean, std = mean.reshape(len(seqs), -1), std.reshape(len(seqs),
+                                                                 -1)
+            if not all_targets:
+                mean, std = mean[:, :1], std[:, :1]
+            return np.hstack([mean, std])
+        if all_targets:
+            return construct.get_multi_target_predictions(loaded_model, seqs)
+        return construct.get_batch_predictions(loaded_model, seqs, cache,
+                                               fingerprint)
+
+    return predict, model
+
+
+def predict_worker_init(model, runtime, all_targets=False, mc_samples=None):
+    """
+    Loads the model of a 'predict' worker process.
+    """
+    global worker_predict
+    worker_predict = load_predictor(model, runtime, all_targets,
+                                    mc_samples)[0]
+
+
+def predict_worker(seqs):
+    """
+    Predicts a batch of sequences in a 'predict' worker process.
+    """
+    return seqs, worker_predict(seqs)
+
+
+def run_predict(args):
+    """
+    Runs the 'predict' subcommand: predicts the expression level of
+    every sequence in the input, streaming batches of sequences from
+    the input file (or standard input) to the output file (or
+    standard output), in the prediction results format. If '--sort'
+    is given, all predictions are held and written in descending
+    order, as by construct_neural_net.get_predictions_for_input_file.
+    If '--top-k' or '--bottom-k' is given, only that many of the
+    highest and lowest predictions are held (see
+    construct_neural_net.RankedPredictions) and written in the same
+    format.
+    """
+    from expressyeaself.utilities import atomic_open as atomic_open
+    from expressyeaself.utilities import read_seq_batches as read_seq_batches
+    from expressyeaself.utilities import smart_open as smart_open
+    import numpy as np
+    batch_size = get_batch_size(args.memory_mb, BYTES_PER_SEQ,
+                                args.batch_size)
+    if args.input_seqs == '-':
+        infile = sys.stdin
+    else:
+        infile = smart_open(args.input_seqs, 'r')
+    if args.output is None or args.output == '-':
+        outfile = sys.stdout
+    else:
+        outfile = atomic_open(args.output, 'w')
+    cache = None
+    predict, saved_model = load_predictor(args.model, args.runtime,
+                                          args.all_targets, args.mc_samples)
+    if args.cache is not None and saved_model is not None and \
+            not args.all_targets and args.mc_samples is None:
+        from expressyeaself.prediction_cache import PredictionCache
+        from expressyeaself.prediction_cache import get_model_fingerprint
+        cache = PredictionCache(args.cache)
+        fingerprint = get_model_fingerprint(saved_model)
+    batches = read_seq_batches(infile, batch_size)
+    if args.workers > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(args.workers,
+                                    initializer=predict_worker_init,
+                                    initargs=(args.model, args.runtime,
+                                              args.all_targets,
+                                              args.mc_samples))
+        # Keep at most 2 batches per worker in flight, in input order.
+        pending = collections.deque()
+
+        def results():
+            for seqs in batches:
+                pending.append(pool.apply_async(predict_worker, (seqs,)))
+                if len(pending) >= 2 * args.workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+    else:
+        pool = None
+
+        def results():
+            for seqs in batches:
+                if cache is not None:
+                    yield seqs, predict(seqs, cache, fingerprint)
+                else:
+                    yield seqs, predict(seqs)
+    if args.all_targets or args.mc_samples is not None:
+        # One tab separated column per target (and standard deviation)
+        def to_str(pred):
+            return '\t'.join(map(str, pred))
+    else:
+        to_str = str
+    ranked = None
+    if args.top_k is not None or args.bottom_k is not None:
+        from expressyeaself.construct_neural_net import RankedPredictions
+        ranked = RankedPredictions(args.top_k or 0, args.bottom_k or 0)
+    try:
+        held = []
+        for seqs, predictions in results():
+            if ranked is not None:
+                # Ranked by the first column, as with --sort
+                predictions = np.asarray(predictions)
+                ranked.add(predictions.reshape(len(seqs), -1)[:, 0],
+                           list(zip(seqs, predictions)))
+            elif args.sort:
+                held.extend(zip(predictions, seqs))
+            else:
+                outfile.write(''.join(seq + '\t' + to_str(pred) + '\n' for
+                                      seq, pred in zip(seqs, predictions)))
+        if args.sort:
+            order = sorted(range(len(held)),
+                           key=lambda i: -np.ravel(held[i][0])[0])
+            outfile.write(''.join(str(i) + '\t' + held[i][1] + '\t' +
+                                  to_str(held[i][0]) + '\n' for i in order))
+        if ranked is not None:
+            outfile.write(''.join(str(i) + '\t' + seq + '\t' + to_str(pred) +
+                                  '\n' for i, _, (seq, pred) in
+                                  ranked.get_ranked()))
+    except BaseException:
+        # Leave no partial results file behind
+        if outfile is not sys.stdout:
+            outfile.discard()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if cache is not None:
+            print('Prediction cache hit rate: %.1f%%' %
+                  (100 * cache.get_hit_rate()), file=sys.stderr)
+            cache.close()
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+        else:
+            outfile.flush()
+
+    return
+
+
+def run_prune(args):
+    """
+    Runs the 'prune' subcommand: prunes a saved neural model with
+    prune_model.prune_saved_model, saves it and prints the table
+    comparing it to the original model.
+    """
+    import expressyeaself.prune_model as prune_model
+    output, table = prune_model.prune_saved_model(
+        args.model, args.input_seqs, amount=args.amount,
+        fine_tune_epochs=args.epochs, out_path=args.output,
+        eval_seqs=args.eval_seqs)
+    print(table)
+    print(output, file=sys.stderr)
+
+    return output
+
+
+def run_benchmark(args):
+    """
+    Runs the 'benchmark' subcommand: benchmarks the inference of the
+    saved models with benchmark_models.benchmark_models and prints
+    the comparison table.
+    """
+    import expressyeaself.benchmark_models as benchmark_models
+    output, table = benchmark_models.benchmark_models(
+        models=args.models, runtimes=args.runtimes,
+        batch_sizes=args.batch_sizes, thread_counts=args.threads,
+        num_batches=args.num_batches, out_path=args.output)
+    print(table)
+    print(output, file=sys.stderr)
+
+    return output
+
+
+def build_parser():
+    """
+    Builds the argument parser of the command line interface.
+
+    Returns:
+    -----
+        parser (argparse.ArgumentParser) -- the argument parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog='expressyeaself',
+        description='Process promoter data, encode it, train models and '
+                    'predict expression levels.')
+    parser.add_argument('--work-dir', default=None,
+                        help='directory that output and intermediate files '
+                             'are written under (default: the '
+                             'EXPRESSYEASELF_WORK_DIR environment variable, '
+                             'else the repository)')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='write intermediate files to a temporary '
+                             'directory in memory, removed on exit')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    memory = {'type': int, 'default': None, 'metavar': 'MB',
+              'help': 'memory budget, used to size batches and buffers'}
+    # process
+    sub = subparsers.add_parser('process', help='process raw data')
+    sub.add_argument('input_seqs', help="raw data file, or '-' for stdin")
+    sub.add_argument('-o', '--output', default=None,
+                     help="copy of the processed file, or '-' for stdout")
+    sub.add_argument('--scaffold-type', required=True,
+                     choices=['pTpA', 'Abf1TATA'])
+    sub.add_argument('--percentile', type=float, default=None)
+    sub.add_argument('--no-binarize', action='store_true')
+    sub.add_argument('--homogeneous', action='store_true')
+    sub.add_argument('--no-deflank', action='store_true')
+    sub.add_argument('--no-scaffold', action='store_true',
+                     help='do not insert sequences into the scaffold')
+    sub.add_argument('--extra-padding', type=int, default=0)
+    sub.add_argument('--pad-front', action='store_true')
+    sub.add_argument('--sample-size', type=int, default=None)
+    sub.add_argument('--deduplicate', action='store_true')
+    sub.add_argument('--aggregate', default='mean', choices=['mean', 'median'])
+    sub.add_argument('--keep-files', action='store_true',
+                     help='keep intermediate files')
+    sub.add_argument('--quiet', action='store_true',
+                     help='do not write loss and time reports')
+    sub.add_argument('--memory-mb', **memory)
+    sub.set_defaults(func=run_process)
+    # encode
+    sub = subparsers.add_parser('encode', help='encode a processed file')
+    sub.add_argument('input_seqs', help="processed file, or '-' for stdin")
+    sub.add_argument('-o', '--output', default=None, help='.npz cache path')
+    sub.add_argument('--method', default='One-Hot',
+                     choices=['One-Hot', 'K-mer', 'Integer'])
+    sub.add_argument('--model-type', default='1DCNN',
+                     choices=['1DCNN', '1DLOCCON', 'LSTM'])
+    sub.add_argument('--binarized', action='store_true')
+    sub.add_argument('-k', type=int, default=6)
+    sub.add_argument('--workers', type=int, default=1)
+    sub.add_argument('--num-targets', type=int, default=1,
+                     help='number of expression levels after each sequence')
+    sub.set_defaults(func=run_encode)
+    # train
+    sub = subparsers.add_parser('train', help='train a model')
+    sub.add_argument('input_seqs', help="processed file, or '-' for stdin")
+    sub.add_argument('-o', '--output', default=None, help='model path')
+    sub.add_argument('--model', default='ridge',
+                     choices=LINEAR_MODELS + NEURAL_MODELS)
+    sub.add_argument('--method', default='K-mer', choices=['K-mer', 'One-Hot'],
+                     help='features of the linear models')
+    sub.add_argument('-k', type=int, default=6)
+    sub.add_argument('--binarized', action='store_true')
+    sub.add_argument('--epochs', type=int, default=1)
+    sub.add_argument('--batch-size', type=int, default=10000)
+    sub.add_argument('--seed', type=int, default=None)
+    sub.add_argument('--memory-mb', **memory)
+    sub.add_argument('--checkpoint-dir', default=None,
+                     help='checkpoint the neural models here, and resume '
+                     'from the last checkpoint if there is one')
+    sub.add_argument('--warm-start', default=None,
+                     help='saved model (or one of MODELS_TO_USE) to '
+                     'fine-tune, instead of training a new model')
+    sub.add_argument('--learning-rate', type=float, default=None)
+    sub.add_argument('--num-targets', type=int, default=1,
+                     help='number of expression levels after each sequence, '
+                     'all learned by one multi-output neural model')
+    sub.set_defaults(func=run_train)
+    # predict
+    sub = subparsers.add_parser('predict', help='predict expression levels')
+    sub.add_argument('input_seqs', help="sequence file, or '-' for stdin")
+    sub.add_argument('-o', '--output', default=None,
+                     help='results file (default: stdout)')
+    sub.add_argument('--model', default='1d_cnn_sequential',
+                     help='one of MODELS_TO_USE, or the path of a saved '
+                          '.hdf5 or linear .pkl model')
+    sub.add_argument('--runtime', default='numpy',
+                     choices=['numpy', 'tensorflow'])
+    sub.add_argument('--sort', action='store_true',
+                     help='write predictions in descending order')
+    sub.add_argument('--cache', default=None,
+                     help='path of a prediction cache database')
+    sub.add_argument('--batch-size', type=int, default=1024)
+    sub.add_argument('--workers', type=int, default=1,
+                     help='number of processes (the cache is not used if '
+                          'more than 1)')
+    sub.add_argument('--memory-mb', **memory)
+    sub.add_argument('--all-targets', action='store_true',
+                     help='write the prediction of every target of a '
+                     'multi-output model, tab separated (sorted by the '
+                     'first)')
+    sub.add_argument('--mc-samples', type=int, default=None,
+                     help='write the mean and standard deviation of this '
+                          'many Monte Carlo dropout samples of each '
+                          'prediction (not cached)')
+    sub.add_argument('--top-k', type=int, default=None,
+                     help='write only this many of the highest predictions, '
+                          'in descending order, holding no more than that '
+                          'in memory')
+    sub.add_argument('--bottom-k', type=int, default=None,
+                     help='also write this many of the lowest predictions, '
+                          'after the highest')
+    sub.set_defaults(func=run_predict)
+    # prune
+    sub = subparsers.add_parser('prune', help='prune a saved neural model')
+    sub.add_argument('model', help='one of MODELS_TO_USE, or the path of a '
+                                   'saved .hdf5 model')
+    sub.add_argument('input_seqs', help='processed file to fine-tune on')
+    sub.add_argument('-o', '--output', default=None, help='pruned model path')
+    sub.add_argument('--amount', type=float, default=0.5,
+                     help='fraction of the filters and units of each layer '
+                          'to remove')
+    sub.add_argument('--epochs', type=int, default=1,
+                     help='epochs of fine-tuning after pruning')
+    sub.add_argument('--eval-seqs', default=None,
+                     help='processed file to evaluate the models on')
+    sub.set_defaults(func=run_prune)
+    # benchmark
+    sub = subparsers.add_parser('benchmark',
+                                help='benchmark the inference of the saved '
+                                     'models')
+    sub.add_argument('--models', nargs='+', default=None,
+                     help='models of MODELS_TO_USE, or paths of saved .hdf5 '
+                          'models (default: all of MODELS_TO_USE)')
+    sub.add_argument('--runtimes', nargs='+', default=['numpy'],
+                     choices=['numpy', 'tensorflow'])
+    sub.add_argument('--batch-sizes', nargs='+', type=int,
+                     default=[1, 32, 256, 1024])
+    sub.add_argument('--threads', nargs='+', type=int, default=None,
+                     help='thread counts (default: 1 and the number of '
+                          'CPUs)')
+    sub.add_argument('--num-batches', type=int, default=20,
+                     help='batches timed for each batch size')
+    sub.add_argument('-o', '--output', default=None, help='table path')
+    sub.set_defaults(func=run_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    The entry point of the command line interface.
+
+    Args:
+    -----
+        argv (list) -- the command line arguments. Default: None
+        (sys.argv[1:]).
+    """
+    from expressyeaself.utilities import set_work_dir as set_work_dir
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.work_dir is not None or args.in_memory:
+        work_dir = set_work_dir(args.work_dir, in_memory=args.in_memory)
+    try:
+        args.func(args)
+    finally:
+        if args.work_dir is not None or args.in_memory:
+            set_work_dir(None)
+            if args.in_memory:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0
@@ -0,0 +1,357 @@
+"""
+This script contains functions to train and evaluate fast linear
+baseline models (ridge regression, or logistic regression for
+binarized data) on streamed k-mer or One-Hot features, as a
+benchmark for the neural network models.
+"""
+import expressyeaself.encode_sequences as encode
+from expressyeaself.utilities import atomic_open as atomic_open
+from expressyeaself.utilities import check_valid_line as check_valid_line
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import (separate_seq_and_el_data as
+                                      separate_seq_and_el_data)
+from expressyeaself.utilities import smart_open as smart_open
+import itertools
+import numpy as np
+import os
+import pandas as pd
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+
+FEATURES = ['K-mer', 'One-Hot']
+TASKS = ['regression', 'classification']
+INFO_TOKENS = ('number_of_seqs_in_file', 'length_of_each_sequence')
+# scikit-learn renamed the logistic loss from 'log' to 'log_loss'
+LOG_LOSS = 'log_loss' if 'log_loss' in SGDClassifier.loss_functions else 'log'
+
+
+def featurize_seqs(seqs, method='K-mer', k=6):
+    """
+    Encodes a list of nucleotide sequences into a 2D feature matrix
+    for a linear model.
+
+    Args:
+    -----
+        seqs (list) -- the nucleotide sequences (str) to featurize.
+
+        method (str) -- the features to use. Must be one of: 'K-mer'
+        (sparse k-mer counts) or 'One-Hot' (flattened One-Hot
+        encoding). Default: 'K-mer'.
+
+        k (int) -- the length of the k-mers, if 'method=K-mer'.
+        Default: 6.
+
+    Returns:
+    -----
+        features (scipy.sparse.csr_matrix or numpy.ndarray) -- the
+        feature matrix, with one row per sequence.
+    """
+    # Assertions
+    assert method in FEATURES, 'method must be one of %s' % (FEATURES)
+    # Functionality
+    if method == 'K-mer':
+        features = encode.kmer_encode_sequences(seqs, k)
+    else:
+        features = np.array([encode.one_hot_encode_sequence(seq).ravel()
+                             for seq in seqs])
+
+    return features
+
+
+def stream_feature_batches(input_seqs, method='K-mer', k=6,
+                           batch_size=10000):
+    """
+    A generator that streams an input file of sequences and their
+    expression levels (tab separated) in batches, featurizing each
+    batch for a linear model. Invalid lines and the 2 info lines
+    at the top of processed files are skipped.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the input file.
+
+        method (str) -- the features to use, 'K-mer' or 'One-Hot'.
+        Default: 'K-mer'.
+
+        k (int) -- the length of the k-mers, if 'method=K-mer'.
+        Default: 6.
+
+        batch_size (int) -- the number of sequences per batch.
+        Default: 10000.
+
+    Yields:
+    -----
+        features (scipy.sparse.csr_matrix or numpy.ndarray) -- the
+        features of the batch.
+
+        exp_levels (numpy.ndarray) -- the expression levels of the
+        batch.
+
+        seqs (list) -- the sequences of the batch.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str), 'Input file path must be passed \
+    as a string.'
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert isinstance(batch_size, int) and batch_size > 0, 'batch_size must \
+    be a positive integer.'
+    # Functionality
+    with smart_open(input_seqs, 'r') as infile:
+        while True:
+            lines = list(itertools.islice(infile, batch_size))
+            if len(lines) == 0:
+                break
+            seqs = []
+            exp_levels = []
+            for line in lines:
+                line = check_valid_line(line)
+                if line == 'skip_line':
+                    continue
+                seq, exp_level = separate_seq_and_el_data(line)
+                if seq in INFO_TOKENS:
+                    continue
+                seqs.append(seq)
+                exp_levels.append(exp_level)
+            if len(seqs) == 0:
+                continue
+            yield featurize_seqs(seqs, method, k), np.array(exp_levels), seqs
+
+
+def train_linear_model(input_seqs, task='regression', method='K-mer', k=6,
+                       epochs=1, batch_size=10000, validation_split=0.2,
+                       alpha=0.0001, seed=None):
+    """
+    Trains a ridge regression model (or a logistic regression model
+    for binarized expression levels, as made by
+    organize_data.binarize_data) with a mini-batch stochastic
+    gradient descent solver, streaming the input file so the whole
+    data set is never held in memory. A random 'validation_split'
+    fraction of each batch is held out, and used to report
+    validation metrics once training is complete.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the input file of
+        sequences and their expression levels (tab separated).
+
+        task (str) -- 'regression' (ridge) or 'classification'
+        (logistic). Default: 'regression'.
+
+        method (str) -- the features to use, 'K-mer' or 'One-Hot'.
+        Default: 'K-mer'.
+
+        k (int) -- the length of the k-mers, if 'method=K-mer'.
+        Default: 6.
+
+        epochs (int) -- the number of passes over the input file.
+        Default: 1.
+
+        batch_size (int) -- the number of sequences per mini-batch.
+        Default: 10000.
+
+        validation_split (float) -- the fraction of sequences held
+        out for validation. Default: 0.2.
+
+        alpha (float) -- the strength of the L2 regularization.
+        Default: 0.0001.
+
+        seed (int) -- seed for the random state, which controls the
+        validation split and the solver. Default: None.
+
+    Returns:
+    -----
+        model (sklearn.linear_model.SGDRegressor or SGDClassifier)
+        -- the trained model.
+
+        scores (str) -- the validation metrics, in the same form as
+        those reported for the neural network models, i.e.
+        "Values: loss: <###> acc: <$$$>%".
+    """
+    # Assertions
+    assert task in TASKS, 'task must be one of %s' % (TASKS)
+    assert method in FEATURES, 'method must be one of %s' % (FEATURES)
+    assert isinstance(epochs, int) and epochs > 0, 'epochs must be a \
+    positive integer.'
+    assert 0.0 <= validation_split < 1.0, 'validation_split must be \
+    between 0 and 1.'
+    # Functionality
+    if task == 'regression':
+        model = SGDRegressor(penalty='l2', alpha=alpha, random_state=seed)
+    else:
+        model = SGDClassifier(loss=LOG_LOSS, penalty='l2', alpha=alpha,
+                              random_state=seed)
+    for epoch in range(0, epochs):
+        random_state = np.random.RandomState(seed)  # same split each epoch
+        for features, exp_levels, _ in stream_feature_batches(
+                input_seqs, method, k, batch_size):
+            is_train = random_state.rand(len(exp_levels)) >= validation_split
+            if not is_train.any():
+                continue
+            if task == 'regression':
+                model.partial_fit(features[is_train], exp_levels[is_train])
+            else:
+                model.partial_fit(features[is_train],
+                                  exp_levels[is_train].astype(int),
+                                  classes=np.array([0, 1]))
+    # Evaluate on the held out sequences
+    random_state = np.random.RandomState(seed)
+    val_true = []
+    val_pred = []
+    for features, exp_levels, _ in stream_feature_batches(input_seqs, method,
+                                                          k, batch_size):
+        is_val = random_state.rand(len(exp_levels)) < validation_split
+        if not is_val.any():
+            continue
+        val_true.append(exp_levels[is_val])
+        if task == 'regression':
+            val_pred.append(model.predict(features[is_val]))
+        else:
+            val_pred.append(model.predict_proba(features[is_val])[:, 1])
+    scores = evaluate_predictions(np.concatenate(val_true + [[]]),
+                                  np.concatenate(val_pred + [[]]), task)
+
+    return model, scores
+
+
+def evaluate_predictions(true_els, predicted_els, task='regression'):
+    """
+    Computes validation metrics for predicted expression levels,
+    and reports them in the same form as those reported for the
+    neural network models. For regression, the loss is the mean
+    squared error and the mean absolute error is also reported.
+    For classification, the loss is the log loss and the accuracy
+    (with a 0.5 threshold) is also reported.
+
+    Args:
+    -----
+        true_els (numpy.ndarray) -- the measured expression levels.
+
+        predicted_els (numpy.ndarray) -- the predicted expression
+        levels (probabilities of expressing, for classification).
+
+        task (str) -- 'regression' or 'classification'.
+        Default: 'regression'.
+
+    Returns:
+    -----
+        scores (str) -- the validation metrics, i.e.
+        "Values: loss: <###> mae: <$$$>" for regression or
+        "Values: loss: <###> acc: <$$$>%" for classification.
+    """
+    # Assertions
+    assert task in TASKS, 'task must be one of %s' % (TASKS)
+    assert len(true_els) == len(predicted_els), 'Must have a prediction \
+    for every expression level.'
+    # Functionality
+    if len(true_els) == 0:
+        return 'Values: no sequences held out for validation.'
+    if task == 'regression':
+        loss = np.mean((true_els - predicted_els) ** 2)
+        mae = np.mean(np.abs(true_els - predicted_els))
+        scores = 'Values: loss: ' + str(loss) + ' mae: ' + str(mae)
+    else:
+        prob = np.clip(predicted_els, 1e-7, 1 - 1e-7)
+        loss = -np.mean(true_els * np.log(prob) +
+                        (1 - true_els) * np.log(1 - prob))
+        acc = np.mean((prob >= 0.5) == (true_els == 1))
+        scores = ('Values: loss: ' + str(loss) + ' acc: ' + str(acc * 100) +
+                  '%')
+
+    return scores
+
+
+def get_linear_predictions_for_input_file(input_seqs, model, model_name,
+                                          method='K-mer', k=6, sort_df=True,
+                                          write_to_file=False,
+                                          batch_size=10000):
+    """
+    Takes an input file of sequences and returns a DataFrame of the
+    sequences and their expression levels as predicted by a trained
+    linear model, in the same form as the neural network predictions
+    (see construct_neural_net.get_predictions_for_input_file).
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the input file
+        containing sequences to get predictions for, one per line.
+        Anything after a tab on each line, and the info lines at the
+        top of processed files, are ignored.
+
+        model (sklearn.linear_model.SGDRegressor or SGDClassifier)
+        -- the trained linear model.
+
+        model_name (str) -- the name of the model, used to name the
+        output file, i.e. 'ridge_kmer6'.
+
+        method (str) -- the features the model was trained on.
+        Default: 'K-mer'.
+
+        k (int) -- the length of the k-mers the model was trained
+        on, if 'method=K-mer'. Default: 6.
+
+        sort_df (bool) -- whether or not to sort the resulting data
+        frame in descending order based on expression level.
+        Default: True.
+
+        write_to_file (bool) -- whether or not to write the results
+        to the prediction_results directory. Default: False.
+
+        batch_size (int) -- the number of sequences featurized and
+        predicted at a time. Default: 10000.
+
+    Returns:
+    -----
+        results_df (pandas.DataFrame) -- the resulting data frame
+        containing input sequences and predicted expression levels.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert isinstance(model_name, str)
+    assert method in FEATURES, 'method must be one of %s' % (FEATURES)
+    # Functionality
+    seqs = []
+    predictions = []
+    with smart_open(input_seqs, 'r') as infile:
+        while True:
+            lines = list(itertools.islice(infile, batch_size))
+            if len(lines) == 0:
+                break
+            batch = []
+            for line in lines:
+                if isinstance(line, bytes):
+                    line = line.decode()
+                seq = line.rstrip().split('\t')[0]
+                if seq != '' and seq not in INFO_TOKENS:
+                    batch.append(seq)
+            if len(batch) == 0:
+                continue
+            features = featurize_seqs(batch, method, k)
+            if isinstance(model, SGDClassifier):
+                pred = model.predict_proba(features)[:, 1]
+            else:
+                pred = model.predict(features)
+            seqs.extend(batch)
+            predictions.append(pred)
+    results_df = pd.DataFrame({'seq': seqs,
+                               'el_prediction': np.concatenate(predictions +
+                                                               [[]])})
+    if sort_df:
+        results_df = results_df.sort_values('el_prediction', ascending=False)
+        results_df = results_df.reset_index()
+    if write_to_file:
+        out_path = get_output_path('expressyeaself/models/'
+                                   'prediction_results/')
+        stamp = get_time_stamp()
+        filename = stamp + '_' + model_name + '_prediction_results.txt'
+        abs_path = out_path + filename
+        if sort_df:
+            columns = ['index', 'seq', 'el_prediction']
+        else:
+            columns = ['seq', 'el_prediction']
+        with atomic_open(abs_path, 'w') as outfile:
+            results_df.to_csv(outfile, header=None, index=None,
+                              sep='\t', columns=columns)
+        print('Results can be found at: ' + abs_path)
+
+    return results_df
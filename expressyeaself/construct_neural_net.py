@@ -1,23 +1,22 @@
 """
 This script contains functions to aid building, training, testing
-and optimizing a neural network model.
+and optimizing a neural network model. TensorFlow, matplotlib and
+pandas are only imported by the functions that need them, so that
+importing this script is fast.
 """
 import expressyeaself.encode_sequences as encode
+from expressyeaself.prediction_cache import (get_model_fingerprint as
+                                             get_model_fingerprint)
+from expressyeaself.utilities import atomic_open as atomic_open
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import MODELS_TO_USE as MODELS_TO_USE
+from expressyeaself.utilities import (get_saved_model_path as
+                                      get_saved_model_path)
 from expressyeaself.utilities import get_time_stamp as get_time_stamp
-import matplotlib.pyplot as plt
+from expressyeaself.utilities import ROOT_DIR as ROOT_DIR
+import heapq
 import numpy as np
 import os
-import pandas as pd
-import tensorflow  # noqa: F401
-from tensorflow.keras.models import load_model
-
-ROOT_DIR = os.getcwd()[:os.getcwd().rfind('Express')] + 'ExpressYeaself/'
-MODELS_TO_USE = ['1d_cnn_classifier',
-                 '1d_cnn_sequential',
-                 '1d_cnn_parallel',
-                 '1d_loccon_classifier',
-                 'lstm_sequential_2d',
-                 'lstm_sequential_3d']
 
 
 def plot_results(hist):
@@ -33,6 +32,7 @@ def plot_results(hist):
     -----
         plt () --
     """
+    import matplotlib.pyplot as plt
     # Summarize history for accuracy
     plt.subplot(1, 2, 1)
     plt.plot(hist['acc'])
@@ -55,40 +55,239 @@ def plot_results(hist):
     return plt
 
 
-def get_saved_model_path(model_to_use):
+def build_1d_cnn_sequential(len_seq, filters=15, kernel_size=3, strides=1,
+                            dropout=0.5, embedding_dim=None, num_outputs=1):
     """
-    Returns the absolute file path of one of ExpressYeaself's
-    pre-trained models, based on the choice of model to use.
+    Builds and compiles the '1d_cnn_sequential' model architecture:
+    4 Conv1D layers with a max pooling layer between the 2nd and
+    3rd, global average pooling, dropout and a sigmoid output for
+    each target. If 'embedding_dim' is given, the model takes Integer
+    encoded sequences (see encode_sequences.integer_encode_sequence)
+    through an Embedding layer instead of One-Hot encoded ones.
 
     Args:
     -----
-        model_to_use (str) -- the type of pre-existing model to
-        load.
+        len_seq (int) -- the length of the input sequences.
+
+        filters (int) -- the number of filters in each Conv1D
+        layer. Default: 15.
+
+        kernel_size (int) -- the kernel size of each Conv1D layer.
+        Default: 3.
+
+        strides (int) -- the strides of the max pooling layer.
+        Default: 1.
+
+        dropout (float) -- the dropout rate before the output
+        layer. Default: 0.5.
+
+        embedding_dim (int) -- the dimension of the learned base
+        embeddings. Default: None (One-Hot input).
+
+        num_outputs (int) -- the number of targets predicted at
+        once, i.e. the expression levels of each replicate or
+        growth condition. Default: 1.
 
     Returns:
     -----
-        saved_model_json (str) -- the absolute file path of the
-        saved model json file.
+        model (tensorflow.python.keras.engine.
+        sequential.Sequential) -- the compiled model.
+    """
+    # Assertions
+    assert isinstance(len_seq, int), 'len_seq must be an integer.'
+    assert isinstance(embedding_dim, (int, type(None))), 'embedding_dim \
+    must be an integer or None.'
+    # Functionality
+    from tensorflow.keras import regularizers
+    from tensorflow.keras.layers import (Conv1D, Dense, Dropout, Embedding,
+                                         GlobalAveragePooling1D,
+                                         MaxPooling1D)
+    from tensorflow.keras.models import Sequential
+    model = Sequential()
+    if embedding_dim is None:
+        model.add(Conv1D(filters, kernel_size, activation='relu',
+                         input_shape=(len_seq, 5),
+                         kernel_regularizer=regularizers.l2(0.01)))
+    else:
+        model.add(Embedding(len(encode.TOKENS), embedding_dim,
+                            input_length=len_seq))
+        model.add(Conv1D(filters, kernel_size, activation='relu',
+                         kernel_regularizer=regularizers.l2(0.01)))
+    model.add(Conv1D(filters, kernel_size, activation='relu'))
+    model.add(MaxPooling1D(3, strides))
+    model.add(Conv1D(filters, kernel_size, activation='relu'))
+    model.add(Conv1D(filters, kernel_size, activation='relu'))
+    model.add(GlobalAveragePooling1D())
+    model.add(Dropout(dropout))
+    model.add(Dense(num_outputs, activation='sigmoid'))
+    model.compile(loss='mse', optimizer='rmsprop', metrics=['accuracy'])
+
+    return model
 
-        saved_model_weights (str) -- the absolute file path of
-        saved model weights.
+
+def build_1d_cnn_student(len_seq, filters=16, kernel_size=9, pool_size=4,
+                         dense_units=16, num_outputs=1):
+    """
+    Builds and compiles the '1d_cnn_student' model architecture: a
+    small, fast CNN for distilling the larger CNNs into (see
+    distill_model). A single wide Conv1D layer, max pooling to cut
+    the length of the sequence early, a second Conv1D layer, global
+    max pooling and a small Dense layer before a linear output for
+    each target.
+
+    Args:
+    -----
+        len_seq (int) -- the length of the input sequences.
+
+        filters (int) -- the number of filters in each Conv1D
+        layer. Default: 16.
+
+        kernel_size (int) -- the kernel size of the first Conv1D
+        layer (the second is half as wide). Default: 9.
+
+        pool_size (int) -- the size (and strides) of the max
+        pooling layer. Default: 4.
+
+        dense_units (int) -- the number of units in the hidden
+        Dense layer. Default: 16.
+
+        num_outputs (int) -- the number of targets predicted at
+        once. Default: 1.
+
+    Returns:
+    -----
+        model (tensorflow.python.keras.engine.
+        sequential.Sequential) -- the compiled model.
     """
     # Assertions
-    assert isinstance(model_to_use, str)
-    assert model_to_use in MODELS_TO_USE
+    assert isinstance(len_seq, int), 'len_seq must be an integer.'
+    # Functionality
+    from tensorflow.keras.layers import (Conv1D, Dense, GlobalMaxPooling1D,
+                                         MaxPooling1D)
+    from tensorflow.keras.models import Sequential
+    model = Sequential()
+    model.add(Conv1D(filters, kernel_size, activation='relu',
+                     input_shape=(len_seq, 5)))
+    model.add(MaxPooling1D(pool_size))
+    model.add(Conv1D(filters, max(kernel_size // 2, 1), activation='relu'))
+    model.add(GlobalMaxPooling1D())
+    model.add(Dense(dense_units, activation='relu'))
+    model.add(Dense(num_outputs))
+    model.compile(loss='mse', optimizer='rmsprop', metrics=['mae'])
+
+    return model
+
+
+def build_1d_loccon(len_seq, filters=32, kernel_size=5, strides=1,
+                    dropout=0.3, dense_units=10, num_outputs=1):
+    """
+    Builds and compiles the 1D locally connected model architecture
+    of models/1d_loccon/loc_con_1d.py: a LocallyConnected1D layer
+    (unshared weights at each position), a Dense layer applied at
+    each position, dropout, and an output for each target after
+    flattening.
+
+    Args:
+    -----
+        len_seq (int) -- the length of the input sequences.
+
+        filters (int) -- the number of filters in the
+        LocallyConnected1D layer. Default: 32.
+
+        kernel_size (int) -- the kernel size of the
+        LocallyConnected1D layer. Default: 5.
+
+        strides (int) -- the strides of the LocallyConnected1D
+        layer. Default: 1.
+
+        dropout (float) -- the dropout rate before flattening.
+        Default: 0.3.
+
+        dense_units (int) -- the number of units in the hidden
+        Dense layer. Default: 10.
+
+        num_outputs (int) -- the number of targets predicted at
+        once. Default: 1.
+
+    Returns:
+    -----
+        model (tensorflow.python.keras.engine.
+        sequential.Sequential) -- the compiled model.
+    """
+    # Assertions
+    assert isinstance(len_seq, int), 'len_seq must be an integer.'
     # Functionality
-    saved_model = ROOT_DIR + 'expressyeaself/models/'
-    if model_to_use.startswith('1d_cnn'):
-        saved_model += '1d_cnn/'
-        saved_model += 'saved_models/' + model_to_use + '_onehot.hdf5'
-    elif model_to_use.startswith('1d_loccon'):
-        saved_model += '1d_loccon/'
-        saved_model += 'saved_models/' + model_to_use + '_onehot.hdf5'
-    elif model_to_use.startswith('lstm'):
-        saved_model += 'lstm/'
-        saved_model += 'saved_models/' + model_to_use + '_onehot.hdf5'
+    from tensorflow.keras.layers import (Dense, Dropout, Flatten,
+                                         LocallyConnected1D)
+    from tensorflow.keras.models import Sequential
+    model = Sequential()
+    model.add(LocallyConnected1D(filters, kernel_size, strides=strides,
+                                 activation='relu',
+                                 input_shape=(len_seq, 5)))
+    model.add(Dense(dense_units))
+    model.add(Dropout(dropout))
+    model.add(Flatten())
+    model.add(Dense(num_outputs))
+    model.compile(loss='mse', optimizer='rmsprop', metrics=['mae'])
+
+    return model
 
-    return saved_model
+
+def build_lstm_sequential_2d(len_seq, units=100, dense_units=50,
+                             dropout=0.3, embedding_dim=None,
+                             num_outputs=1):
+    """
+    Builds and compiles the 'lstm_sequential_2d' model architecture:
+    an LSTM layer over the base vectors, dropout, and 2 sigmoid
+    Dense layers (the last with an output for each target). If
+    'embedding_dim' is given, the model takes Integer encoded
+    sequences through an Embedding layer that masks the padding
+    token (0), so padded positions are skipped by the LSTM.
+
+    Args:
+    -----
+        len_seq (int) -- the length of the input sequences.
+
+        units (int) -- the number of LSTM units. Default: 100.
+
+        dense_units (int) -- the number of units in the hidden
+        Dense layer. Default: 50.
+
+        dropout (float) -- the dropout rate after the LSTM layer.
+        Default: 0.3.
+
+        embedding_dim (int) -- the dimension of the learned base
+        embeddings. Default: None (One-Hot input).
+
+        num_outputs (int) -- the number of targets predicted at
+        once, i.e. the expression levels of each replicate or
+        growth condition. Default: 1.
+
+    Returns:
+    -----
+        model (tensorflow.python.keras.engine.
+        sequential.Sequential) -- the compiled model.
+    """
+    # Assertions
+    assert isinstance(len_seq, int), 'len_seq must be an integer.'
+    assert isinstance(embedding_dim, (int, type(None))), 'embedding_dim \
+    must be an integer or None.'
+    # Functionality
+    from tensorflow.keras.layers import Dense, Dropout, Embedding, LSTM
+    from tensorflow.keras.models import Sequential
+    model = Sequential()
+    if embedding_dim is None:
+        model.add(LSTM(units, input_shape=(len_seq, 5)))
+    else:
+        model.add(Embedding(len(encode.TOKENS), embedding_dim,
+                            input_length=len_seq, mask_zero=True))
+        model.add(LSTM(units))
+    model.add(Dropout(dropout))
+    model.add(Dense(dense_units, activation='sigmoid'))
+    model.add(Dense(num_outputs, activation='sigmoid'))
+    model.compile(loss='mse', optimizer='rmsprop', metrics=['accuracy'])
+
+    return model
 
 
 def load_saved_model(saved_model):
@@ -108,13 +307,14 @@ def load_saved_model(saved_model):
     assert isinstance(saved_model, str)
     assert os.path.exists(saved_model)
     # Functionality
+    from tensorflow.keras.models import load_model
     # with open(saved_model, 'rb', encoding='utf-8') as f:
     loaded_model = load_model(saved_model)
 
     return loaded_model
 
 
-def get_prediction(loaded_model, sequence):
+def get_prediction(loaded_model, sequence, cache=None, fingerprint=None):
     """
     Predicts the expression level of a given input sequence
     via a pre-loaded model.
@@ -127,19 +327,439 @@ def get_prediction(loaded_model, sequence):
         sequence (str) -- the input nucleotide sequence to
         have its expression level predicted. Assumes correct
         length for loaded model.
+
+        cache (prediction_cache.PredictionCache) -- if given, the
+        model is only run if the prediction is not already cached.
+        Default: None.
+
+        fingerprint (str) -- the fingerprint of the loaded model's
+        saved model file (see prediction_cache.
+        get_model_fingerprint). Required if 'cache' is given.
     """
     # Assertions
     assert isinstance(sequence, str), 'Input seq must be a string.'
+    assert cache is None or isinstance(fingerprint, str), 'A model \
+    fingerprint must be given to use the prediction cache.'
     # Functionality
-    # Encode the sequence via One-Hot encoding
-    encoded_seq = encode.one_hot_encode_sequence(sequence)
+    if cache is not None:
+        prediction = cache.get(fingerprint, sequence)
+        if prediction is not None:
+            return prediction
+    # Encode the sequence via Integer encoding for models taking token
+    # ids through an Embedding layer, otherwise One-Hot encoding.
+    if len(loaded_model.input_shape) == 2:
+        encoded_seq = encode.integer_encode_sequence(sequence)
+    else:
+        encoded_seq = encode.one_hot_encode_sequence(sequence)
     prediction = loaded_model.predict(np.array([encoded_seq]))[0][0]
+    if cache is not None:
+        cache.put(fingerprint, sequence, prediction)
 
     return prediction
 
 
+def get_batch_predictions(loaded_model, seqs, cache=None, fingerprint=None,
+                          batch_size=1024):
+    """
+    Predicts the expression levels of a list of input sequences
+    via a pre-loaded model, in batches. If a prediction cache is
+    given, only the sequences whose predictions are not already
+    cached are run through the model, and their predictions are
+    added to the cache.
+
+    Args:
+    -----
+        loaded_model (tensorflow.python.keras.
+        engine.training.Model) -- the loaded model.
+
+        seqs (list) -- the input nucleotide sequences (str), all of
+        the length the model was trained on.
+
+        cache (prediction_cache.PredictionCache) -- the prediction
+        cache. Default: None.
+
+        fingerprint (str) -- the fingerprint of the loaded model's
+        saved model file. Required if 'cache' is given.
+
+        batch_size (int) -- the batch size passed to predict().
+        Default: 1024.
+
+    Returns:
+    -----
+        predictions (numpy.ndarray) -- the predicted expression
+        level of each sequence.
+    """
+    # Assertions
+    assert isinstance(seqs, list), 'Input seqs must be passed as a list.'
+    assert cache is None or isinstance(fingerprint, str), 'A model \
+    fingerprint must be given to use the prediction cache.'
+    # Functionality
+    if cache is not None:
+        predictions, misses = cache.get_many(fingerprint, seqs)
+    else:
+        predictions = np.zeros(len(seqs))
+        misses = np.arange(len(seqs))
+    if len(misses) > 0:
+        if len(loaded_model.input_shape) == 2:
+            encoder = encode.integer_encode_sequence
+        else:
+            encoder = encode.one_hot_encode_sequence
+        to_score = [seqs[i] for i in misses]
+        pred = loaded_model.predict(np.array([encoder(seq)
+                                              for seq in to_score]),
+                                    batch_size=batch_size)
+        predictions[misses] = pred.reshape(len(misses), -1)[:, 0]
+        if cache is not None:
+            cache.put_many(fingerprint, to_score, predictions[misses])
+
+    return predictions
+
+
+def get_multi_target_predictions(loaded_model, seqs, batch_size=1024):
+    """
+    Predicts every target (i.e. the expression level of each
+    replicate or growth condition) of a multi-output model for a
+    list of input sequences, with a single encoding of the sequences
+    and a single forward pass per batch.
+
+    Args:
+    -----
+        loaded_model (tensorflow.python.keras.
+        engine.training.Model) -- the loaded model (or a model
+        loaded into the NumPy runtime).
+
+        seqs (list) -- the input nucleotide sequences (str), all of
+        the length the model was trained on.
+
+        batch_size (int) -- the batch size passed to predict().
+        Default: 1024.
+
+    Returns:
+    -----
+        predictions (numpy.ndarray) -- the predictions, of shape
+        (num_seqs, num_targets).
+    """
+    # Assertions
+    assert isinstance(seqs, list), 'Input seqs must be passed as a list.'
+    # Functionality
+    if len(loaded_model.input_shape) == 2:
+        encoded_seqs = encode.encode_seqs_to_uint8(seqs, 'Integer')
+    else:
+        encoded_seqs = encode.encode_seqs_to_uint8(seqs).astype(np.float32)
+    predictions = loaded_model.predict(encoded_seqs, batch_size=batch_size)
+    predictions = predictions.reshape(len(seqs), -1)
+
+    return predictions
+
+
+def get_keras_mc_dropout_fn(loaded_model):
+    """
+    Splits a Sequential Keras model at its first Dropout layer into
+    a deterministic prefix and a suffix run with the Dropout layers
+    active (the learning phase set to training), for Monte Carlo
+    dropout. Returns a function mapping a batch of encoded sequences
+    and a number of samples to the suffix's outputs for each sample.
+    """
+    import tensorflow as tf
+    backend = tf.keras.backend
+    layers = loaded_model.layers
+    first = [i for i, layer in enumerate(layers) if
+             isinstance(layer, tf.keras.layers.Dropout)]
+    if not first:
+        raise Exception('Model has no Dropout layers.')
+    first = first[0]
+    prefix = None
+    if first > 0:
+        prefix = backend.function([loaded_model.input],
+                                  [layers[first - 1].output])
+    suffix_input = tf.keras.layers.Input(
+        batch_shape=layers[first].input_shape)
+    out = suffix_input
+    for layer in layers[first:]:
+        out = layer(out)
+    suffix = backend.function([suffix_input, backend.learning_phase()],
+                              [out])
+
+    def mc_dropout_fn(encoded_seqs, num_samples):
+        hidden = encoded_seqs
+        if prefix is not None:
+            hidden = prefix([encoded_seqs])[0]
+        hidden = np.repeat(hidden, num_samples, axis=0)
+        return suffix([hidden, 1])[0]
+
+    return mc_dropout_fn
+
+
+def get_mc_dropout_predictions(loaded_model, seqs, num_samples=30,
+                               batch_size=1024, seed=None,
+                               mc_dropout_fn=None):
+    """
+    Predicts the expression levels of a list of input sequences with
+    Monte Carlo dropout, returning the mean and standard deviation
+    (the uncertainty) of 'num_samples' predictions of each sequence
+    made with the model's Dropout layers active. Rather than calling
+    predict() 'num_samples' times, the layers before the first
+    Dropout layer are run once per batch, their outputs are tiled
+    'num_samples' times and the rest of the model is run once on
+    the tiled batch.
+
+    Args:
+    -----
+        loaded_model (tensorflow.python.keras.
+        engine.training.Model) -- the loaded model (or a model
+        loaded into the NumPy runtime).
+
+        seqs (list) -- the input nucleotide sequences (str), all of
+        the length the model was trained on.
+
+        num_samples (int) -- the number of dropout samples per
+        sequence. Default: 30.
+
+        batch_size (int) -- the number of sequences run through the
+        model at a time. Default: 1024.
+
+        seed (int) -- the seed of the dropout masks (NumPy runtime
+        only). Default: None.
+
+        mc_dropout_fn (function) -- the split of a Keras model made
+        by get_keras_mc_dropout_fn. Each split adds to the
+        TensorFlow graph, so when predicting many batches with the
+        same model, make it once and pass it in. Default: None
+        (made for this call).
+
+    Returns:
+    -----
+        mean (numpy.ndarray) -- the mean prediction of each
+        sequence, of shape (num_seqs,), or (num_seqs, num_targets)
+        for a multi-output model.
+
+        std (numpy.ndarray) -- the standard deviation of the
+        predictions of each sequence.
+    """
+    # Assertions
+    assert isinstance(seqs, list), 'Input seqs must be passed as a list.'
+    assert isinstance(num_samples, int) and num_samples > 0, 'num_samples \
+    must be a positive integer.'
+    # Functionality
+    if len(loaded_model.input_shape) == 2:
+        encoded_seqs = encode.encode_seqs_to_uint8(seqs, 'Integer')
+    else:
+        encoded_seqs = encode.encode_seqs_to_uint8(seqs).astype(np.float32)
+    if hasattr(loaded_model, 'predict_mc_dropout'):
+        mean, std = loaded_model.predict_mc_dropout(
+            encoded_seqs, num_samples, batch_size=batch_size, seed=seed)
+    else:
+        if mc_dropout_fn is None:
+            mc_dropout_fn = get_keras_mc_dropout_fn(loaded_model)
+        means = []
+        stds = []
+        for start in range(0, len(encoded_seqs), batch_size):
+            batch = encoded_seqs[start:start + batch_size]
+            samples = mc_dropout_fn(batch, num_samples)
+            samples = samples.reshape(len(batch), num_samples, -1)
+            means.append(samples.mean(axis=1))
+            stds.append(samples.std(axis=1))
+        mean, std = np.concatenate(means), np.concatenate(stds)
+    if mean.shape[1] == 1:
+        mean, std = mean[:, 0], std[:, 0]
+
+    return mean, std
+
+
+def get_augmented_predictions(loaded_model, encoded_seqs,
+                              reverse_complement=True, shifts=(0,),
+                              batch_size=1024):
+    """
+    Predicts the expression levels of encoded sequences with
+    test-time augmentation, averaging the model's predictions
+    over the original sequences, their reverse complements (if
+    specified) and each of the given positional shifts.
+
+    Args:
+    -----
+        loaded_model (tensorflow.python.keras.
+        engine.training.Model) -- the loaded model.
+
+        encoded_seqs (numpy.ndarray) -- the One-Hot encoded
+        sequences, of shape (num_seqs, len_seq, 5), or the Integer
+        encoded sequences, of shape (num_seqs, len_seq), for models
+        with an Embedding input.
+
+        reverse_complement (bool) -- whether to include the reverse
+        complement of each sequence in the average. Default: True.
+
+        shifts (tuple) -- the positional shifts (int) to include in
+        the average. Default: (0,) (no shifting).
+
+        batch_size (int) -- the batch size passed to predict().
+        Default: 1024.
+
+    Returns:
+    -----
+        predictions (numpy.ndarray) -- the averaged predicted
+        expression level for each sequence.
+    """
+    # Assertions
+    assert isinstance(encoded_seqs, np.ndarray), 'Encoded sequences must \
+    be passed as a numpy array.'
+    assert isinstance(reverse_complement, bool)
+    assert len(shifts) > 0, 'At least one shift must be given.'
+    # Functionality
+    orientations = [False, True] if reverse_complement else [False]
+    predictions = np.zeros(len(encoded_seqs))
+    for rc in orientations:
+        for shift in shifts:
+            augmented = encode.augment_encoded_seqs(
+                encoded_seqs, reverse_complement=rc, shifts=shift)
+            pred = loaded_model.predict(augmented, batch_size=batch_size)
+            predictions += pred.reshape(len(encoded_seqs), -1)[:, 0]
+    predictions /= len(orientations) * len(shifts)
+
+    return predictions
+
+
+class RankedPredictions(object):
+    """
+    Keeps the highest and lowest ranked of a stream of predictions,
+    in two heaps bounded to 'top_k' and 'bottom_k' entries, so its
+    memory does not grow with the number of predictions. Ties are
+    ranked in the order the predictions were added, as by a stable
+    sort.
+
+    Args:
+    -----
+        top_k (int) -- the number of highest predictions kept.
+        Default: 0.
+
+        bottom_k (int) -- the number of lowest predictions kept.
+        Default: 0.
+    """
+    def __init__(self, top_k=0, bottom_k=0):
+        assert top_k >= 0 and bottom_k >= 0, 'top_k and bottom_k must not \
+        be negative.'
+        self.top_k = top_k
+        self.bottom_k = bottom_k
+        # Entries are (score, tie break, index, item), the worst first
+        self.top = []
+        self.bottom = []
+        self.num_seen = 0
+
+    def push(self, heap, k, scores, tie_breaks, indices, items):
+        """
+        Pushes a batch of scores into a bounded heap, keeping its k
+        highest. Only the batch's k highest, and those above the
+        heap's worst entry, are pushed one by one.
+        """
+        if k == 0 or len(scores) == 0:
+            return
+        if len(scores) > k:
+            kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+            candidates = scores >= kth
+        else:
+            candidates = np.ones(len(scores), dtype=bool)
+        if len(heap) == k:
+            candidates &= scores >= heap[0][0]
+        for i in np.nonzero(candidates)[0]:
+            entry = (scores[i], tie_breaks[i], indices[i], items[i])
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+
+        return
+
+    def add(self, scores, items):
+        """
+        Adds a batch of predictions, ranked by 'scores', with an
+        item (i.e. the sequence) for each.
+        """
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        indices = np.arange(self.num_seen, self.num_seen + len(scores))
+        self.num_seen += len(scores)
+        self.push(self.top, self.top_k, scores, -indices, indices, items)
+        self.push(self.bottom, self.bottom_k, -scores, indices, indices,
+                  items)
+
+        return
+
+    def get_ranked(self):
+        """
+        Returns the kept predictions as (index, score, item), in
+        descending order of score: the top ones, then the bottom ones
+        that are not also among the top.
+        """
+        ranked = [(index, score, item) for score, _, index, item in
+                  sorted(self.top, reverse=True)]
+        in_top = set(index for index, _, _ in ranked)
+        ranked += [(index, -score, item) for score, _, index, item in
+                   sorted(self.bottom) if index not in in_top]
+
+        return ranked
+
+
+def get_ranked_predictions(input_seqs, loaded_model, top_k=0, bottom_k=0,
+                           batch_size=1024, cache=None, fingerprint=None):
+    """
+    Predicts the expression levels of the sequences of an input file
+    in batches, streaming the predictions through a
+    RankedPredictions, and returns only the highest and lowest ones.
+    Unlike sorting every prediction, memory is O(top_k + bottom_k)
+    whatever the size of the input file.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the input file, one
+        sequence per line.
+
+        loaded_model (tensorflow.python.keras.
+        engine.training.Model) -- the loaded model.
+
+        top_k (int) -- the number of highest predictions returned.
+        Default: 0.
+
+        bottom_k (int) -- the number of lowest predictions returned.
+        Default: 0.
+
+        batch_size (int) -- the number of sequences read and
+        predicted at a time. Default: 1024.
+
+        cache (prediction_cache.PredictionCache) -- the prediction
+        cache. Default: None.
+
+        fingerprint (str) -- the fingerprint of the loaded model's
+        saved model file. Required if 'cache' is given.
+
+    Returns:
+    -----
+        results_df (pandas.DataFrame) -- the 'index' (the line of the
+        input file, counting from 0), 'seq' and 'el_prediction' of
+        the highest and lowest predictions, in descending order of
+        prediction.
+    """
+    # Assertions
+    assert isinstance(top_k, int) and isinstance(bottom_k, int)
+    assert top_k > 0 or bottom_k > 0, 'top_k or bottom_k must be given.'
+    # Functionality
+    import pandas as pd
+    from expressyeaself.utilities import read_seq_batches as read_seq_batches
+    from expressyeaself.utilities import smart_open as smart_open
+    ranked = RankedPredictions(top_k, bottom_k)
+    with smart_open(input_seqs, 'r') as infile:
+        for seqs in read_seq_batches(infile, batch_size):
+            ranked.add(get_batch_predictions(loaded_model, seqs, cache,
+                                             fingerprint, batch_size), seqs)
+    results_df = pd.DataFrame(ranked.get_ranked(),
+                              columns=['index', 'el_prediction', 'seq'])
+    results_df = results_df[['index', 'seq', 'el_prediction']]
+
+    return results_df
+
+
 def get_predictions_for_input_file(input_seqs, model_to_use, sort_df=True,
-                                   write_to_file=False):
+                                   write_to_file=False, augment=False,
+                                   shifts=(0,), cache=None, quantize=None,
+                                   calibration_data=None, mc_samples=None,
+                                   top_k=None, bottom_k=None):
     """
     Takes an input file of sequences and returns a DataFrame of
     the sequences and their predicted expression levels, based
@@ -162,6 +782,45 @@ def get_predictions_for_input_file(input_seqs, model_to_use, sort_df=True,
         write_to_file (bool) -- whether or not to write the results
         of the prediction to an output file.
 
+        augment (bool) -- if True, each prediction is the average
+        of the predictions for the sequence, its reverse complement
+        and their shifts by 'shifts'. Default: False.
+
+        shifts (tuple) -- the positional shifts averaged over if
+        'augment=True'. Default: (0,).
+
+        cache (prediction_cache.PredictionCache) -- if given, only
+        sequences whose predictions are not already cached for this
+        model are run through it, and the cache hit rate is
+        reported. Default: None.
+
+        quantize (str) -- if 'int8' or 'float16', the model is
+        quantized (see quantize_model.quantize_numpy_model) and run
+        with the NumPy runtime instead of TensorFlow. Default: None.
+
+        calibration_data (str) -- the absolute path of a processed
+        data file to sample the int8 calibration sequences from.
+        Default: None (the processed data file
+        quantize_model.CALIBRATION_DATA, so the quantized model does
+        not depend on the file being predicted).
+
+        mc_samples (int) -- if given, each prediction is the mean of
+        this many Monte Carlo dropout samples (see
+        get_mc_dropout_predictions), and their standard deviation is
+        added as an 'el_std' column, as a measure of the model's
+        uncertainty. Can't be combined with 'augment' or 'cache'.
+        Default: None.
+
+        top_k (int) -- if given (or 'bottom_k'), only the 'top_k'
+        highest predictions are kept, streaming the input file in
+        batches (see get_ranked_predictions) instead of holding and
+        sorting every prediction. The results are ranked in
+        descending order, as with 'sort_df=True'. Can't be combined
+        with 'augment' or 'mc_samples'. Default: None.
+
+        bottom_k (int) -- if given, the 'bottom_k' lowest predictions
+        are also kept, after the highest ones. Default: None.
+
     Returns:
     -----
         results_df (pandas.DataFrame) -- the resulting data frame
@@ -173,30 +832,94 @@ def get_predictions_for_input_file(input_seqs, model_to_use, sort_df=True,
     assert isinstance(model_to_use, str)
     assert model_to_use in MODELS_TO_USE
     assert isinstance(sort_df, bool)
+    assert quantize is None or quantize in ('int8', 'float16'), 'quantize \
+    must be one of None, \'int8\' or \'float16\'.'
+    assert mc_samples is None or not (augment or cache is not None), \
+        'mc_samples can\'t be combined with augment or cache.'
+    ranked = top_k is not None or bottom_k is not None
+    assert not ranked or not (augment or mc_samples is not None), 'top_k \
+    and bottom_k can\'t be combined with augment or mc_samples.'
     # Functionality
-    results_df = pd.read_csv(input_seqs, names=['seq', 'el_prediction'])
+    import pandas as pd
     # Define and load model
     saved_model = get_saved_model_path(model_to_use)
-    loaded_model = load_saved_model(saved_model)
+    if quantize is None:
+        loaded_model = load_saved_model(saved_model)
+    else:
+        import expressyeaself.quantize_model as quantize_model
+        from expressyeaself.numpy_inference import load_numpy_model
+        if calibration_data is None:
+            calibration_data = ROOT_DIR + quantize_model.CALIBRATION_DATA
+        calibration_seqs = None
+        if quantize == 'int8':
+            calibration_seqs = quantize_model.get_calibration_seqs(
+                calibration_data, seed=0)
+        loaded_model = quantize_model.quantize_numpy_model(
+            load_numpy_model(saved_model), calibration_seqs, mode=quantize)
+    fingerprint = None
+    if cache is not None:
+        fingerprint = get_model_fingerprint(saved_model)
+        if quantize is not None:
+            # Quantized predictions are cached separately from float ones
+            fingerprint += '_' + quantize
     # Encode sequences, get predictions, insert values into data frame.
-    for i in range(0, len(results_df)):
-        seq = results_df['seq'][i]
-        pred = get_prediction(loaded_model, seq)
-        results_df['el_prediction'][i] = pred
-    if sort_df:
+    if not ranked:
+        results_df = pd.read_csv(input_seqs, names=['seq', 'el_prediction'])
+        seqs = list(results_df['seq'])
+    if ranked:
+        results_df = get_ranked_predictions(input_seqs, loaded_model,
+                                            top_k or 0, bottom_k or 0,
+                                            cache=cache,
+                                            fingerprint=fingerprint)
+    elif augment:
+        if cache is not None:
+            # Augmented predictions are cached separately from plain ones
+            fingerprint += '_augment_' + '_'.join(map(str, shifts))
+            predictions, misses = cache.get_many(fingerprint, seqs)
+        else:
+            predictions = np.zeros(len(seqs))
+            misses = np.arange(len(seqs))
+        if len(misses) > 0:
+            if len(loaded_model.input_shape) == 2:
+                encoder = encode.integer_encode_sequence
+            else:
+                encoder = encode.one_hot_encode_sequence
+            encoded_seqs = np.array([encoder(seqs[i]) for i in misses])
+            predictions[misses] = get_augmented_predictions(
+                loaded_model, encoded_seqs, shifts=shifts)
+            if cache is not None:
+                cache.put_many(fingerprint, [seqs[i] for i in misses],
+                               predictions[misses])
+        results_df['el_prediction'] = predictions
+    elif mc_samples is not None:
+        mean, std = get_mc_dropout_predictions(loaded_model, seqs,
+                                               num_samples=mc_samples, seed=0)
+        results_df['el_prediction'] = mean
+        results_df['el_std'] = std
+    else:
+        results_df['el_prediction'] = get_batch_predictions(
+            loaded_model, seqs, cache=cache, fingerprint=fingerprint)
+    if cache is not None:
+        print('Prediction cache hit rate: %.1f%%' %
+              (100 * cache.get_hit_rate()))
+    if sort_df and not ranked:
         results_df = results_df.sort_values('el_prediction', ascending=False)
         results_df = results_df.reset_index()
     if write_to_file:
-        out_path = ROOT_DIR + 'expressyeaself/models/prediction_results/'
+        out_path = get_output_path('expressyeaself/models/'
+                                   'prediction_results/')
         stamp = get_time_stamp()
         filename = stamp + '_' + model_to_use + '_prediction_results.txt'
         abs_path = out_path + filename
-        if sort_df:
+        if sort_df or ranked:
             columns = ['index', 'seq', 'el_prediction']
         else:
             columns = ['seq', 'el_prediction']
-        results_df.to_csv(abs_path, header=None, index=None,
-                          sep='\t', mode='w+', columns=columns)
+        if mc_samples is not None:
+            columns.append('el_std')
+        with atomic_open(abs_path, 'w') as outfile:
+            results_df.to_csv(outfile, header=None, index=None,
+                              sep='\t', columns=columns)
         print('Results can be found at: ' + abs_path)
 
     return results_df
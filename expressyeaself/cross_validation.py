@@ -0,0 +1,336 @@
+"""
+This script contains a k-fold cross-validation engine for the neural
+network models. A processed data file is encoded once into memory
+mapped .npy files, which every fold worker process opens read-only:
+the operating system shares their pages between the workers, so no
+worker holds its own copy of the encoded sequences. Each fold is
+given only the index arrays of its training and validation sets,
+and the metrics of every fold are collected into a single report.
+"""
+import expressyeaself.encode_sequences as encode
+import expressyeaself.organize_data as organize
+from expressyeaself.utilities import check_valid_line as check_valid_line
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import (separate_seq_and_el_data as
+                                      separate_seq_and_el_data)
+from expressyeaself.utilities import (separate_seq_and_els_data as
+                                      separate_seq_and_els_data)
+from expressyeaself.utilities import smart_open as smart_open
+import multiprocessing
+import numpy as np
+import os
+import time
+
+METRICS = ['loss', 'mae', 'pearson_r']
+
+worker_state = {}  # the memory mapped data and trainer of each worker
+
+
+def encode_to_memmap(input_seqs, out_prefix=None, scale_els=True,
+                     chunk_size=10000, num_targets=1):
+    """
+    One-Hot encodes every sequence in a processed data file straight
+    into a memory mapped .npy file (as uint8), chunk by chunk, so
+    the file is encoded once and the encoded sequences never have
+    to fit in memory. Expression levels are saved alongside.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file, whose first 2 lines give the number and length of the
+        sequences.
+
+        out_prefix (str) -- the absolute path prefix of the output
+        files, '<out_prefix>_seqs.npy' and '<out_prefix>_els.npy'.
+        Default: None (a time stamped prefix in
+        example/processed_data/ under the work directory).
+
+        scale_els (bool) -- if True, scales the expression levels
+        to between -1 and 1, as encode_sequences_with_method does.
+        Default: True.
+
+        chunk_size (int) -- the number of sequences encoded at a
+        time. Default: 10000.
+
+        num_targets (int) -- the number of expression levels after
+        each sequence, each scaled separately. Default: 1.
+
+    Returns:
+    -----
+        seqs_path (str) -- the absolute path of the encoded
+        sequences, of shape (num_seqs, len_seq, 5).
+
+        els_path (str) -- the absolute path of the expression
+        levels, of shape (num_seqs,), or (num_seqs, num_targets)
+        if 'num_targets' > 1.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert isinstance(chunk_size, int) and chunk_size > 0, 'chunk_size must \
+    be a positive integer.'
+    # Functionality
+    if out_prefix is None:
+        out_prefix = get_output_path('example/processed_data/' +
+                                     get_time_stamp() + '_cv')
+    seqs_path = out_prefix + '_seqs.npy'
+    els_path = out_prefix + '_els.npy'
+    num_seqs, len_seq = organize.get_num_and_len_of_seqs_from_file(input_seqs)
+    num_seqs, len_seq = int(num_seqs), int(len_seq)
+    encoded_seqs = np.lib.format.open_memmap(
+        seqs_path, mode='w+', dtype=np.uint8, shape=(num_seqs, len_seq, 5))
+    if num_targets == 1:
+        exp_levels = np.zeros(num_seqs)
+    else:
+        exp_levels = np.zeros((num_seqs, num_targets))
+    row = 0
+    seqs = []
+    with smart_open(input_seqs, 'r') as infile:
+        infile.readline()
+        infile.readline()  # skip the first 2 info lines
+        for line in infile:
+            line = check_valid_line(line)
+            if line == 'skip_line':
+                continue
+            if num_targets == 1:
+                seq, exp_level = separate_seq_and_el_data(line)
+            else:
+                seq, exp_level = separate_seq_and_els_data(line, num_targets)
+            assert len(seq) == len_seq, 'Sequences must all be of length %s \
+            (line %s).' % (len_seq, row + 3)
+            seqs.append(seq)
+            exp_levels[row + len(seqs) - 1] = exp_level
+            if len(seqs) == chunk_size:
+                encoded_seqs[row:row + len(seqs)] = \
+                    encode.encode_seqs_to_uint8(seqs)
+                row += len(seqs)
+                seqs = []
+    if seqs:
+        encoded_seqs[row:row + len(seqs)] = encode.encode_seqs_to_uint8(seqs)
+        row += len(seqs)
+    assert row == num_seqs, 'File contains %s sequences, not the %s given \
+    on its first line.' % (row, num_seqs)
+    encoded_seqs.flush()
+    del encoded_seqs
+    if scale_els:
+        exp_levels = exp_levels / np.abs(exp_levels).max(axis=0)
+    np.save(els_path, exp_levels)
+
+    return seqs_path, els_path
+
+
+def get_fold_indices(num_seqs, num_folds=5, seed=None):
+    """
+    Splits the indices of a data set into k folds at random.
+
+    Args:
+    -----
+        num_seqs (int) -- the number of sequences in the data set.
+
+        num_folds (int) -- the number of folds. Default: 5.
+
+        seed (int) -- the seed of the random split. Default: None.
+
+    Returns:
+    -----
+        folds (list) -- a (train_indices, val_indices) pair of
+        sorted index arrays for each fold.
+    """
+    # Assertions
+    assert isinstance(num_folds, int) and 1 < num_folds <= num_seqs, \
+        'num_folds must be an integer between 2 and the number of \
+        sequences.'
+    # Functionality
+    order = np.random.RandomState(seed).permutation(num_seqs)
+    chunks = np.array_split(order, num_folds)
+    folds = []
+    for i, val in enumerate(chunks):
+        train = np.concatenate(chunks[:i] + chunks[i + 1:])
+        folds.append((np.sort(train), np.sort(val)))
+
+    return folds
+
+
+def get_metrics(true_els, pred_els):
+    """
+    Returns the mean squared error ('loss'), mean absolute error
+    ('mae') and Pearson correlation ('pearson_r') of predictions.
+    """
+    true_els = np.asarray(true_els, dtype=float)
+    pred_els = np.asarray(pred_els, dtype=float).reshape(len(true_els))
+    if true_els.std() > 0 and pred_els.std() > 0:
+        pearson_r = float(np.corrcoef(true_els, pred_els)[0, 1])
+    else:
+        pearson_r = float('nan')
+
+    return {'loss': float(((true_els - pred_els) ** 2).mean()),
+            'mae': float(np.abs(true_els - pred_els).mean()),
+            'pearson_r': pearson_r}
+
+
+def train_keras_fold(encoded_seqs, exp_levels, train_indices, val_indices,
+                     model_type='1d_cnn', params=None, epochs=5,
+                     batch_size=128, seed=None):
+    """
+    Trains and evaluates a model on one fold, streaming batches of
+    the training indices from the (memory mapped) encoded sequences
+    with encode_sequences.batch_generator.
+
+    Returns:
+    -----
+        metrics (dict) -- the metrics of the model's predictions on
+        the validation set (see get_metrics).
+    """
+    import expressyeaself.construct_neural_net as construct
+    import expressyeaself.hyperparameter_sweep as sweep
+    import tensorflow as tf
+    builder = getattr(construct, sweep.BUILDERS[model_type])
+    model = builder(encoded_seqs.shape[1], **(params or {}))
+    generator = encode.batch_generator(encoded_seqs, exp_levels,
+                                       batch_size=batch_size, seed=seed,
+                                       indices=train_indices)
+    steps = int(np.ceil(len(train_indices) / batch_size))
+    model.fit_generator(generator, steps_per_epoch=steps, epochs=epochs,
+                        verbose=0)
+    predictions = []
+    for start in range(0, len(val_indices), batch_size):
+        batch = encoded_seqs[val_indices[start:start + batch_size]]
+        predictions.append(model.predict(batch.astype(np.float32))[:, 0])
+    metrics = get_metrics(exp_levels[val_indices],
+                          np.concatenate(predictions))
+    tf.keras.backend.clear_session()
+
+    return metrics
+
+
+def init_fold_worker(seqs_path, els_path, train_fn, train_kwargs):
+    """
+    Initializes a fold worker process: opens the encoded sequences as
+    a read-only memory map, shared with every other worker.
+    """
+    worker_state['encoded_seqs'] = np.load(seqs_path, mmap_mode='r')
+    worker_state['exp_levels'] = np.load(els_path, mmap_mode='r')
+    worker_state['train_fn'] = train_fn
+    worker_state['train_kwargs'] = train_kwargs
+
+    return
+
+
+def run_fold(task):
+    """
+    Trains and evaluates one fold in a worker process.
+
+    Args:
+    -----
+        task (tuple) -- (fold, train_indices, val_indices).
+
+    Returns:
+    -----
+        metrics (dict) -- the metrics of the fold, with its number
+        and the time it took.
+    """
+    fold, train_indices, val_indices = task
+    t0 = time.time()
+    metrics = worker_state['train_fn'](worker_state['encoded_seqs'],
+                                       worker_state['exp_levels'],
+                                       train_indices, val_indices,
+                                       **worker_state['train_kwargs'])
+    metrics = dict(metrics, fold=fold, seconds=round(time.time() - t0, 3))
+
+    return metrics
+
+
+def format_report(fold_metrics):
+    """
+    Formats the metrics of every fold, and their mean and standard
+    deviation, into a report.
+    """
+    lines = []
+    for metrics in fold_metrics:
+        lines.append('Fold %s: ' % (metrics['fold']) + ' '.join(
+            '%s: %.6f' % (name, metrics[name]) for name in METRICS
+            if name in metrics))
+    summary = []
+    for name in METRICS:
+        values = [metrics[name] for metrics in fold_metrics if name in
+                  metrics]
+        if values:
+            summary.append('%s: %.6f +/- %.6f' % (name, np.mean(values),
+                                                  np.std(values)))
+    lines.append('Values: ' + ' '.join(summary))
+    report = '\n'.join(lines)
+
+    return report
+
+
+def cross_validate(input_seqs, num_folds=5, num_workers=1,
+                   train_fn=train_keras_fold, train_kwargs=None,
+                   keep_encoded=False, seed=None):
+    """
+    Runs k-fold cross-validation of a model on a processed data
+    file. The file is encoded once into memory mapped files that the
+    folds share read-only, and the folds are run in parallel.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file.
+
+        num_folds (int) -- the number of folds. Default: 5.
+
+        num_workers (int) -- the number of worker processes.
+        Default: 1 (folds are run in this process).
+
+        train_fn (function) -- the function that trains and
+        evaluates a fold, called as train_fn(encoded_seqs,
+        exp_levels, train_indices, val_indices, **train_kwargs) and
+        returning a dict of metrics. Must be defined at the top
+        level of a module, so it can be sent to the workers.
+        Default: train_keras_fold.
+
+        train_kwargs (dict) -- extra keyword arguments of train_fn,
+        i.e. {'model_type': 'lstm', 'epochs': 10}. Default: None.
+
+        keep_encoded (bool) -- if True, the memory mapped files are
+        not removed afterwards. Default: False.
+
+        seed (int) -- the seed of the random split. Default: None.
+
+    Returns:
+    -----
+        fold_metrics (list) -- the metrics (dict) of each fold.
+
+        report (str) -- the report of the metrics of every fold,
+        and their mean and standard deviation.
+    """
+    # Assertions
+    assert isinstance(num_workers, int) and num_workers > 0, 'num_workers \
+    must be a positive integer.'
+    # Functionality
+    seqs_path, els_path = encode_to_memmap(input_seqs)
+    train_kwargs = train_kwargs or {}
+    try:
+        num_seqs = len(np.load(els_path, mmap_mode='r'))
+        tasks = [(fold, train, val) for fold, (train, val) in
+                 enumerate(get_fold_indices(num_seqs, num_folds, seed))]
+        initargs = (seqs_path, els_path, train_fn, train_kwargs)
+        if num_workers > 1:
+            pool = multiprocessing.Pool(min(num_workers, num_folds),
+                                        initializer=init_fold_worker,
+                                        initargs=initargs)
+            try:
+                fold_metrics = pool.map(run_fold, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            init_fold_worker(*initargs)
+            fold_metrics = [run_fold(task) for task in tasks]
+            worker_state.clear()
+    finally:
+        if not keep_encoded:
+            organize.remove_file_list([seqs_path, els_path])
+    report = format_report(fold_metrics)
+
+    return fold_metrics, report
@@ -0,0 +1,569 @@
+"""
+This script contains functions to design high-expression promoters,
+by evolving the variable region of a chosen scaffold to maximize
+the expression level predicted by a trained model. Variable regions
+are evolved with a genetic algorithm ('GA') or parallel simulated
+annealing ('SA'), each generation is scored as a single batch, and
+predictions are cached by sequence hash. Long runs can be
+checkpointed and resumed.
+"""
+import expressyeaself.encode_sequences as encode
+import expressyeaself.mutagenesis as mutagenesis
+from expressyeaself.build_promoter import (insert_seq_into_scaffold as
+                                           insert_seq_into_scaffold)
+from expressyeaself.utilities import atomic_open as atomic_open
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import ROOT_DIR as ROOT_DIR
+from expressyeaself.utilities import smart_open as smart_open
+import multiprocessing
+import numpy as np
+import os
+
+METHODS = ['GA', 'SA']
+BASE_BYTES = np.frombuffer(''.join(encode.BASES).encode(), dtype=np.uint8)
+BASE_VECTORS = np.eye(5, dtype=np.float32)[:4]  # One-Hot A, T, G, C
+
+worker_model = None  # the model used by each scoring worker process
+
+
+def get_scaffold(scaffold_type='pTpA'):
+    """
+    Retrieves the scaffold sequence (i.e. ATGC...NNNN...ATCG) of
+    the given scaffold type from the example/<scaffold_type>_data/
+    directory.
+
+    Args:
+    -----
+        scaffold_type (str) -- the scaffold type, pTpA or Abf1TATA.
+        Default: 'pTpA'.
+
+    Returns:
+    -----
+        scaffold (str) -- the scaffold sequence.
+    """
+    # Assertions
+    assert scaffold_type == 'pTpA' or scaffold_type == 'Abf1TATA', 'Scaffold \
+    type must either be passed as "pTpA" or "Abf1TATA".'
+    # Functionality
+    scaff_rel_path = ('example/' + scaffold_type + '_data/' + scaffold_type +
+                      '_scaffold.txt')
+    scaff_abs_path = os.path.join(ROOT_DIR, scaff_rel_path)
+    with smart_open(scaff_abs_path, 'r') as f:
+        scaffold = f.readline().replace('\n', '')
+
+    return scaffold
+
+
+def codes_to_seqs(codes):
+    """
+    Converts an array of base codes (indices into
+    encode_sequences.BASES) into nucleotide sequence strings.
+
+    Args:
+    -----
+        codes (numpy.ndarray) -- array of shape (num_seqs, len_seq)
+        of base codes.
+
+    Returns:
+    -----
+        seqs (list) -- the nucleotide sequences (str).
+    """
+    # Functionality
+    seq_bytes = np.ascontiguousarray(BASE_BYTES[codes])
+    seqs = [seq.decode() for seq in
+            seq_bytes.view('S%s' % (codes.shape[1])).ravel()]
+
+    return seqs
+
+
+def encode_population(codes, template, var_start):
+    """
+    One-Hot encodes a population of variable regions, written into
+    a One-Hot encoded template sequence at position 'var_start'.
+
+    Args:
+    -----
+        codes (numpy.ndarray) -- array of shape (num_seqs, var_length)
+        of base codes.
+
+        template (numpy.ndarray) -- the One-Hot encoded sequence that
+        the variable regions are written into, of shape (len_seq, 5).
+
+        var_start (int) -- the index of the template at which the
+        variable region starts.
+
+    Returns:
+    -----
+        encoded_seqs (numpy.ndarray) -- array of shape (num_seqs,
+        len_seq, 5) and type float32.
+    """
+    # Functionality
+    encoded_seqs = np.empty((len(codes),) + template.shape, dtype=np.float32)
+    encoded_seqs[:] = template
+    var_end = var_start + codes.shape[1]
+    encoded_seqs[:, var_start:var_end] = BASE_VECTORS[codes]
+
+    return encoded_seqs
+
+
+def init_scoring_worker(loaded_model):
+    """
+    Initializes a scoring worker process with the model to score
+    with. If the absolute path of a saved model is given, the model
+    is loaded once in the worker.
+
+    Args:
+    -----
+        loaded_model (str or tensorflow.python.keras.engine.training.
+        Model) -- the model, or the absolute path of the saved model.
+    """
+    global worker_model
+    if isinstance(loaded_model, str):
+        import expressyeaself.construct_neural_net as construct
+        loaded_model = construct.load_saved_model(loaded_model)
+    worker_model = loaded_model
+
+    return
+
+
+def get_worker_input_length():
+    """
+    Returns the length of the sequences the model of the worker
+    process (see init_scoring_worker) takes.
+    """
+    return worker_model.input_shape[1]
+
+
+def score_encoded_chunk(args):
+    """
+    Scores a chunk of variable regions with the model of the worker
+    process (see init_scoring_worker).
+
+    Args:
+    -----
+        args (tuple) -- the base codes of the chunk, the template,
+        the index the variable region starts at, and the batch size.
+
+    Returns:
+    -----
+        predictions (numpy.ndarray) -- the predicted expression level
+        of each sequence in the chunk.
+    """
+    codes, template, var_start, batch_size = args
+    encoded_seqs = encode_population(codes, template, var_start)
+    model_input = mutagenesis.format_model_input(worker_model, encoded_seqs)
+    predictions = np.asarray(worker_model.predict(model_input,
+                                                  batch_size=batch_size))
+
+    return predictions.reshape(len(codes), -1)[:, 0]
+
+
+def score_population(codes, cache, template, var_start, pool=None,
+                     num_workers=1, batch_size=1024):
+    """
+    Predicts the expression level of every variable region in a
+    population. Only regions not already in the cache are scored,
+    as a single batch (split between the worker processes of
+    'pool', if given), and their predictions are added to the cache.
+
+    Args:
+    -----
+        codes (numpy.ndarray) -- array of shape (pop_size, var_length)
+        of base codes.
+
+        cache (dict) -- maps each variable region (str) scored so
+        far to its prediction.
+
+        template (numpy.ndarray) -- the One-Hot encoded template the
+        variable regions are written into.
+
+        var_start (int) -- the index of the template at which the
+        variable region starts.
+
+        pool (multiprocessing.Pool) -- pool of scoring workers
+        (see init_scoring_worker). Default: None (score in this
+        process with the model given to init_scoring_worker).
+
+        num_workers (int) -- the number of workers in the pool.
+        Default: 1.
+
+        batch_size (int) -- the batch size passed to predict().
+        Default: 1024.
+
+    Returns:
+    -----
+        scores (numpy.ndarray) -- the predicted expression level of
+        each variable region.
+    """
+    # Functionality
+    seqs = codes_to_seqs(codes)
+    new = {}
+    for i, seq in enumerate(seqs):
+        if seq not in cache and seq not in new:
+            new[seq] = i
+    if len(new) > 0:
+        new_codes = codes[list(new.values())]
+        if pool is None:
+            preds = score_encoded_chunk((new_codes, template, var_start,
+                                         batch_size))
+        else:
+            chunks = np.array_split(new_codes, num_workers)
+            preds = np.concatenate(pool.map(
+                score_encoded_chunk, [(chunk, template, var_start, batch_size)
+                                      for chunk in chunks if len(chunk) > 0]))
+        cache.update(zip(new.keys(), preds.tolist()))
+    scores = np.array([cache[seq] for seq in seqs])
+
+    return scores
+
+
+def save_checkpoint(checkpoint_path, state, cache):
+    """
+    Saves the state of a design run, and its prediction cache, to a
+    numpy .npz checkpoint file. The file is written to a temporary
+    path and then renamed, so an interrupted save never corrupts an
+    existing checkpoint.
+
+    Args:
+    -----
+        checkpoint_path (str) -- the absolute path of the checkpoint.
+
+        state (dict) -- the arrays and values describing the run.
+
+        cache (dict) -- the prediction cache of the run.
+    """
+    # Functionality
+    rng_name, rng_keys, rng_pos, rng_gauss, rng_cached = state.pop('rng')
+    temp_path = checkpoint_path + '.tmp.npz'
+    np.savez(temp_path, rng_keys=rng_keys,
+             rng_extra=np.array([rng_pos, rng_gauss, rng_cached]),
+             cache_keys=np.array(list(cache.keys()), dtype=str),
+             cache_values=np.array(list(cache.values())), **state)
+    os.replace(temp_path, checkpoint_path)
+
+    return
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Loads the state of a design run, and its prediction cache, from
+    a checkpoint file written by save_checkpoint.
+
+    Args:
+    -----
+        checkpoint_path (str) -- the absolute path of the checkpoint.
+
+    Returns:
+    -----
+        state (dict) -- the arrays and values describing the run.
+
+        cache (dict) -- the prediction cache of the run.
+    """
+    # Assertions
+    assert os.path.exists(checkpoint_path), 'Checkpoint does not exist.'
+    # Functionality
+    with np.load(checkpoint_path) as checkpoint:
+        state = {key: checkpoint[key] for key in checkpoint.files}
+    rng_pos, rng_gauss, rng_cached = state.pop('rng_extra')
+    state['rng'] = ('MT19937', state.pop('rng_keys'), int(rng_pos),
+                    int(rng_gauss), float(rng_cached))
+    cache = dict(zip(state.pop('cache_keys').tolist(),
+                     state.pop('cache_values').tolist()))
+
+    return state, cache
+
+
+def update_best(best_codes, best_scores, codes, scores, num_results):
+    """
+    Merges a population into the best distinct variable regions
+    found so far, keeping the 'num_results' with the highest scores.
+
+    Args:
+    -----
+        best_codes (numpy.ndarray) -- the base codes of the best
+        regions so far, of shape (num_best, var_length).
+
+        best_scores (numpy.ndarray) -- their scores.
+
+        codes (numpy.ndarray) -- the base codes of the population.
+
+        scores (numpy.ndarray) -- the scores of the population.
+
+        num_results (int) -- the number of regions kept.
+
+    Returns:
+    -----
+        best_codes (numpy.ndarray) -- the base codes of the new best
+        regions, in descending order of score.
+
+        best_scores (numpy.ndarray) -- their scores.
+    """
+    # Functionality
+    all_codes = np.concatenate((best_codes, codes)).astype(np.uint8)
+    all_scores = np.concatenate((best_scores, scores))
+    distinct = np.unique(all_codes, axis=0, return_index=True)[1]
+    best = distinct[np.argsort(-all_scores[distinct],
+                               kind='stable')][:num_results]
+
+    return all_codes[best], all_scores[best]
+
+
+def evolve_ga(codes, scores, random_state, num_elite, tournament_size,
+              mutation_rate):
+    """
+    Produces the next generation of a genetic algorithm: the
+    'num_elite' best regions survive unchanged, and the rest are
+    bred by tournament selection, uniform crossover and per-base
+    mutation.
+
+    Args:
+    -----
+        codes (numpy.ndarray) -- the base codes of the population.
+
+        scores (numpy.ndarray) -- the scores of the population.
+
+        random_state (numpy.random.RandomState) -- the random state.
+
+        num_elite (int) -- the number of best regions kept unchanged.
+
+        tournament_size (int) -- the number of regions competing to
+        be each parent.
+
+        mutation_rate (float) -- the probability of each base of a
+        child being mutated.
+
+    Returns:
+    -----
+        children (numpy.ndarray) -- the base codes of the next
+        generation.
+    """
+    # Functionality
+    pop_size, var_length = codes.shape
+    num_children = pop_size - num_elite
+    contestants = random_state.randint(0, pop_size,
+                                       size=(2, num_children,
+                                             tournament_size))
+    winners = np.take_along_axis(contestants,
+                                 scores[contestants].argmax(axis=2)[..., None],
+                                 axis=2)[..., 0]
+    from_first = random_state.rand(num_children, var_length) < 0.5
+    children = np.where(from_first, codes[winners[0]], codes[winners[1]])
+    mutate = random_state.rand(num_children, var_length) < mutation_rate
+    shifts = random_state.randint(1, 4, size=mutate.sum())
+    children[mutate] = (children[mutate] + shifts) % 4
+    elite = codes[np.argsort(-scores, kind='stable')[:num_elite]]
+    children = np.concatenate((elite, children)).astype(np.uint8)
+
+    return children
+
+
+def optimize_promoters(loaded_model, scaffold_type='pTpA',
+                       insert_into_scaffold=None, method='GA', pop_size=1000,
+                       generations=100, mutation_rate=0.01, num_elite=10,
+                       tournament_size=3, temperature=0.1, cooling=0.97,
+                       num_results=10, num_workers=1, batch_size=1024,
+                       checkpoint_path=None, checkpoint_every=10,
+                       write_to_file=False, seed=None):
+    """
+    Designs promoters with a high predicted expression level by
+    evolving the variable region (NNN...) of the chosen scaffold.
+    With method='GA', a genetic algorithm is used (see evolve_ga).
+    With method='SA', 'pop_size' independent simulated annealing
+    chains are run side by side: each step every chain proposes a
+    single-base mutation, accepted with the Metropolis criterion at
+    a temperature that decays by 'cooling' per generation. Either
+    way, each generation is scored as one batch, and predictions are
+    cached by hash so no variable region is scored twice. The best
+    designs found in any generation are returned, not only those of
+    the last one.
+
+    If 'checkpoint_path' is given, the run is checkpointed there
+    every 'checkpoint_every' generations and after the last
+    generation, and if a checkpoint
+    already exists at that path, the run resumes from it.
+
+    Args:
+    -----
+        loaded_model (str or tensorflow.python.keras.engine.training.
+        Model) -- the model to maximize the prediction of, or the
+        absolute path of the saved model (required if
+        'num_workers' > 1, unless the model can be pickled).
+
+        scaffold_type (str) -- the scaffold type, pTpA or Abf1TATA,
+        whose variable region is evolved. Default: 'pTpA'.
+
+        insert_into_scaffold (bool) -- if True, the model scores
+        complete sequences, with the variable region inserted into
+        the scaffold (see build_promoter.insert_seq_into_scaffold).
+        If False, the model scores the variable region alone.
+        Default: None (True if the model takes sequences of the
+        scaffold's length, False if it takes sequences of the
+        variable region's length).
+
+        method (str) -- 'GA' or 'SA'. Default: 'GA'.
+
+        pop_size (int) -- the number of variable regions (or SA
+        chains) in each generation. Default: 1000.
+
+        generations (int) -- the number of generations to run, in
+        total over any resumed runs. Default: 100.
+
+        mutation_rate (float) -- GA: the probability of each base of
+        a child being mutated. Default: 0.01.
+
+        num_elite (int) -- GA: the number of best regions carried
+        over unchanged to the next generation. Default: 10.
+
+        tournament_size (int) -- GA: the number of regions competing
+        to be each parent. Default: 3.
+
+        temperature (float) -- SA: the starting temperature.
+        Default: 0.1.
+
+        cooling (float) -- SA: the factor the temperature is
+        multiplied by each generation. Default: 0.97.
+
+        num_results (int) -- the number of best designs to return.
+        Default: 10.
+
+        num_workers (int) -- the number of processes to score each
+        generation with. Default: 1.
+
+        batch_size (int) -- the batch size passed to predict().
+        Default: 1024.
+
+        checkpoint_path (str) -- the absolute path of the checkpoint
+        file. Default: None (no checkpointing).
+
+        checkpoint_every (int) -- the number of generations between
+        checkpoints. Default: 10.
+
+        write_to_file (bool) -- whether or not to write the designs
+        to the prediction_results directory. Default: False.
+
+        seed (int) -- seed for the random state. Default: None.
+
+    Returns:
+    -----
+        results_df (pandas.DataFrame) -- the best designs found, in
+        descending order of predicted expression level, with columns
+        'seq' (the complete sequence), 'variable_region' and
+        'el_prediction'.
+    """
+    # Assertions
+    assert method in METHODS, 'method must be one of %s' % (METHODS)
+    assert isinstance(pop_size, int) and pop_size > num_elite, 'pop_size \
+    must be an integer greater than num_elite.'
+    assert isinstance(generations, int) and generations >= 0
+    assert isinstance(num_workers, int) and num_workers > 0, 'num_workers \
+    must be a positive integer.'
+    assert 0 < cooling <= 1, 'cooling must be between 0 and 1.'
+    # Functionality
+    import pandas as pd
+    scaffold = get_scaffold(scaffold_type)
+    var_start = scaffold.find('N')
+    var_length = scaffold.rfind('N') + 1 - var_start
+    random_state = np.random.RandomState(seed)
+    # Resume from the checkpoint, if one exists
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        state, cache = load_checkpoint(checkpoint_path)
+        random_state.set_state(state['rng'])
+        codes = state['codes']
+        start = int(state['generation'])
+        temp = float(state['temperature'])
+        best_codes, best_scores = state['best_codes'], state['best_scores']
+    else:
+        cache = {}
+        codes = random_state.randint(0, 4, size=(pop_size, var_length))
+        codes = codes.astype(np.uint8)
+        start = 0
+        temp = temperature
+        best_codes = np.zeros((0, var_length), dtype=np.uint8)
+        best_scores = np.zeros(0)
+    # Score in this process, or start the pool of scoring workers
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers,
+                                    initializer=init_scoring_worker,
+                                    initargs=(loaded_model,))
+    else:
+        pool = None
+        init_scoring_worker(loaded_model)
+    try:
+        if insert_into_scaffold is None:
+            if pool is not None:
+                len_seq = pool.apply(get_worker_input_length)
+            else:
+                len_seq = get_worker_input_length()
+            if len_seq not in (len(scaffold), var_length):
+                raise Exception('The model takes sequences of length %s, \
+                not of the scaffold (%s) or its variable region (%s).' %
+                                (len_seq, len(scaffold), var_length))
+            insert_into_scaffold = len_seq == len(scaffold)
+        if insert_into_scaffold:
+            template = encode.one_hot_encode_sequence(scaffold)
+        else:
+            template = encode.one_hot_encode_sequence('N' * var_length)
+            var_start = 0
+        template = template.astype(np.float32)
+        scores = score_population(codes, cache, template, var_start, pool,
+                                  num_workers, batch_size)
+        best_codes, best_scores = update_best(best_codes, best_scores, codes,
+                                              scores, num_results)
+        for generation in range(start, generations):
+            if method == 'GA':
+                codes = evolve_ga(codes, scores, random_state, num_elite,
+                                  tournament_size, mutation_rate)
+                scores = score_population(codes, cache, template, var_start,
+                                          pool, num_workers, batch_size)
+            else:
+                proposals = codes.copy()
+                rows = np.arange(pop_size)
+                cols = random_state.randint(0, var_length, size=pop_size)
+                shifts = random_state.randint(1, 4, size=pop_size)
+                proposals[rows, cols] = (proposals[rows, cols] + shifts) % 4
+                new_scores = score_population(proposals, cache, template,
+                                              var_start, pool, num_workers,
+                                              batch_size)
+                delta = new_scores - scores
+                accept = random_state.rand(pop_size) < np.exp(
+                    np.minimum(delta, 0) / max(temp, 1e-12))
+                codes[accept] = proposals[accept]
+                scores[accept] = new_scores[accept]
+                temp *= cooling
+            best_codes, best_scores = update_best(best_codes, best_scores,
+                                                  codes, scores, num_results)
+            if checkpoint_path is not None and \
+                    ((generation + 1) % checkpoint_every == 0 or
+                     generation + 1 == generations):
+                state = {'codes': codes, 'generation': generation + 1,
+                         'temperature': temp, 'best_codes': best_codes,
+                         'best_scores': best_scores,
+                         'rng': random_state.get_state()}
+                save_checkpoint(checkpoint_path, state, cache)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    # The best distinct designs found in any generation
+    regions = codes_to_seqs(best_codes)
+    if insert_into_scaffold:
+        seqs = [insert_seq_into_scaffold(region, scaffold)
+                for region in regions]
+    else:
+        seqs = regions
+    results_df = pd.DataFrame({'seq': seqs, 'variable_region': regions,
+                               'el_prediction': best_scores})
+    if write_to_file:
+        out_path = get_output_path('expressyeaself/models/'
+                                   'prediction_results/')
+        stamp = get_time_stamp()
+        filename = (stamp + '_' + scaffold_type + '_' + method +
+                    '_designed_promoters.txt')
+        abs_path = out_path + filename
+        with atomic_open(abs_path, 'w') as outfile:
+            results_df.to_csv(outfile, header=None, index=None, sep='\t',
+                              columns=['seq', 'el_prediction'])
+        print('Results can be found at: ' + abs_path)
+
+    return results_df
@@ -0,0 +1,306 @@
+"""
+This script contains functions for distilling one of the larger
+pre-trained models (the teacher, i.e. '1d_cnn_parallel' or
+'1d_cnn_classifier') into the small, fast '1d_cnn_student' CNN: the
+teacher labels the processed data in batches, the student is trained
+on these soft targets, and the accuracy and throughput of the two
+models are compared in a report.
+"""
+import expressyeaself.construct_neural_net as construct
+import expressyeaself.cross_validation as cross_validation
+import expressyeaself.train_model as train_model
+from expressyeaself.utilities import atomic_open as atomic_open
+from expressyeaself.utilities import check_valid_line as check_valid_line
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import (get_saved_model_path as
+                                      get_saved_model_path)
+from expressyeaself.utilities import get_temp_path as get_temp_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import MODELS_TO_USE as MODELS_TO_USE
+from expressyeaself.utilities import (separate_seq_and_el_data as
+                                      separate_seq_and_el_data)
+from expressyeaself.utilities import smart_open as smart_open
+import numpy as np
+import os
+import shutil
+import time
+
+STUDENT = '1d_cnn_student'
+INFO_TOKENS = ('number_of_seqs_in_file', 'length_of_each_sequence')
+
+
+def read_seq_and_el_batches(input_seqs, batch_size=4096, max_seqs=None):
+    """
+    A generator that reads batches of sequences and their expression
+    levels from a processed data file, skipping its info lines.
+
+    Yields:
+    -----
+        seqs (list) -- the sequences of the batch.
+
+        exp_levels (list) -- their expression levels.
+    """
+    seqs = []
+    exp_levels = []
+    num_read = 0
+    with smart_open(input_seqs, 'r') as infile:
+        for line in infile:
+            line = check_valid_line(line)
+            if line == 'skip_line' or line.startswith(INFO_TOKENS):
+                continue
+            seq, exp_level = separate_seq_and_el_data(line)
+            seqs.append(seq)
+            exp_levels.append(exp_level)
+            num_read += 1
+            if len(seqs) == batch_size or num_read == max_seqs:
+                yield seqs, exp_levels
+                seqs = []
+                exp_levels = []
+            if num_read == max_seqs:
+                return
+    if seqs:
+        yield seqs, exp_levels
+
+
+def label_with_teacher(input_seqs, teacher, out_path=None, batch_size=4096):
+    """
+    Labels every sequence in a processed data file with the teacher
+    model's prediction, streaming the file in batches, and writes
+    them to a new processed data file ready for training the
+    student. Each line holds the sequence, the teacher's prediction
+    (the soft target) and the sequence's measured expression level,
+    tab separated.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file.
+
+        teacher (tensorflow.keras.Model) -- the loaded teacher model
+        (or a model loaded into the NumPy runtime).
+
+        out_path (str) -- the absolute path of the output file.
+        Default: None (a time stamped file in
+        example/processed_data/ under the work directory).
+
+        batch_size (int) -- the number of sequences labelled at a
+        time. Default: 4096.
+
+    Returns:
+    -----
+        out_path (str) -- the absolute path of the output file.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert isinstance(batch_size, int) and batch_size > 0, 'batch_size must \
+    be a positive integer.'
+    # Functionality
+    if out_path is None:
+        out_path = get_output_path('example/processed_data/' +
+                                   get_time_stamp() + '_teacher_labels.txt')
+    # The labels are written before the header, which needs their count
+    temp_path = get_temp_path(out_path)
+    num_seqs = 0
+    len_seq = 0
+    try:
+        with smart_open(temp_path, 'w') as temp:
+            for seqs, exp_levels in read_seq_and_el_batches(input_seqs,
+                                                            batch_size):
+                labels = construct.get_batch_predictions(
+                    teacher, seqs, batch_size=batch_size)
+                temp.write(''.join('%s\t%r\t%r\n' % (seq, float(label), el)
+                                   for seq, label, el in zip(seqs, labels,
+                                                             exp_levels)))
+                num_seqs += len(seqs)
+                len_seq = max([len_seq] + [len(seq) for seq in seqs])
+        assert num_seqs > 0, 'No sequences found in the input file.'
+        with atomic_open(out_path, 'w') as outfile:
+            outfile.write('number_of_seqs_in_file\t' + str(num_seqs) + '\n')
+            outfile.write('length_of_each_sequence\t' + str(len_seq) + '\n')
+            with smart_open(temp_path, 'r') as temp:
+                shutil.copyfileobj(temp, outfile)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return out_path
+
+
+def measure_throughput(model, seqs, batch_size=1024, repeats=3):
+    """
+    Returns the number of sequences a model predicts per second
+    (the best of a number of repeats, after a warm-up batch).
+    """
+    construct.get_batch_predictions(model, seqs[:batch_size],
+                                    batch_size=batch_size)
+    best = float('inf')
+    for i in range(0, repeats):
+        t0 = time.perf_counter()
+        construct.get_batch_predictions(model, seqs, batch_size=batch_size)
+        best = min(best, time.perf_counter() - t0)
+
+    return len(seqs) / max(best, 1e-9)
+
+
+def compare_teacher_and_student(teacher, student, input_seqs,
+                                num_seqs=10000, batch_size=1024):
+    """
+    Compares the accuracy and speed of a teacher and its student on
+    the first sequences of a processed data file.
+
+    Args:
+    -----
+        teacher (tensorflow.keras.Model) -- the loaded teacher model.
+
+        student (tensorflow.keras.Model) -- the loaded student model.
+
+        input_seqs (str) -- the absolute path of the processed data
+        file (i.e. a held out one) of measured expression levels.
+
+        num_seqs (int) -- the number of sequences compared on.
+        Default: 10000.
+
+        batch_size (int) -- the batch size passed to predict().
+        Default: 1024.
+
+    Returns:
+    -----
+        report (str) -- a line for each model, with the loss, mean
+        absolute error and Pearson correlation of its predictions
+        against the measured expression levels (scaled to between -1
+        and 1) and its sequences per second, and a line of the
+        agreement between the two models.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    # Functionality
+    seqs = []
+    exp_levels = []
+    for batch_seqs, batch_els in read_seq_and_el_batches(input_seqs,
+                                                         max_seqs=num_seqs):
+        seqs += batch_seqs
+        exp_levels += batch_els
+    exp_levels = np.array(exp_levels) / np.abs(exp_levels).max()
+    lines = []
+    preds = {}
+    for name, model in [('teacher', teacher), ('student', student)]:
+        preds[name] = construct.get_batch_predictions(model, seqs,
+                                                      batch_size=batch_size)
+        metrics = cross_validation.get_metrics(exp_levels, preds[name])
+        metrics['seqs_per_second'] = measure_throughput(model, seqs,
+                                                        batch_size)
+        lines.append(name.title() + ': ' + ' '.join(
+            '%s: %.6f' % (metric, value) for metric, value in
+            sorted(metrics.items())))
+    agreement = cross_validation.get_metrics(preds['teacher'],
+                                             preds['student'])
+    lines.append('Agreement: ' + ' '.join(
+        '%s: %.6f' % (metric, value) for metric, value in
+        sorted(agreement.items())))
+    report = '\n'.join(lines)
+
+    return report
+
+
+def distill_model(input_seqs, teacher, student_params=None, epochs=5,
+                  batch_size=128, out_path=None, checkpoint_dir=None,
+                  eval_seqs=None, seed=0,
+                  build_fn=train_model.build_keras_model,
+                  load_fn=train_model.load_keras_model):
+    """
+    Distills a teacher model into the '1d_cnn_student' CNN: labels
+    the processed data with the teacher, trains the student on the
+    teacher's predictions (with train_model.train_with_checkpoints,
+    so an interrupted run can be resumed) and saves it where
+    get_saved_model_path('1d_cnn_student') points, so that it can be
+    used by construct_neural_net.get_predictions_for_input_file.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file to distill on. Its measured expression levels are not
+        used for training.
+
+        teacher (str) -- one of MODELS_TO_USE, or the absolute path
+        of a saved .hdf5 model, or a loaded model.
+
+        student_params (dict) -- keyword arguments of
+        construct_neural_net.build_1d_cnn_student. Default: None.
+
+        epochs (int) -- the number of epochs to train the student
+        for. Default: 5.
+
+        batch_size (int) -- the number of sequences per batch.
+        Default: 128.
+
+        out_path (str) -- the absolute path the student is saved to.
+        Default: None (the path of the '1d_cnn_student' model).
+
+        checkpoint_dir (str) -- the checkpoint directory of the
+        student's training (see train_model.train_with_checkpoints),
+        which also holds the teacher's labels, so that rerunning an
+        interrupted distillation with the same directory resumes it.
+        The directory is removed once the student is saved.
+        Default: None (a new time
+        stamped directory in expressyeaself/models/checkpoints/
+        under the work directory).
+
+        eval_seqs (str) -- the absolute path of a processed data
+        file to compare the two models on. Default: None (the input
+        file).
+
+        seed (int) -- the seed of the order of the sequences.
+        Default: 0.
+
+        build_fn (function) -- builds the student, as for
+        train_model.train_with_checkpoints. Default:
+        train_model.build_keras_model.
+
+        load_fn (function) -- loads a saved model. Default:
+        train_model.load_keras_model.
+
+    Returns:
+    -----
+        out_path (str) -- the absolute path of the saved student.
+
+        report (str) -- the comparison of the teacher and student
+        (see compare_teacher_and_student).
+    """
+    # Assertions
+    assert isinstance(input_seqs, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    # Functionality
+    if isinstance(teacher, str):
+        if teacher in MODELS_TO_USE:
+            teacher = get_saved_model_path(teacher)
+        teacher = load_fn(teacher)
+    if out_path is None:
+        out_path = get_saved_model_path(STUDENT)
+    if checkpoint_dir is None:
+        checkpoint_dir = get_output_path('expressyeaself/models/checkpoints/'
+                                         + get_time_stamp() + '_' + STUDENT +
+                                         '/')
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    labels_path = os.path.join(checkpoint_dir, 'teacher_labels.txt')
+    if not os.path.exists(labels_path):
+        label_with_teacher(input_seqs, teacher, labels_path)
+    student, state = train_model.train_with_checkpoints(
+        labels_path, checkpoint_dir=checkpoint_dir, model_type=STUDENT,
+        params=student_params, epochs=epochs, batch_size=batch_size,
+        scale_els=False, seed=seed, build_fn=build_fn, load_fn=load_fn)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    temp_path = get_temp_path(out_path)
+    try:
+        student.save(temp_path)
+        os.replace(temp_path, out_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    # The checkpoints and memory mapped training data are no longer needed
+    shutil.rmtree(checkpoint_dir)
+    report = compare_teacher_and_student(teacher, student,
+                                         eval_seqs or input_seqs)
+
+    return out_path, report
@@ -5,10 +5,19 @@ neural network that will receive the encoded sequence.
 """
 import expressyeaself.organize_data as organize
 from expressyeaself.utilities import check_valid_line as check_valid_line
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import get_temp_path as get_temp_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
 from expressyeaself.utilities import (separate_seq_and_el_data as
                                       separate_seq_and_el_data)
+from expressyeaself.utilities import (separate_seq_and_els_data as
+                                      separate_seq_and_els_data)
 from expressyeaself.utilities import smart_open as smart_open
+import collections
+import functools
+import itertools
 import numpy as np
+import os
 
 BASES = ['A', 'T', 'G', 'C']
 MAPPING = {'A': [1, 0, 0, 0, 0],
@@ -17,13 +26,32 @@ MAPPING = {'A': [1, 0, 0, 0, 0],
            'C': [0, 0, 0, 1, 0],
            'N': [0, 0, 0, 0, 1],
            'P': [0, 0, 0, 0, 0]}
-METHODS = ['One-Hot']
+TOKENS = {'P': 0,  # padding is token 0, so it can be masked by Embedding
+          'A': 1,
+          'T': 2,
+          'G': 3,
+          'C': 4,
+          'N': 5}
+METHODS = ['One-Hot', 'K-mer', 'Integer']
+COMPLEMENT_ORDER = [1, 0, 3, 2, 4]  # one-hot columns of T, A, C, G, N
+# The Integer tokens of the complements of P, A, T, G, C and N
+COMPLEMENT_TOKENS = np.array([0, 2, 1, 4, 3, 5], dtype=np.uint8)
 MODELS = ['1DCNN', '1DLOCCON', 'LSTM']
+KMER_CODES = np.full(256, 4, dtype=np.uint8)  # 2-bit codes; 4 = not ATGC
+KMER_CODES[np.frombuffer(b'ATGCatgc', dtype=np.uint8)] = [0, 1, 2, 3] * 2
+TOKEN_CODES = np.full(256, 255, dtype=np.uint8)  # 255 = invalid character
+TOKEN_CODES[np.frombuffer(b'PATGCNpatgcn', dtype=np.uint8)] = \
+    [TOKENS[char] for char in 'PATGCN'] * 2
+ONE_HOT_CODES = np.zeros((256, 5), dtype=np.uint8)  # byte ---> base vector
+for nuc, vector in MAPPING.items():
+    ONE_HOT_CODES[ord(nuc)] = vector
+    ONE_HOT_CODES[ord(nuc.lower())] = vector
 
 
 def encode_sequences_with_method(input_seqs, method='One-Hot',
                                  scale_els=True, model_type='1DCNN',
-                                 binarized_els=False):
+                                 binarized_els=False, k=6, num_workers=1,
+                                 num_targets=1):
     """
     A wrapper function that encodes all of the sequences in an
     input file according to the specified method, and returns
@@ -44,7 +72,8 @@ def encode_sequences_with_method(input_seqs, method='One-Hot',
         homogeneity and/or padding of sequences.
 
         method (str) -- the method by which the sequence should be
-        encoded. Must choose from: 'One-Hot'. Default: 'One-Hot'
+        encoded. Must choose from: 'One-Hot', 'K-mer' or 'Integer'.
+        Default: 'One-Hot'
 
         scale_els (bool) -- if True (default), scales all of the
         expression levels in the output list exp_levels to between
@@ -55,7 +84,24 @@ def encode_sequences_with_method(input_seqs, method='One-Hot',
         the shape of the returned list that contains the encoded
         sequences. Must be one of: '1DCNN' (for 1D-convolutional
         net), '1DLOCCON' (for 1D-locally connected net), or 'LSTM'
-        (for Long-Short-Term-Memory net).
+        (for Long-Short-Term-Memory net). Ignored for the 'K-mer'
+        and 'Integer' methods.
+
+        binarized_els (bool) -- if True, the expression levels are
+        converted to integers. Default: False.
+
+        k (int) -- the length of the k-mers counted, between 1 and
+        8, if 'method=K-mer'. Default: 6.
+
+        num_workers (int) -- the number of processes used to encode
+        chunks of the file in parallel, if 'method=K-mer'.
+        Default: 1.
+
+        num_targets (int) -- the number of expression levels after
+        each sequence (i.e. one per replicate or growth condition,
+        see organize_data.write_native_data_to_file), all read in
+        the same pass for training a multi-target model. Not
+        supported by the 'K-mer' method. Default: 1.
 
     Returns:
     -----
@@ -70,14 +116,21 @@ def encode_sequences_with_method(input_seqs, method='One-Hot',
         '1DCONV'   ===> (10000, 257, 5)
         '1DLOCCON' ===> (10000, 257, 5)
         'LSTM'     ===> (10000, 1, 1285) where 1285=257*5
+        If 'method=K-mer', a scipy.sparse.csr_matrix of k-mer
+        counts of shape (10000, 4 ** k) is returned instead. If
+        'method=Integer', a uint8 array of token ids of shape
+        (10000, 257) is returned, for input to an Embedding layer.
 
         exp_levels (numpy.ndarray) -- a list of all the expression
         levels associated with the sequences. Each element (i.e.
         each EL) is of type float. Values scaled to between -1 and
-        1 if argument 'scale_els=True'.
+        1 if argument 'scale_els=True'. Of shape (num_seqs,
+        num_targets) if 'num_targets' > 1.
 
         abs_max_el (float) -- the maximum expression level value in the
-        input file. Returned only if 'scale_els=True'.
+        input file. Returned only if 'scale_els=True'. An array of
+        the maximum of each target if 'num_targets' > 1, each of
+        which is scaled separately.
 
     """
     # Assertions
@@ -93,13 +146,36 @@ def encode_sequences_with_method(input_seqs, method='One-Hot',
     as a string.'
     assert model_type in MODELS, 'Must specify model_type as one of the\
     following: %s' % (MODELS)
+    assert isinstance(num_targets, int) and num_targets > 0, 'num_targets \
+    must be a positive integer.'
+    assert method != 'K-mer' or num_targets == 1, 'K-mer encoding only \
+    supports a single target.'
     # Functionality
+    if method == 'K-mer':
+        # Stream the file in chunks into a sparse k-mer count matrix
+        encoded_seqs, exp_levels = kmer_encode_file(input_seqs, k=k,
+                                                    num_workers=num_workers)
+        abs_max_el = None
+        if scale_els:
+            abs_max_el = abs(max(exp_levels, key=abs))
+            exp_levels = exp_levels / abs_max_el
+        if binarized_els:
+            exp_levels = exp_levels.astype(int)
+
+        return encoded_seqs, exp_levels, abs_max_el
     # Open input file
     infile = smart_open(input_seqs, 'r')
     # Initialize output lists, preallocating dimensions for speed.
     num_seqs, len_seq = organize.get_num_and_len_of_seqs_from_file(input_seqs)
-    encoded_seqs = np.zeros((int(num_seqs), int(len_seq), 5)).astype(int)
-    exp_levels = np.zeros(int(num_seqs))
+    if method == 'Integer':
+        encoded_seqs = np.zeros((int(num_seqs), int(len_seq)),
+                                dtype=np.uint8)
+    else:
+        encoded_seqs = np.zeros((int(num_seqs), int(len_seq), 5)).astype(int)
+    if num_targets == 1:
+        exp_levels = np.zeros(int(num_seqs))
+    else:
+        exp_levels = np.zeros((int(num_seqs), num_targets))
     # Encode sequences
     line_number = -3
     for line in infile:
@@ -109,30 +185,37 @@ def encode_sequences_with_method(input_seqs, method='One-Hot',
         line = check_valid_line(line)
         if line == 'skip_line':
             continue  # skip line if not a valid line
-        seq, exp_level = separate_seq_and_el_data(line)
+        if num_targets == 1:
+            seq, exp_level = separate_seq_and_el_data(line)
+        else:
+            seq, exp_level = separate_seq_and_els_data(line, num_targets)
         # Encode with One-Hot method
         if method == 'One-Hot':
             try:
                 encoded_seq = one_hot_encode_sequence(seq)
             except Exception:
                 raise AssertionError('Error on line %s' % (line_number))
-        # Encode with another method, i.e. embedding
-        else:
-            # Another encoding method will go here
-            # encoded_seq = another_encoding_method(seq)
-            pass
+        # Encode with Integer method, i.e. for an Embedding layer
+        elif method == 'Integer':
+            try:
+                encoded_seq = integer_encode_sequence(seq)
+            except Exception:
+                raise AssertionError('Error on line %s' % (line_number))
         # Assign encoded sequences and expression levels to output arrays
         encoded_seqs[line_number] = encoded_seq
         exp_levels[line_number] = exp_level
     # Close the input file
     infile.close()
     # Reshape array if needed as input to LSTM model
-    if model_type == 'LSTM':
+    if model_type == 'LSTM' and method == 'One-Hot':
         encoded_seqs = encoded_seqs.reshape(int(num_seqs), -1)
         encoded_seqs = encoded_seqs.reshape(int(num_seqs), 1,
                                             (int(len_seq) * 5))
     # Scale expression level values to between -1 and 1
-    if scale_els:
+    if scale_els and num_targets > 1:
+        abs_max_el = np.abs(exp_levels).max(axis=0)  # of each target
+        exp_levels = exp_levels / abs_max_el
+    elif scale_els:
         abs_max_el = abs(max(exp_levels, key=abs))  # the absolute max value
         # numpy allows easy division of all elements at once
         exp_levels = exp_levels / abs_max_el
@@ -181,6 +264,599 @@ def one_hot_encode_sequence(promoter_seq):
     return one_hot_seq
 
 
+def integer_encode_sequence(promoter_seq):
+    """
+    Encodes a string nucleotide sequence using the 'Integer'
+    encoding method, i.e. as an array of uint8 token ids, one per
+    base, for input to an Embedding layer. The token ids are given
+    by TOKENS, with the padding character 'P' mapped to 0.
+
+    Args:
+    -----
+        promoter_seq (str) -- the promoter sequence to be encoded.
+
+    Returns:
+    -----
+        int_seq (numpy.ndarray) -- the Integer encoded nucleotide
+        sequence as a numpy 1d array of type uint8.
+    """
+    # Assertions
+    assert isinstance(promoter_seq, str), 'TypeError: Input nucleotide \
+    sequence must be a string.'
+    # Functionality
+    int_seq = TOKEN_CODES[np.frombuffer(promoter_seq.encode(),
+                                        dtype=np.uint8)]
+    invalid_indices = np.flatnonzero(int_seq == 255)
+    if len(invalid_indices) != 0:
+        raise Exception('Input nucleotide sequence contains a non ATGC or \
+        "N" or "P" at string indices %s' % (list(invalid_indices)))
+
+    return int_seq
+
+
+def encode_seqs_to_uint8(seqs, method='One-Hot'):
+    """
+    Encodes a list of nucleotide sequences of the same length into a
+    single uint8 array in one vectorized lookup, with the 'One-Hot'
+    or 'Integer' method, i.e. for writing to compact binary files.
+
+    Args:
+    -----
+        seqs (list) -- the nucleotide sequences (str), all of the
+        same length.
+
+        method (str) -- 'One-Hot' or 'Integer'. Default: 'One-Hot'.
+
+    Returns:
+    -----
+        encoded_seqs (numpy.ndarray) -- the encoded sequences, of
+        shape (num_seqs, len_seq, 5) for 'One-Hot' or (num_seqs,
+        len_seq) for 'Integer', of type uint8.
+    """
+    # Assertions
+    assert method in ('One-Hot', 'Integer'), 'method must be One-Hot or \
+    Integer.'
+    assert len(set(len(seq) for seq in seqs)) <= 1, 'Sequences must all \
+    be of the same length.'
+    # Functionality
+    codes = np.frombuffer(''.join(seqs).encode(), dtype=np.uint8)
+    codes = codes.reshape(len(seqs), -1)
+    invalid = np.argwhere(TOKEN_CODES[codes] == 255)
+    if len(invalid) != 0:
+        raise Exception('Sequence %s contains a non ATGC or "N" or "P" at \
+        string index %s' % (invalid[0][0], invalid[0][1]))
+    if method == 'One-Hot':
+        encoded_seqs = ONE_HOT_CODES[codes]
+    else:
+        encoded_seqs = TOKEN_CODES[codes]
+
+    return encoded_seqs
+
+
+def write_tfrecord_shards(input_seqs, out_prefix=None, method='One-Hot',
+                          num_shards=8, compress=True, scale_els=True,
+                          chunk_size=10000):
+    """
+    Encodes every sequence in a processed data file and writes them,
+    with their expression levels, to sharded (and GZIP compressed)
+    TFRecord files, for training on full libraries with the tf.data
+    pipeline of make_tfrecord_dataset. Each record is a
+    tf.train.Example with the uint8 encoded sequence as raw bytes
+    ('seq') and its expression level ('el'). Sequences are dealt to
+    the shards in turn, and each shard is only moved to its final
+    path once complete.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file, whose first 2 lines give the number and length of the
+        sequences.
+
+        out_prefix (str) -- the absolute path prefix of the shards,
+        named '<out_prefix>-<i>-of-<num_shards>.tfrecord'.
+        Default: None (a time stamped prefix in
+        example/processed_data/ under the work directory).
+
+        method (str) -- 'One-Hot' or 'Integer'. Default: 'One-Hot'.
+
+        num_shards (int) -- the number of shard files. Default: 8.
+
+        compress (bool) -- whether to GZIP compress the shards.
+        Default: True.
+
+        scale_els (bool) -- if True, scales the expression levels
+        to between -1 and 1, as encode_sequences_with_method does.
+        Default: True.
+
+        chunk_size (int) -- the number of sequences encoded at a
+        time. Default: 10000.
+
+    Returns:
+    -----
+        shard_paths (list) -- the absolute paths of the shards.
+
+        len_seq (int) -- the length of the sequences.
+
+        abs_max_el (float) -- the maximum absolute expression level
+        the levels were scaled by, or None if not scaled.
+    """
+    import tensorflow as tf
+    # Assertions
+    assert isinstance(input_seqs, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert method in ('One-Hot', 'Integer'), 'method must be One-Hot or \
+    Integer.'
+    assert isinstance(num_shards, int) and num_shards > 0, 'num_shards \
+    must be a positive integer.'
+    # Functionality
+    if out_prefix is None:
+        out_prefix = get_output_path('example/processed_data/' +
+                                     get_time_stamp() + '_' +
+                                     method.lower().replace('-', '_'))
+    _, len_seq = organize.get_num_and_len_of_seqs_from_file(input_seqs)
+    len_seq = int(len_seq)
+
+    def stream_lines():
+        with smart_open(input_seqs, 'r') as infile:
+            infile.readline()
+            infile.readline()  # skip the first 2 info lines
+            for line in infile:
+                line = check_valid_line(line)
+                if line != 'skip_line':
+                    yield separate_seq_and_el_data(line)
+    abs_max_el = None
+    if scale_els:
+        abs_max_el = max(abs(exp_level) for _, exp_level in stream_lines())
+    shard_paths = ['%s-%05d-of-%05d.tfrecord' % (out_prefix, i, num_shards)
+                   for i in range(0, num_shards)]
+    temp_paths = [get_temp_path(path) for path in shard_paths]
+    options = tf.io.TFRecordOptions(compression_type='GZIP' if compress
+                                    else '')
+    writers = [tf.io.TFRecordWriter(path, options) for path in temp_paths]
+    num_written = 0
+    lines = stream_lines()
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            break
+        seqs, exp_levels = zip(*chunk)
+        encoded_seqs = encode_seqs_to_uint8(list(seqs), method)
+        if abs_max_el:
+            exp_levels = [exp_level / abs_max_el for exp_level in exp_levels]
+        for encoded_seq, exp_level in zip(encoded_seqs, exp_levels):
+            features = tf.train.Features(feature={
+                'seq': tf.train.Feature(bytes_list=tf.train.BytesList(
+                    value=[encoded_seq.tobytes()])),
+                'el': tf.train.Feature(float_list=tf.train.FloatList(
+                    value=[exp_level]))})
+            example = tf.train.Example(features=features)
+            writers[num_written % num_shards].write(
+                example.SerializeToString())
+            num_written += 1
+    for writer, temp_path, path in zip(writers, temp_paths, shard_paths):
+        writer.close()
+        os.replace(temp_path, path)
+
+    return shard_paths, len_seq, abs_max_el
+
+
+def make_tfrecord_dataset(shard_paths, len_seq, method='One-Hot',
+                          batch_size=128, shuffle_buffer=10000,
+                          cycle_length=None, compressed=True, repeat=True,
+                          seed=None):
+    """
+    Builds a tf.data input pipeline over the TFRecord shards written
+    by write_tfrecord_shards, that can be passed straight to the
+    fit() method of the 1D CNN and LSTM models (with
+    steps_per_epoch = ceil(num_seqs / batch_size) if 'repeat=True').
+    Shards are read in parallel and interleaved, records are
+    shuffled, batched, and decoded a whole batch at a time on
+    parallel threads, and batches are prefetched so the pipeline
+    runs ahead of the model.
+
+    Args:
+    -----
+        shard_paths (list) -- the absolute paths of the shards.
+
+        len_seq (int) -- the length of the encoded sequences.
+
+        method (str) -- the method the sequences were encoded with,
+        'One-Hot' (decoded to float32 of shape (len_seq, 5)) or
+        'Integer' (decoded to int32 of shape (len_seq,)).
+        Default: 'One-Hot'.
+
+        batch_size (int) -- the number of sequences per batch.
+        Default: 128.
+
+        shuffle_buffer (int) -- the number of records shuffled
+        over. 0 disables shuffling. Default: 10000.
+
+        cycle_length (int) -- the number of shards read at once.
+        Default: None (all of them).
+
+        compressed (bool) -- whether the shards are GZIP compressed.
+        Default: True.
+
+        repeat (bool) -- whether to repeat the data endlessly, for
+        training over multiple epochs. Default: True.
+
+        seed (int) -- the seed of the shuffling. Default: None.
+
+    Returns:
+    -----
+        dataset (tensorflow.data.Dataset) -- the dataset of
+        (encoded_seqs, exp_levels) batches.
+    """
+    import tensorflow as tf
+    # Assertions
+    assert len(shard_paths) > 0, 'At least one shard must be given.'
+    assert method in ('One-Hot', 'Integer'), 'method must be One-Hot or \
+    Integer.'
+    # Functionality
+    autotune = tf.data.experimental.AUTOTUNE
+    compression_type = 'GZIP' if compressed else ''
+    files = tf.data.Dataset.from_tensor_slices(list(shard_paths))
+    if shuffle_buffer:
+        files = files.shuffle(len(shard_paths), seed=seed)
+    dataset = files.interleave(
+        lambda path: tf.data.TFRecordDataset(
+            path, compression_type=compression_type),
+        cycle_length=cycle_length or len(shard_paths), block_length=1,
+        num_parallel_calls=autotune)
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed)
+    if repeat:
+        dataset = dataset.repeat()
+    shape = [-1, len_seq, 5] if method == 'One-Hot' else [-1, len_seq]
+    features = {'seq': tf.io.FixedLenFeature([], tf.string),
+                'el': tf.io.FixedLenFeature([], tf.float32)}
+
+    def decode_batch(serialized):
+        parsed = tf.io.parse_example(serialized, features)
+        encoded_seqs = tf.reshape(tf.io.decode_raw(parsed['seq'], tf.uint8),
+                                  shape)
+        if method == 'One-Hot':
+            encoded_seqs = tf.cast(encoded_seqs, tf.float32)
+        else:
+            encoded_seqs = tf.cast(encoded_seqs, tf.int32)
+        return encoded_seqs, parsed['el']
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(decode_batch, num_parallel_calls=autotune)
+    dataset = dataset.prefetch(autotune)
+
+    return dataset
+
+
+def kmer_encode_sequences(seqs, k=6):
+    """
+    Counts the overlapping k-mers in each of a list of nucleotide
+    sequences, returning the counts as a sparse matrix. Each k-mer
+    is identified by a rolling 2-bit hash, i.e. its bases packed
+    into an integer 2 bits at a time (A=0, T=1, G=2, C=3), computed
+    for every position of every sequence at once with NumPy. k-mers
+    containing any character other than A, T, G or C (i.e. 'N' or
+    padding 'P') are not counted.
+
+    Args:
+    -----
+        seqs (list) -- the nucleotide sequences (str) to encode.
+        Sequences shorter than the longest are treated as padded.
+
+        k (int) -- the length of the k-mers to count, between 1 and
+        8. Default: 6.
+
+    Returns:
+    -----
+        kmer_counts (scipy.sparse.csr_matrix) -- matrix of shape
+        (len(seqs), 4 ** k), where element (i, j) is the number of
+        times the k-mer with hash j occurs in sequence i.
+    """
+    # Assertions
+    assert isinstance(k, int), 'k must be passed as an integer.'
+    assert 1 <= k <= 8, 'k must be between 1 and 8.'
+    # Functionality
+    import scipy.sparse as sparse
+    num_seqs = len(seqs)
+    len_seq = max([len(seq) for seq in seqs] + [k])
+    padded = ''.join(seq.ljust(len_seq, 'P') for seq in seqs)
+    codes = np.frombuffer(padded.encode(), dtype=np.uint8)
+    codes = KMER_CODES[codes].reshape(num_seqs, len_seq)
+    num_kmers = len_seq - k + 1
+    hashes = np.zeros((num_seqs, num_kmers), dtype=np.int64)
+    invalid = np.zeros((num_seqs, num_kmers), dtype=bool)
+    for j in range(0, k):
+        window = codes[:, j:j + num_kmers]
+        hashes = (hashes << 2) | (window & 3)
+        invalid |= window == 4
+    # Sort the hashes of each sequence so that repeated k-mers form runs;
+    # each run of a valid hash is then one non-zero count.
+    hashes[invalid] = 4 ** k  # sentinel, sorted to the end of each row
+    hashes.sort(axis=1)
+    is_start = np.ones(hashes.shape, dtype=bool)
+    is_start[:, 1:] = hashes[:, 1:] != hashes[:, :-1]
+    starts = np.flatnonzero(is_start)
+    run_lengths = np.diff(np.append(starts, hashes.size))
+    run_hashes = hashes.ravel()[starts]
+    keep = run_hashes < 4 ** k
+    indptr = np.zeros(num_seqs + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(starts[keep] // num_kmers,
+                                       minlength=num_seqs))
+    kmer_counts = sparse.csr_matrix(
+        (run_lengths[keep], run_hashes[keep], indptr),
+        shape=(num_seqs, 4 ** k))
+
+    return kmer_counts
+
+
+def kmer_encode_lines(lines, k=6):
+    """
+    Parses a chunk of lines from an input file of sequences and
+    expression levels (tab separated), and k-mer encodes the
+    sequences. Invalid lines are skipped.
+
+    Args:
+    -----
+        lines (list) -- the lines (str or bytes) to encode.
+
+        k (int) -- the length of the k-mers to count. Default: 6.
+
+    Returns:
+    -----
+        kmer_counts (scipy.sparse.csr_matrix) -- the k-mer counts
+        of the sequences in the chunk.
+
+        exp_levels (numpy.ndarray) -- their expression levels.
+    """
+    seqs = []
+    exp_levels = []
+    for line in lines:
+        line = check_valid_line(line)
+        if line == 'skip_line':
+            continue
+        seq, exp_level = separate_seq_and_el_data(line)
+        seqs.append(seq)
+        exp_levels.append(exp_level)
+    kmer_counts = kmer_encode_sequences(seqs, k)
+
+    return kmer_counts, np.array(exp_levels)
+
+
+def kmer_encode_file(input_seqs, k=6, num_workers=1, chunk_size=100000):
+    """
+    Streams the sequences of an input file in chunks and k-mer
+    encodes them, in parallel over 'num_workers' processes, into a
+    single sparse matrix of k-mer counts. Only one chunk per worker
+    is held in memory as text at any time. Assumes the first 2
+    lines of the file are the info lines written by
+    organize_data.write_num_and_len_of_seqs_to_file(), which are
+    skipped.
+
+    Args:
+    -----
+        input_seqs (str) -- absolute path of the file containing the
+        sequences to encode, tab separated with their expression
+        levels.
+
+        k (int) -- the length of the k-mers to count. Default: 6.
+
+        num_workers (int) -- the number of processes to encode
+        chunks with. Default: 1 (no parallelism).
+
+        chunk_size (int) -- the number of lines per chunk.
+        Default: 100000.
+
+    Returns:
+    -----
+        kmer_counts (scipy.sparse.csr_matrix) -- matrix of k-mer
+        counts of shape (num_seqs, 4 ** k).
+
+        exp_levels (numpy.ndarray) -- the expression levels of the
+        sequences.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str), 'TypeError: Input file path must be \
+    passed as a string.'
+    assert isinstance(num_workers, int) and num_workers > 0, 'num_workers \
+    must be a positive integer.'
+    assert isinstance(chunk_size, int) and chunk_size > 0, 'chunk_size must \
+    be a positive integer.'
+    # Functionality
+    import multiprocessing
+    import scipy.sparse as sparse
+    encode_chunk = functools.partial(kmer_encode_lines, k=k)
+    results = []
+    with smart_open(input_seqs, 'r') as infile:
+        infile.readline()
+        infile.readline()  # skip the first 2 info lines
+        chunks = iter(lambda: list(itertools.islice(infile, chunk_size)), [])
+        if num_workers == 1:
+            results = [encode_chunk(chunk) for chunk in chunks]
+        else:
+            # Keep at most 2 chunks per worker in flight, in file order.
+            with multiprocessing.Pool(num_workers) as pool:
+                pending = collections.deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(encode_chunk, (chunk,)))
+                    if len(pending) >= 2 * num_workers:
+                        results.append(pending.popleft().get())
+                results.extend(result.get() for result in pending)
+    if len(results) == 0:
+        results = [encode_chunk([])]
+    kmer_counts = sparse.vstack([result[0] for result in results],
+                                format='csr')
+    exp_levels = np.concatenate([result[1] for result in results])
+
+    return kmer_counts, exp_levels
+
+
+def augment_encoded_seqs(encoded_seqs, indices=None, reverse_complement=False,
+                         shifts=0, out=None):
+    """
+    Produces reverse-complemented and/or positionally shifted copies
+    of One-Hot (or Integer) encoded sequences by index arithmetic on
+    the encoded array, in a single gather. Reverse complementing
+    reverses the order of the base vectors and swaps the A/T and G/C
+    columns (or tokens). Shifting moves the base vectors 'shift'
+    positions to the right (or left, if negative), filling vacated
+    positions with the all-zero padding vector (or token) 'P'.
+
+    Args:
+    -----
+        encoded_seqs (numpy.ndarray) -- array of One-Hot encoded
+        sequences of shape (num_seqs, len_seq, 5), or of Integer
+        encoded sequences of shape (num_seqs, len_seq).
+
+        indices (numpy.ndarray) -- the indices of the sequences in
+        encoded_seqs to augment, i.e. the sequences in a batch.
+        Default: None (all sequences).
+
+        reverse_complement (bool or numpy.ndarray) -- whether to
+        reverse complement the sequences. Can be passed as a boolean
+        array to choose per sequence. Default: False.
+
+        shifts (int or numpy.ndarray) -- the number of positions
+        to shift the sequences by. Can be passed as an integer array
+        to choose per sequence. Default: 0.
+
+        out (numpy.ndarray) -- a preallocated array to write the
+        augmented sequences into, i.e. a reusable batch buffer.
+        Default: None (a new array is allocated).
+
+    Returns:
+    -----
+        augmented_seqs (numpy.ndarray) -- the augmented sequences,
+        of shape (len(indices),) + encoded_seqs.shape[1:].
+    """
+    # Assertions
+    assert isinstance(encoded_seqs, np.ndarray), 'Encoded sequences must be \
+    passed as a numpy array.'
+    assert encoded_seqs.ndim in (2, 3), 'Encoded sequences must be of shape \
+    (num_seqs, len_seq, 5) or, Integer encoded, (num_seqs, len_seq).'
+    # Functionality
+    num_seqs, len_seq = encoded_seqs.shape[:2]
+    if indices is None:
+        indices = np.arange(num_seqs)
+    indices = np.asarray(indices)
+    reverse_complement = np.broadcast_to(reverse_complement, indices.shape)
+    shifts = np.broadcast_to(shifts, indices.shape)
+    # Position in the parent sequence read for each output position
+    positions = np.arange(len_seq)[None, :] - shifts[:, None]
+    valid = (positions >= 0) & (positions < len_seq)
+    positions = np.where(reverse_complement[:, None],
+                         len_seq - 1 - positions, positions)
+    positions = np.clip(positions, 0, len_seq - 1)
+    if encoded_seqs.ndim == 2:
+        if out is None:
+            out = np.empty((len(indices), len_seq), dtype=encoded_seqs.dtype)
+        out[...] = encoded_seqs[indices[:, None], positions]
+        out[...] = np.where(reverse_complement[:, None],
+                            COMPLEMENT_TOKENS[out], out)
+        out[~valid] = 0
+        augmented_seqs = out
+
+        return augmented_seqs
+    num_chars = encoded_seqs.shape[2]
+    # Column in the parent base vector read for each output column
+    columns = np.where(reverse_complement[:, None],
+                       np.array(COMPLEMENT_ORDER)[None, :],
+                       np.arange(num_chars)[None, :])
+    if out is None:
+        out = np.empty((len(indices), len_seq, num_chars),
+                       dtype=encoded_seqs.dtype)
+    out[...] = encoded_seqs[indices[:, None, None], positions[:, :, None],
+                            columns[:, None, :]]
+    out[~valid] = 0
+    augmented_seqs = out
+
+    return augmented_seqs
+
+
+def batch_generator(encoded_seqs, exp_levels, batch_size=32,
+                    reverse_complement=False, max_shift=0, shuffle=True,
+                    seed=None, indices=None):
+    """
+    A generator that endlessly yields batches of encoded sequences
+    and their expression levels, for use with a Keras model's
+    fit_generator(). Sequences can be augmented on the fly: each
+    sequence in a batch is reverse complemented with probability
+    0.5 (if 'reverse_complement=True') and shifted by a random
+    number of positions between -max_shift and max_shift. Augmented
+    copies are only ever built one batch at a time, straight from
+    the encoded array, so nothing extra is written to disk or held
+    in memory.
+
+    Args:
+    -----
+        encoded_seqs (numpy.ndarray) -- array of One-Hot encoded
+        sequences of shape (num_seqs, len_seq, 5).
+
+        exp_levels (numpy.ndarray) -- the expression levels of the
+        sequences.
+
+        batch_size (int) -- the number of sequences per batch.
+        Default: 32.
+
+        reverse_complement (bool) -- whether to randomly reverse
+        complement sequences. Default: False.
+
+        max_shift (int) -- the maximum number of positions to
+        randomly shift sequences by. Default: 0.
+
+        shuffle (bool) -- whether to shuffle the order of the
+        sequences every epoch. Default: True.
+
+        seed (int) -- seed for the random state. Default: None.
+
+        indices (numpy.ndarray) -- the indices of the sequences to
+        draw batches from, i.e. the training set of a fold, so that
+        a subset can be used without copying encoded_seqs (which
+        may be a read-only memory map). Default: None (all
+        sequences).
+
+    Yields:
+    -----
+        batch_seqs (numpy.ndarray) -- the (augmented) batch of
+        encoded sequences.
+
+        batch_els (numpy.ndarray) -- their expression levels.
+    """
+    # Assertions
+    assert isinstance(encoded_seqs, np.ndarray), 'Encoded sequences must be \
+    passed as a numpy array.'
+    assert len(encoded_seqs) == len(exp_levels), 'Must have an expression \
+    level for every sequence.'
+    assert isinstance(batch_size, int) and batch_size > 0, 'batch_size must \
+    be a positive integer.'
+    assert isinstance(max_shift, int) and max_shift >= 0, 'max_shift must \
+    be a non-negative integer.'
+    # Functionality
+    random_state = np.random.RandomState(seed)
+    if indices is None:
+        subset = np.arange(len(encoded_seqs))
+    else:
+        subset = np.asarray(indices)
+    num_seqs = len(subset)
+    augment = reverse_complement or max_shift > 0
+    while True:
+        if shuffle:
+            order = subset[random_state.permutation(num_seqs)]
+        else:
+            order = subset
+        for start in range(0, num_seqs, batch_size):
+            indices = order[start:start + batch_size]
+            if not augment:
+                yield encoded_seqs[indices], exp_levels[indices]
+                continue
+            size = len(indices)
+            rc = np.zeros(size, dtype=bool)
+            if reverse_complement:
+                rc = random_state.rand(size) < 0.5
+            shifts = random_state.randint(-max_shift, max_shift + 1, size)
+            batch_seqs = augment_encoded_seqs(encoded_seqs, indices, rc,
+                                              shifts)
+            yield batch_seqs, exp_levels[indices]
+
+
 # def resize_array(input_array, resize_to=None, edit_front=False):
 #     """
 #     Takes an M x N 2D array (where M is the length to edit) and
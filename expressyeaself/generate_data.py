@@ -0,0 +1,275 @@
+"""
+This script contains functions to generate synthetic promoter
+libraries in the same layout as the raw data files found at
+https://www.ncbi.nlm.nih.gov/geo/query/acc.cgi?acc=GSE104878,
+for use in benchmarking and load-testing the processing pipeline.
+For example, a pTpA-type line would be of the form:
+    TGCATTTTTTTCACATC-(variable region)-GGTTACGGCTGTT\t<EL>
+"""
+from expressyeaself.utilities import atomic_open as atomic_open
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import ROOT_DIR as ROOT_DIR
+from expressyeaself.utilities import smart_open as smart_open
+import numpy as np
+import os
+
+BASE_BYTES = np.frombuffer(b'ATGC', dtype=np.uint8)
+BASE_CODES = np.zeros(256, dtype=np.uint8)
+BASE_CODES[BASE_BYTES] = np.arange(4)
+FLANK_LENGTHS = {'pTpA': (17, 13),
+                 'Abf1TATA': (16, 19)}
+
+
+def get_flanks_from_scaffold(scaffold_type='pTpA'):
+    """
+    Retrieves the constant flanking sequences that border the
+    variable region of raw oligonucleotide sequences, as found
+    either side of the variable region (NNN...) of the scaffold
+    sequence in the example/<scaffold_type>_data/ directory.
+
+    Args:
+    -----
+        scaffold_type (str) -- the scaffold type (pTpA or Abf1TATA)
+        whose flanks are to be retrieved. Default: 'pTpA'.
+
+    Returns:
+    -----
+        flank_A (str) -- the flank sequence preceding the variable
+        region.
+
+        flank_B (str) -- the flank sequence following the variable
+        region.
+
+        var_length (int) -- the length of the variable region in
+        the scaffold sequence.
+    """
+    # Assertions
+    assert isinstance(scaffold_type, str), 'Scaffold type must be passed \
+    as a string.'
+    assert scaffold_type in FLANK_LENGTHS.keys(), 'Scaffold type must be \
+    either pTpA or Abf1TATA.'
+    # Functionality
+    scaff_rel_path = ('example/' + scaffold_type + '_data/' + scaffold_type +
+                      '_scaffold.txt')
+    scaff_abs_path = os.path.join(ROOT_DIR, scaff_rel_path)
+    with smart_open(scaff_abs_path, 'r') as f:
+        scaffold = f.readline().rstrip()
+    var_start = scaffold.find('N')
+    var_end = scaffold.rfind('N') + 1
+    len_A, len_B = FLANK_LENGTHS[scaffold_type]
+    flank_A = scaffold[var_start - len_A:var_start]
+    flank_B = scaffold[var_end:var_end + len_B]
+    var_length = var_end - var_start
+
+    return flank_A, flank_B, var_length
+
+
+def generate_variable_regions(num_seqs, var_length=80, base_probs=None,
+                              motifs=None, motif_rate=0.0, random_state=None):
+    """
+    Generates an array of random variable regions, encoded as ASCII
+    byte values. Bases are drawn independently from the distribution
+    given by 'base_probs'. A fraction 'motif_rate' of the sequences
+    then have one of the given motifs written into them at a random
+    position.
+
+    Args:
+    -----
+        num_seqs (int) -- the number of variable regions to generate.
+
+        var_length (int) -- the length of each variable region.
+        Default: 80.
+
+        base_probs (list) -- the probabilities of drawing each of
+        the bases A, T, G and C respectively. Default: None (uniform).
+
+        motifs (list) -- the motif sequences (str) that may be seeded
+        into the variable regions. Default: None (no motifs).
+
+        motif_rate (float) -- the fraction of the variable regions
+        to seed with a motif. Default: 0.0.
+
+        random_state (numpy.random.RandomState) -- the random state
+        to draw from. Default: None (a new, unseeded random state).
+
+    Returns:
+    -----
+        regions (numpy.ndarray) -- array of shape (num_seqs,
+        var_length) and type uint8 containing the ASCII byte values
+        of the generated variable regions.
+
+        motif_counts (numpy.ndarray) -- the number of motifs seeded
+        into each variable region (0 or 1).
+    """
+    # Assertions
+    assert isinstance(num_seqs, int), 'Number of sequences must be an int.'
+    assert isinstance(var_length, int), 'Length of the variable region \
+    must be an int.'
+    assert 0.0 <= motif_rate <= 1.0, 'motif_rate must be between 0 and 1.'
+    if motifs is not None:
+        for motif in motifs:
+            assert len(motif) <= var_length, 'Motifs must not be longer \
+            than the variable region.'
+            assert set(motif.upper()) <= set('ATGC'), 'Motifs must only \
+            contain the bases A, T, G and C.'
+    # Functionality
+    if random_state is None:
+        random_state = np.random.RandomState()
+    codes = random_state.choice(4, size=(num_seqs, var_length), p=base_probs)
+    regions = BASE_BYTES[codes]
+    motif_counts = np.zeros(num_seqs, dtype=int)
+    if motifs and motif_rate > 0:
+        seeded = np.flatnonzero(random_state.rand(num_seqs) < motif_rate)
+        choices = random_state.randint(0, len(motifs), size=len(seeded))
+        for i, motif in enumerate(motifs):
+            rows = seeded[choices == i]
+            motif_bytes = np.frombuffer(motif.upper().encode(),
+                                        dtype=np.uint8)
+            starts = random_state.randint(0, var_length - len(motif) + 1,
+                                          size=len(rows))
+            cols = starts[:, None] + np.arange(len(motif))
+            regions[rows[:, None], cols] = motif_bytes
+            motif_counts[rows] += 1
+
+    return regions, motif_counts
+
+
+def generate_raw_library(num_seqs, scaffold_type='pTpA', el_mean=10.0,
+                         el_sd=3.0, base_probs=None, motifs=None,
+                         motif_rate=0.0, motif_effect=2.0,
+                         bad_length_fraction=0.0, bad_flank_fraction=0.0,
+                         compress=False, chunk_size=100000, seed=None):
+    """
+    Writes a synthetic library of raw oligonucleotide sequences and
+    their expression levels (tab separated) to an output file, in
+    the same layout as the raw pTpA or Abf1TATA data files. Each
+    sequence is a random (or motif-seeded) variable region embedded
+    between the flanks of the chosen scaffold. A controlled fraction
+    of the sequences can be given variable regions of the wrong
+    length, or a mutated flank, so that every branch of the
+    processing pipeline is exercised.
+
+    Args:
+    -----
+        num_seqs (int) -- the number of sequences to generate.
+
+        scaffold_type (str) -- the scaffold type (pTpA or Abf1TATA)
+        whose flanks surround the variable regions. Default: 'pTpA'.
+
+        el_mean (float) -- the mean of the normal distribution that
+        expression levels are drawn from. Default: 10.0.
+
+        el_sd (float) -- the standard deviation of the normal
+        distribution that expression levels are drawn from.
+        Default: 3.0.
+
+        base_probs (list) -- the probabilities of drawing each of the
+        bases A, T, G and C in the variable region. Default: None
+        (uniform).
+
+        motifs (list) -- motif sequences (str) to seed into the
+        variable regions. Default: None.
+
+        motif_rate (float) -- the fraction of sequences seeded with
+        a motif. Default: 0.0.
+
+        motif_effect (float) -- the amount added to the expression
+        level of sequences seeded with a motif. Default: 2.0.
+
+        bad_length_fraction (float) -- the fraction of sequences
+        whose variable region is not of the modal length.
+        Default: 0.0.
+
+        bad_flank_fraction (float) -- the fraction of sequences
+        with a single base mutated in one of their flanks.
+        Default: 0.0.
+
+        compress (bool) -- if True, the output file is gzipped.
+        Default: False.
+
+        chunk_size (int) -- the number of sequences generated and
+        written at a time. Default: 100000.
+
+        seed (int) -- seed for the random state, for reproducible
+        libraries. Default: None.
+
+    Returns:
+    -----
+        absolute_path (str) -- the absolute path of the output file
+        containing the synthetic library.
+    """
+    # Assertions
+    assert isinstance(num_seqs, int), 'Number of sequences must be an int.'
+    assert num_seqs > 0, 'Number of sequences must be positive.'
+    assert scaffold_type in FLANK_LENGTHS.keys(), 'Scaffold type must be \
+    either pTpA or Abf1TATA.'
+    assert 0.0 <= bad_length_fraction <= 1.0, 'bad_length_fraction must \
+    be between 0 and 1.'
+    assert 0.0 <= bad_flank_fraction <= 1.0, 'bad_flank_fraction must be \
+    between 0 and 1.'
+    assert isinstance(compress, bool), 'compress must be passed as a bool.'
+    assert isinstance(chunk_size, int) and chunk_size > 0, 'chunk_size must \
+    be a positive integer.'
+    # Functionality
+    random_state = np.random.RandomState(seed)
+    flank_A, flank_B, var_length = get_flanks_from_scaffold(scaffold_type)
+    flank_A = np.frombuffer(flank_A.encode(), dtype=np.uint8)
+    flank_B = np.frombuffer(flank_B.encode(), dtype=np.uint8)
+    # Define the output file path
+    time_stamp = get_time_stamp()
+    relative_path = ('example/' + scaffold_type + '_data/' + time_stamp +
+                     '_' + scaffold_type + '_synthetic_library.txt')
+    if compress:
+        relative_path += '.gz'
+    absolute_path = get_output_path(relative_path)
+    outfile = atomic_open(absolute_path, 'wb')
+    # Generate and write the library chunk by chunk
+    remaining = num_seqs
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        remaining -= size
+        regions, motif_counts = generate_variable_regions(
+            size, var_length, base_probs=base_probs, motifs=motifs,
+            motif_rate=motif_rate, random_state=random_state)
+        # Build fixed width lines: flank_A + region + flank_B + '\t'
+        lines = np.empty((size, len(flank_A) + var_length + len(flank_B) +
+                          1), dtype=np.uint8)
+        lines[:, :len(flank_A)] = flank_A
+        lines[:, len(flank_A):len(flank_A) + var_length] = regions
+        lines[:, len(flank_A) + var_length:-1] = flank_B
+        lines[:, -1] = ord('\t')
+        # Mutate a single flank base of the chosen fraction of lines
+        bad_flanks = np.flatnonzero(random_state.rand(size) <
+                                    bad_flank_fraction)
+        flank_cols = np.concatenate(
+            (np.arange(len(flank_A)),
+             np.arange(len(flank_A) + var_length, lines.shape[1] - 1)))
+        cols = flank_cols[random_state.randint(0, len(flank_cols),
+                                               size=len(bad_flanks))]
+        shift = random_state.randint(1, 4, size=len(bad_flanks))
+        codes = BASE_CODES[lines[bad_flanks, cols]]
+        lines[bad_flanks, cols] = BASE_BYTES[(codes + shift) % 4]
+        # Draw expression levels
+        exp_levels = random_state.normal(el_mean, el_sd, size)
+        exp_levels += motif_effect * motif_counts
+        exp_levels = np.clip(exp_levels, 0, None)
+        el_text = ('%.6f\n' * size % tuple(exp_levels)).encode().split(b'\n')
+        rows = lines.view('S%s' % (lines.shape[1])).ravel().tolist()
+        # Give the chosen fraction of lines a variable region of bad length
+        bad_lengths = np.flatnonzero(random_state.rand(size) <
+                                     bad_length_fraction)
+        for i in bad_lengths:
+            new_length = var_length
+            while new_length == var_length:
+                new_length = random_state.randint(var_length // 2,
+                                                  var_length * 3 // 2)
+            extra = BASE_BYTES[random_state.randint(0, 4, size=new_length)]
+            row = lines[i]
+            rows[i] = (row[:len(flank_A)].tobytes() + extra.tobytes() +
+                       row[len(flank_A) + var_length:].tobytes())
+        outfile.write(b''.join([row + el + b'\n' for row, el in
+                                zip(rows, el_text)]))
+    outfile.close()
+
+    return absolute_path
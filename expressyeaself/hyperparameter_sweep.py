@@ -0,0 +1,452 @@
+"""
+This script contains functions to run hyperparameter sweeps of the
+neural network model builders in construct_neural_net. Trials are
+trained in parallel worker processes (each capped to a number of
+threads), and weak trials are pruned early by successive halving:
+every trial is trained for a small number of epochs, and only the
+best 1/eta of them are trained on for eta times as many epochs, and
+so on up to the full budget. Results are appended to a JSON lines
+trial log, so an interrupted sweep can be resumed from where it
+stopped.
+"""
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import get_temp_path as get_temp_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+import itertools
+import json
+import math
+import multiprocessing
+import numpy as np
+import os
+import time
+
+BUILDERS = {'1d_cnn': 'build_1d_cnn_sequential',
+            '1d_cnn_student': 'build_1d_cnn_student',
+            '1d_loccon': 'build_1d_loccon',
+            'lstm': 'build_lstm_sequential_2d'}
+SEARCH_SPACES = {'1d_cnn': {'filters': [8, 15, 32, 64],
+                            'kernel_size': [3, 5, 7, 9],
+                            'strides': [1, 2, 3],
+                            'dropout': [0.1, 0.3, 0.5]},
+                 '1d_cnn_student': {'filters': [8, 16, 32],
+                                    'kernel_size': [5, 9, 13],
+                                    'pool_size': [2, 4, 8],
+                                    'dense_units': [8, 16, 32]},
+                 '1d_loccon': {'filters': [8, 16, 32],
+                               'kernel_size': [3, 5, 9],
+                               'strides': [1, 2],
+                               'dropout': [0.1, 0.3, 0.5],
+                               'dense_units': [5, 10, 25]},
+                 'lstm': {'units': [25, 50, 100],
+                          'dense_units': [10, 25, 50],
+                          'dropout': [0.1, 0.3, 0.5]}}
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'OPENBLAS_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS',
+                   'TF_NUM_INTEROP_THREADS']
+
+worker_state = {}  # the data, trainer and thread cap of each worker
+
+
+def sample_configs(search_space, num_trials=None, seed=None):
+    """
+    Samples hyperparameter configurations from a search space.
+
+    Args:
+    -----
+        search_space (dict) -- the candidate values (list) of each
+        hyperparameter (str).
+
+        num_trials (int) -- the number of distinct configurations to
+        sample at random. Default: None (every configuration in the
+        grid, in order).
+
+        seed (int) -- the seed of the random number generator.
+        Default: None.
+
+    Returns:
+    -----
+        configs (list) -- the sampled configurations (dict).
+    """
+    # Assertions
+    assert isinstance(search_space, dict), 'Search space must be passed \
+    as a dict.'
+    assert num_trials is None or (isinstance(num_trials, int) and
+                                  num_trials > 0), 'num_trials must be a \
+    positive integer.'
+    # Functionality
+    names = sorted(search_space.keys())
+    grid = list(itertools.product(*[search_space[name] for name in names]))
+    if num_trials is not None and num_trials < len(grid):
+        random_state = np.random.RandomState(seed)
+        chosen = random_state.choice(len(grid), num_trials, replace=False)
+        grid = [grid[i] for i in sorted(chosen)]
+    configs = [dict(zip(names, values)) for values in grid]
+
+    return configs
+
+
+def get_rung_budgets(min_epochs, max_epochs, eta=3):
+    """
+    Returns the cumulative number of epochs trials are trained for at
+    each rung of successive halving: min_epochs, min_epochs * eta,
+    ... up to (and always ending at) max_epochs.
+    """
+    # Assertions
+    assert 0 < min_epochs <= max_epochs, 'Need 0 < min_epochs <= \
+    max_epochs.'
+    assert eta > 1, 'eta must be greater than 1.'
+    # Functionality
+    budgets = [min_epochs]
+    while budgets[-1] < max_epochs:
+        budgets.append(min(int(math.ceil(budgets[-1] * eta)), max_epochs))
+
+    return budgets
+
+
+def load_sweep_data(input_seqs, validation_split=0.2, seed=None):
+    """
+    One-Hot encodes a processed data file and splits it into the
+    training and validation sets shared by every trial of a sweep.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file.
+
+        validation_split (float) -- the fraction of sequences held
+        out for validation. Default: 0.2.
+
+        seed (int) -- the seed of the random split. Default: None.
+
+    Returns:
+    -----
+        data (tuple) -- (x_train, y_train, x_val, y_val).
+    """
+    import expressyeaself.encode_sequences as encode
+    # Assertions
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert 0 < validation_split < 1, 'validation_split must be between 0 \
+    and 1.'
+    # Functionality
+    encoded_seqs, exp_levels, _ = encode.encode_sequences_with_method(
+        input_seqs)
+    order = np.random.RandomState(seed).permutation(len(encoded_seqs))
+    num_val = max(1, int(len(order) * validation_split))
+    train, val = order[num_val:], order[:num_val]
+    data = (encoded_seqs[train], exp_levels[train], encoded_seqs[val],
+            exp_levels[val])
+
+    return data
+
+
+def set_thread_cap(threads):
+    """
+    Sets the thread count environment variables of the math
+    libraries and of TensorFlow to 'threads' (or unsets them, for
+    None). These are read when a library is loaded, so they cap the
+    processes started afterwards, not the libraries already loaded
+    here.
+
+    Returns:
+    -----
+        previous (dict) -- the previous value (str, or None if
+        unset) of each variable, to restore them with.
+    """
+    previous = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    for var in THREAD_ENV_VARS:
+        if threads is None:
+            os.environ.pop(var, None)
+        else:
+            os.environ[var] = str(threads)
+
+    return previous
+
+
+def train_keras_trial(model_type, params, data, epochs, initial_epoch,
+                      checkpoint, previous_checkpoint=None, batch_size=128):
+    """
+    Trains a trial of a sweep with Keras: builds the model (or loads
+    it from the checkpoint of its previous rung, to continue training
+    a promoted trial), trains it from 'initial_epoch' up to 'epochs'
+    and saves it to the checkpoint of this rung. The checkpoint is
+    written to a temporary file and moved into place, so it is never
+    left half written.
+
+    Returns:
+    -----
+        val_loss (float) -- the validation loss after the last
+        epoch.
+    """
+    import expressyeaself.construct_neural_net as construct
+    import tensorflow as tf
+    threads = int(os.environ.get('TF_NUM_INTRAOP_THREADS', 0))
+    if threads > 0 and hasattr(tf, 'ConfigProto'):
+        config = tf.ConfigProto(intra_op_parallelism_threads=threads,
+                                inter_op_parallelism_threads=threads)
+        tf.keras.backend.set_session(tf.Session(config=config))
+    x_train, y_train, x_val, y_val = data
+    if previous_checkpoint is not None:
+        model = tf.keras.models.load_model(previous_checkpoint)
+    else:
+        builder = getattr(construct, BUILDERS[model_type])
+        model = builder(x_train.shape[1], **params)
+    hist = model.fit(x_train, y_train, epochs=epochs,
+                     initial_epoch=initial_epoch, batch_size=batch_size,
+                     validation_data=(x_val, y_val), verbose=0)
+    temp_path = get_temp_path(checkpoint)
+    try:
+        model.save(temp_path)
+        os.replace(temp_path, checkpoint)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    tf.keras.backend.clear_session()
+
+    return float(hist.history['val_loss'][-1])
+
+
+def get_checkpoint_path(checkpoint_prefix, trial, rung):
+    """
+    Returns the path of the checkpoint of a trial after a rung. Each
+    rung has its own checkpoint, so a resumed sweep always continues
+    a promoted trial from the rung it was logged at.
+    """
+
+    return checkpoint_prefix + '%d_rung_%d.hdf5' % (trial, rung)
+
+
+def init_sweep_worker(data, train_fn):
+    """
+    Initializes a sweep worker process with the shared data set and
+    the function that trains a trial.
+    """
+    worker_state['data'] = data
+    worker_state['train_fn'] = train_fn
+
+    return
+
+
+def run_trial(task):
+    """
+    Trains one trial of a sweep for one rung, in a worker process.
+
+    Args:
+    -----
+        task (tuple) -- (model_type, trial, rung, params, epochs,
+        initial_epoch, checkpoint, previous_checkpoint).
+
+    Returns:
+    -----
+        record (dict) -- the trial log record of the result. Trials
+        that fail get an infinite loss, and the error message.
+    """
+    (model_type, trial, rung, params, epochs, initial_epoch, checkpoint,
+     previous_checkpoint) = task
+    record = {'trial': trial, 'rung': rung, 'epochs': epochs}
+    t0 = time.time()
+    try:
+        record['val_loss'] = float(worker_state['train_fn'](
+            model_type, params, worker_state['data'], epochs, initial_epoch,
+            checkpoint, previous_checkpoint))
+    except Exception as e:
+        record['val_loss'] = float('inf')
+        record['error'] = repr(e)
+    record['seconds'] = round(time.time() - t0, 3)
+
+    return record
+
+
+def read_trial_log(log_path):
+    """
+    Reads a sweep's trial log: a header line describing the sweep,
+    followed by one result record per trained (trial, rung). A last
+    line cut short by an interruption is removed from the log.
+
+    Returns:
+    -----
+        header (dict) -- the description of the sweep.
+
+        results (dict) -- the result record of each (trial, rung).
+    """
+    with open(log_path, 'r+') as f:
+        lines = f.readlines()
+        if lines and not lines[-1].endswith('\n'):
+            lines.pop()
+            f.truncate(sum(len(line.encode()) for line in lines))
+    header = json.loads(lines[0])
+    results = {}
+    for line in lines[1:]:
+        record = json.loads(line)
+        results[(record['trial'], record['rung'])] = record
+
+    return header, results
+
+
+def append_to_log(log_path, record):
+    """
+    Appends a record to a trial log, flushed to disk so it survives
+    the sweep being killed.
+    """
+    with open(log_path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+    return
+
+
+def run_sweep(input_seqs, model_type='1d_cnn', search_space=None,
+              num_trials=None, min_epochs=1, max_epochs=9, eta=3,
+              num_workers=1, threads_per_worker=1, validation_split=0.2,
+              log_path=None, train_fn=train_keras_trial, data=None,
+              seed=None):
+    """
+    Runs a hyperparameter sweep of one of the model builders with
+    successive halving, training the trials of each rung in a pool
+    of worker processes. If the trial log at 'log_path' already
+    exists, the sweep is resumed: its configurations and budgets are
+    read from the log and trials already trained are not run again.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file to train and validate on.
+
+        model_type (str) -- the builder to sweep: '1d_cnn',
+        '1d_loccon' or 'lstm'. Default: '1d_cnn'.
+
+        search_space (dict) -- the candidate values (list) of each
+        hyperparameter (str) of the builder. Default: None (the
+        builder's entry in SEARCH_SPACES).
+
+        num_trials (int) -- the number of configurations sampled
+        from the search space. Default: None (the full grid).
+
+        min_epochs (int) -- the epochs every trial is trained for
+        at the first rung. Default: 1.
+
+        max_epochs (int) -- the epochs the best trials are trained
+        for at the last rung. Default: 9.
+
+        eta (int) -- the factor by which the number of trials is
+        cut, and the budget grown, at each rung. Default: 3.
+
+        num_workers (int) -- the number of worker processes.
+        Default: 1 (trials are trained in this process).
+
+        threads_per_worker (int) -- the number of threads each
+        worker may use, so that num_workers * threads_per_worker
+        matches the number of cores. Default: 1.
+
+        validation_split (float) -- the fraction of sequences held
+        out for validation. Default: 0.2.
+
+        log_path (str) -- the absolute path of the trial log.
+        Default: None (a new log in expressyeaself/models/sweeps/
+        under the work directory).
+
+        train_fn (function) -- the function that trains a trial,
+        called as train_fn(model_type, params, data, epochs,
+        initial_epoch, checkpoint, previous_checkpoint) and
+        returning the validation loss. Must be defined at the top
+        level of a module, so it can be sent to the workers.
+        Default: train_keras_trial.
+
+        data (tuple) -- (x_train, y_train, x_val, y_val) to use in
+        place of loading 'input_seqs'. Default: None.
+
+        seed (int) -- the seed for sampling configurations and
+        splitting the data. Default: None.
+
+    Returns:
+    -----
+        leaderboard (list) -- one record (dict) per trial, with its
+        'params', the 'epochs' it was trained for, its latest
+        'val_loss' and 'checkpoint', best first.
+
+        log_path (str) -- the absolute path of the trial log.
+    """
+    # Assertions
+    assert model_type in BUILDERS, 'model_type must be one of %s.' \
+        % (list(BUILDERS.keys()))
+    assert isinstance(num_workers, int) and num_workers > 0, 'num_workers \
+    must be a positive integer.'
+    # Functionality
+    if log_path is None:
+        log_path = get_output_path('expressyeaself/models/sweeps/' +
+                                   get_time_stamp() + '_' + model_type +
+                                   '_sweep.jsonl')
+    if os.path.exists(log_path):
+        header, results = read_trial_log(log_path)
+        assert header['model_type'] == model_type, 'Trial log is of a \
+        sweep of a different model type.'
+    else:
+        if search_space is None:
+            search_space = SEARCH_SPACES[model_type]
+        header = {'model_type': model_type,
+                  'configs': sample_configs(search_space, num_trials, seed),
+                  'budgets': get_rung_budgets(min_epochs, max_epochs, eta),
+                  'eta': eta}
+        results = {}
+        with open(log_path, 'w') as f:
+            f.write(json.dumps(header) + '\n')
+    configs, budgets = header['configs'], header['budgets']
+    checkpoint_prefix = os.path.splitext(log_path)[0] + '_trial_'
+    if data is None:
+        data = load_sweep_data(input_seqs, validation_split, seed)
+    if num_workers > 1:
+        previous = set_thread_cap(threads_per_worker)
+        try:
+            # Spawned, so the workers load their math libraries with
+            # the cap (a forked worker inherits those already loaded)
+            context = multiprocessing.get_context('spawn')
+            pool = context.Pool(num_workers, initializer=init_sweep_worker,
+                                initargs=(data, train_fn))
+        finally:
+            for var, value in previous.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+    else:
+        pool = None
+        init_sweep_worker(data, train_fn)
+    survivors = list(range(0, len(configs)))
+    try:
+        for rung, epochs in enumerate(budgets):
+            initial_epoch = budgets[rung - 1] if rung > 0 else 0
+            tasks = [(model_type, trial, rung, configs[trial], epochs,
+                      initial_epoch,
+                      get_checkpoint_path(checkpoint_prefix, trial, rung),
+                      get_checkpoint_path(checkpoint_prefix, trial, rung - 1)
+                      if rung > 0 else None)
+                     for trial in survivors if (trial, rung) not in results]
+            if pool is not None:
+                records = pool.imap_unordered(run_trial, tasks)
+            else:
+                records = map(run_trial, tasks)
+            for record in records:
+                results[(record['trial'], record['rung'])] = record
+                append_to_log(log_path, record)
+            # Promote the best 1/eta of the trials to the next rung
+            survivors.sort(key=lambda trial: (results[(trial, rung)]
+                                              ['val_loss'], trial))
+            survivors = survivors[:max(1, len(survivors) //
+                                       header['eta'])]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    leaderboard = []
+    for trial, params in enumerate(configs):
+        rung = max(r for t, r in results if t == trial)
+        leaderboard.append({'trial': trial, 'params': params,
+                            'epochs': budgets[rung],
+                            'val_loss': results[(trial, rung)]['val_loss'],
+                            'checkpoint': get_checkpoint_path(
+                                checkpoint_prefix, trial, rung)})
+    leaderboard.sort(key=lambda record: (-record['epochs'],
+                                         record['val_loss'],
+                                         record['trial']))
+
+    return leaderboard, log_path
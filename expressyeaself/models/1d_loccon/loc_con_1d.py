@@ -93,24 +93,23 @@ def tt_split(sequences, expression_levels):
     return train_x, test_x, train_y, test_y
 
 
-def loc_con_1d_model(filters, kernel_size, strides, drop_rate, dense_units1,
-                     dense_units_final, optimizer, loss):
+def loc_con_1d_model(sequences, filters, kernel_size, strides, drop_rate,
+                     dense_units1, dense_units_final, optimizer, loss):
     """
     This function reads in various parameters to compiles a
     LocallyConnected1D model, consisting of various layers
     including Dropout, Flatten and Dense. The function returns
     the model summary.
-    Input: Various parameters including filter size, kernel size,
+    Input: np.array of sequences (to take the input shape from), and
+    various parameters including filter size, kernel size,
     number of strides, x and y dimensional input values, dropout
     rate (for Dropout Layers), dense units (for Dense Layers) and
     the optimizer and loss methods for the model.compile function.
-    Output: model summary (based on model.summary() object)
+    Output: the compiled model, and its summary (based on
+    model.summary() object)
     """
-    # make a global variable
-    global model
-
     # import shape for inputs
-    shape = data_shape(sequences)  # noqa: F821
+    shape = data_shape(sequences)
     input_x = shape[1]
     input_y = shape[2]
 
@@ -142,7 +141,7 @@ def loc_con_1d_model(filters, kernel_size, strides, drop_rate, dense_units1,
     return (model, model.summary())
 
 
-def model_eval(sequences, expression_levels, epochs, batch_size):
+def model_eval(model, sequences, expression_levels, epochs, batch_size):
     """
     This function fits the LocallyConnected1D model, generated in
     the loc_con_1d_model() function, using the given train and test
@@ -150,7 +149,8 @@ def model_eval(sequences, expression_levels, epochs, batch_size):
     outputs these values as well as a graphical visualization by
     calling the plot_results() function and passing through these
     values.
-    Input: sequences and expression_level array, number of epochs
+    Input: the model returned by loc_con_1d_model(), sequences and
+    expression_level array, number of epochs
     to run the model for, and batch size (number of samples to
     train)
     Output: accuracy and loss values, accuracy and loss plots
@@ -0,0 +1,214 @@
+"""
+This script contains functions to perform in-silico saturation
+mutagenesis of promoter sequences, i.e. to predict the effect on
+expression level of every single-base substitution (and deletion)
+of a parent sequence. All mutants are built directly as edits of
+the One-Hot encoded parents and scored in large batches, so any
+model with a Keras-style predict() method can be used.
+"""
+import expressyeaself.encode_sequences as encode
+import numpy as np
+
+BASE_VECTORS = np.eye(5, dtype=np.float32)[:4]  # One-Hot A, T, G, C
+
+
+def encode_parent_seqs(parent_seqs):
+    """
+    One-Hot encodes a list of parent sequences of the same length
+    into a single 3D array.
+
+    Args:
+    -----
+        parent_seqs (list) -- the parent nucleotide sequences (str),
+        all of the same length.
+
+    Returns:
+    -----
+        encoded_parents (numpy.ndarray) -- array of shape
+        (num_parents, len_seq, 5) and type float32.
+    """
+    # Assertions
+    assert isinstance(parent_seqs, (list, tuple)), 'Parent sequences must \
+    be passed as a list.'
+    assert len(parent_seqs) > 0, 'At least one parent sequence must be given.'
+    assert len(set([len(seq) for seq in parent_seqs])) == 1, 'Parent \
+    sequences must all be of the same length.'
+    # Functionality
+    encoded_parents = np.array([encode.one_hot_encode_sequence(seq)
+                                for seq in parent_seqs], dtype=np.float32)
+
+    return encoded_parents
+
+
+def build_mutants(encoded_parents, deletions=True, pad_front=False):
+    """
+    Builds every single-base mutant of each One-Hot encoded parent.
+    For each parent, the output contains (in order) the parent
+    itself, its 4 x len_seq substitution mutants (position-major,
+    bases ordered as in encode_sequences.BASES, so the mutant that
+    'substitutes' the parent base is identical to the parent), and,
+    if specified, its len_seq deletion mutants. Deletion mutants are
+    kept at the parent length by padding with the 'P' (all zeros)
+    vector at the end, or at the front if 'pad_front=True'.
+
+    Args:
+    -----
+        encoded_parents (numpy.ndarray) -- the One-Hot encoded
+        parents, of shape (num_parents, len_seq, 5).
+
+        deletions (bool) -- whether to build deletion mutants.
+        Default: True.
+
+        pad_front (bool) -- whether deletion mutants are padded at
+        the front instead of the end. Default: False.
+
+    Returns:
+    -----
+        mutants (numpy.ndarray) -- array of shape (num_parents,
+        1 + 4 * len_seq (+ len_seq), len_seq, 5) containing the
+        encoded mutants of each parent.
+    """
+    # Assertions
+    assert isinstance(encoded_parents, np.ndarray), 'Encoded parents must \
+    be passed as a numpy array.'
+    assert encoded_parents.ndim == 3, 'Encoded parents must be of shape \
+    (num_parents, len_seq, 5).'
+    assert isinstance(deletions, bool)
+    assert isinstance(pad_front, bool)
+    # Functionality
+    num_parents, len_seq, width = encoded_parents.shape
+    num_subs = 4 * len_seq
+    num_mutants = 1 + num_subs + (len_seq if deletions else 0)
+    mutants = np.empty((num_parents, num_mutants, len_seq, width),
+                       dtype=encoded_parents.dtype)
+    mutants[:] = encoded_parents[:, None]
+    # Substitutions: overwrite one position of each copy with a base
+    rows = 1 + np.arange(num_subs)
+    positions = np.repeat(np.arange(len_seq), 4)
+    mutants[:, rows, positions, :] = np.tile(BASE_VECTORS[:, :width],
+                                             (len_seq, 1))
+    # Deletions: drop one position and shift the rest up against it
+    if deletions:
+        dels = mutants[:, 1 + num_subs:]
+        dels[:] = 0
+        cols = np.arange(len_seq - 1)
+        # Row i gathers every position of the parent except position i
+        gather = cols[None, :] + (cols[None, :] >= np.arange(len_seq)[:, None])
+        if pad_front:
+            dels[:, :, 1:] = encoded_parents[:, gather]
+        else:
+            dels[:, :, :-1] = encoded_parents[:, gather]
+
+    return mutants
+
+
+def format_model_input(loaded_model, encoded_seqs):
+    """
+    Converts One-Hot encoded sequences into the input form expected
+    by a model: token ids for models taking Integer encoded
+    sequences through an Embedding layer, or a reshape for models
+    whose input shape is a flattened One-Hot encoding.
+
+    Args:
+    -----
+        loaded_model (tensorflow.python.keras.
+        engine.training.Model) -- the loaded model.
+
+        encoded_seqs (numpy.ndarray) -- the One-Hot encoded
+        sequences, of shape (num_seqs, len_seq, 5).
+
+    Returns:
+    -----
+        model_input (numpy.ndarray) -- the sequences in the model's
+        input form.
+    """
+    # Functionality
+    input_shape = getattr(loaded_model, 'input_shape', None)
+    if input_shape is None:
+        return encoded_seqs
+    if len(input_shape) == 2 and input_shape[1] == encoded_seqs.shape[1]:
+        # Token ids as in encode_sequences.TOKENS; all zeros 'P' is 0
+        token_ids = np.arange(1, encoded_seqs.shape[2] + 1)
+        return encoded_seqs.dot(token_ids).astype(np.uint8)
+    if tuple(input_shape[1:]) != encoded_seqs.shape[1:]:
+        return encoded_seqs.reshape((len(encoded_seqs),) +
+                                    tuple(input_shape[1:]))
+
+    return encoded_seqs
+
+
+def saturation_mutagenesis(loaded_model, parent_seqs, deletions=True,
+                           pad_front=False, batch_size=8192):
+    """
+    Predicts the effect on expression level of every single-base
+    substitution and deletion of each parent sequence. The parents
+    are processed in chunks sized so that each call to predict()
+    scores roughly 'batch_size' mutants, so thousands of parents
+    can be scored with a handful of predict() calls instead of one
+    call per mutant.
+
+    Args:
+    -----
+        loaded_model (tensorflow.python.keras.
+        engine.training.Model) -- the loaded model, or any object
+        with a predict() method taking a batch of encoded sequences.
+
+        parent_seqs (list) -- the parent nucleotide sequences (str),
+        all of the length the model was trained on.
+
+        deletions (bool) -- whether to also score deletion mutants.
+        Default: True.
+
+        pad_front (bool) -- whether deletion mutants are padded at
+        the front instead of the end. Default: False.
+
+        batch_size (int) -- the approximate number of mutants scored
+        per call to predict(). Default: 8192.
+
+    Returns:
+    -----
+        parent_preds (numpy.ndarray) -- the predicted expression
+        level of each parent, of shape (num_parents,).
+
+        sub_effects (numpy.ndarray) -- the predicted change in
+        expression level for substituting each base at each
+        position, of shape (num_parents, len_seq, 4), with bases
+        ordered as in encode_sequences.BASES. The entry for the
+        parent's own base is 0.
+
+        del_effects (numpy.ndarray) -- the predicted change in
+        expression level for deleting each position, of shape
+        (num_parents, len_seq), or None if 'deletions=False'.
+    """
+    # Assertions
+    assert hasattr(loaded_model, 'predict'), 'Model must have a predict() \
+    method.'
+    assert isinstance(batch_size, int) and batch_size > 0, 'batch_size must \
+    be a positive integer.'
+    # Functionality
+    encoded_parents = encode_parent_seqs(parent_seqs)
+    num_parents, len_seq, _ = encoded_parents.shape
+    num_subs = 4 * len_seq
+    num_mutants = 1 + num_subs + (len_seq if deletions else 0)
+    parents_per_chunk = max(1, batch_size // num_mutants)
+    preds = np.empty((num_parents, num_mutants), dtype=np.float32)
+    for start in range(0, num_parents, parents_per_chunk):
+        stop = min(start + parents_per_chunk, num_parents)
+        mutants = build_mutants(encoded_parents[start:stop], deletions,
+                                pad_front)
+        mutants = mutants.reshape((-1,) + mutants.shape[2:])
+        model_input = format_model_input(loaded_model, mutants)
+        pred = np.asarray(loaded_model.predict(model_input,
+                                               batch_size=batch_size))
+        preds[start:stop] = pred.reshape(stop - start, num_mutants, -1)[..., 0]
+    parent_preds = preds[:, 0]
+    effects = preds[:, 1:] - parent_preds[:, None]
+    sub_effects = effects[:, :num_subs].reshape(num_parents, len_seq, 4)
+    # The 'substitution' to the parent base is the parent itself
+    sub_effects[encoded_parents[..., :4] == 1] = 0
+    if deletions:
+        del_effects = effects[:, num_subs:]
+    else:
+        del_effects = None
+
+    return parent_preds, sub_effects, del_effects
@@ -0,0 +1,555 @@
+"""
+This script contains a lightweight inference engine for the saved
+Keras models, that reads their weights with h5py and runs them in
+vectorized NumPy. It gives the same predictions as loading the
+models with TensorFlow, without the time and memory it takes to
+import TensorFlow, so short-lived jobs can start in milliseconds.
+"""
+import expressyeaself.encode_sequences as encode
+from expressyeaself.utilities import atomic_open as atomic_open
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import (get_saved_model_path as
+                                      get_saved_model_path)
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import MODELS_TO_USE as MODELS_TO_USE
+import json
+import numpy as np
+import os
+
+
+def relu(x):
+    return np.maximum(x, 0)
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0, 1)
+
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {'linear': lambda x: x,
+               'relu': relu,
+               'sigmoid': sigmoid,
+               'hard_sigmoid': hard_sigmoid,
+               'tanh': np.tanh,
+               'softmax': softmax}
+
+
+def pad_steps(x, kernel_extent, stride, padding, value=0.0):
+    """
+    Pads the steps (axis 1) of a batch of sequences for a
+    convolution or pooling window, following Keras' 'valid', 'same'
+    and 'causal' padding rules.
+
+    Args:
+    -----
+        x (numpy.ndarray) -- the input, of shape (batch, steps,
+        channels).
+
+        kernel_extent (int) -- the number of steps spanned by each
+        window.
+
+        stride (int) -- the stride of the windows.
+
+        padding (str) -- 'valid', 'same' or 'causal'.
+
+        value (float) -- the value to pad with. Default: 0.0.
+
+    Returns:
+    -----
+        padded (numpy.ndarray) -- the padded input.
+
+        num_out (int) -- the number of output steps.
+    """
+    # Functionality
+    steps = x.shape[1]
+    if padding == 'valid':
+        return x, (steps - kernel_extent) // stride + 1
+    if padding == 'causal':
+        left, right = kernel_extent - 1, 0
+        num_out = (steps - 1) // stride + 1
+    else:
+        num_out = (steps + stride - 1) // stride
+        total = max((num_out - 1) * stride + kernel_extent - steps, 0)
+        left, right = total // 2, total - total // 2
+    padded = np.pad(x, ((0, 0), (left, right), (0, 0)), mode='constant',
+                    constant_values=value)
+
+    return padded, num_out
+
+
+def conv1d(x, config, weights, mask=None):
+    """
+    Conv1D layer: one matrix multiplication per kernel position,
+    over the strided slices of the input it is applied to.
+    """
+    kernel = weights[0]
+    size = kernel.shape[0]
+    stride = config.get('strides', [1])[0]
+    dilation = config.get('dilation_rate', [1])[0]
+    x, num_out = pad_steps(x, (size - 1) * dilation + 1, stride,
+                           config.get('padding', 'valid'))
+    out = np.zeros((x.shape[0], num_out, kernel.shape[2]), dtype=x.dtype)
+    for k in range(0, size):
+        start = k * dilation
+        out += np.matmul(x[:, start:start + (num_out - 1) * stride + 1:stride],
+                         kernel[k])
+    if config.get('use_bias', True):
+        out += weights[1]
+
+    return ACTIVATIONS[config.get('activation', 'linear')](out), None
+
+
+def pooling1d(x, config, weights, mask=None):
+    """
+    MaxPooling1D and AveragePooling1D layers.
+    """
+    size = config['pool_size'][0]
+    stride = (config.get('strides') or config['pool_size'])[0]
+    is_max = config['class_name'] == 'MaxPooling1D'
+    pad_value = -np.inf if is_max else 0.0
+    x, num_out = pad_steps(x, size, stride, config.get('padding', 'valid'),
+                           pad_value)
+    windows = [x[:, k:k + (num_out - 1) * stride + 1:stride]
+               for k in range(0, size)]
+    if is_max:
+        out = np.maximum.reduce(windows)
+    else:
+        out = np.add.reduce(windows) / size
+
+    return out, None
+
+
+def global_pooling1d(x, config, weights, mask=None):
+    """
+    GlobalAveragePooling1D and GlobalMaxPooling1D layers.
+    """
+    if config['class_name'] == 'GlobalMaxPooling1D':
+        return x.max(axis=1), None
+
+    return x.mean(axis=1), None
+
+
+def dense(x, config, weights, mask=None):
+    """
+    Dense layer.
+    """
+    out = np.matmul(x, weights[0])
+    if config.get('use_bias', True):
+        out += weights[1]
+
+    return ACTIVATIONS[config.get('activation', 'linear')](out), mask
+
+
+def flatten(x, config, weights, mask=None):
+    """
+    Flatten layer.
+    """
+    return x.reshape(len(x), -1), None
+
+
+def dropout(x, config, weights, mask=None):
+    """
+    Dropout layer: a no-op at inference time.
+    """
+    return x, mask
+
+
+def mc_dropout(x, config, random_state):
+    """
+    Dropout layer kept active, as in training (Monte Carlo dropout):
+    each value is zeroed with probability 'rate', and the rest are
+    scaled up by 1 / (1 - rate).
+    """
+    rate = config.get('rate', 0.0)
+    if rate <= 0:
+        return x
+    keep = random_state.rand(*x.shape) >= rate
+
+    return np.where(keep, x / (1 - rate), 0).astype(x.dtype)
+
+
+def embedding(x, config, weights, mask=None):
+    """
+    Embedding layer: a lookup of each token's vector, with a mask
+    of the non-padding tokens if 'mask_zero' is set.
+    """
+    tokens = x.astype(np.intp)
+    if config.get('mask_zero', False):
+        mask = tokens != 0
+
+    return weights[0][tokens], mask
+
+
+def lstm(x, config, weights, mask=None):
+    """
+    LSTM layer. The input projections of every step are computed in
+    a single matrix multiplication up front, leaving only the
+    recurrent projection in the loop over steps. Gates are in Keras'
+    order: input, forget, cell, output.
+    """
+    kernel, recurrent_kernel = weights[0], weights[1]
+    units = recurrent_kernel.shape[0]
+    activation = ACTIVATIONS[config.get('activation', 'tanh')]
+    recurrent_activation = ACTIVATIONS[config.get('recurrent_activation',
+                                                  'hard_sigmoid')]
+    projected = np.matmul(x, kernel)
+    if config.get('use_bias', True):
+        projected += weights[2]
+    steps = range(0, x.shape[1])
+    if config.get('go_backwards', False):
+        steps = reversed(steps)
+    h = np.zeros((x.shape[0], units), dtype=projected.dtype)
+    c = np.zeros_like(h)
+    outputs = []
+    for t in steps:
+        z = projected[:, t] + np.matmul(h, recurrent_kernel)
+        i = recurrent_activation(z[:, :units])
+        f = recurrent_activation(z[:, units:2 * units])
+        new_c = f * c + i * activation(z[:, 2 * units:3 * units])
+        o = recurrent_activation(z[:, 3 * units:])
+        new_h = o * activation(new_c)
+        if mask is not None:
+            # Masked steps carry the previous state forward
+            keep = mask[:, t:t + 1]
+            new_c = np.where(keep, new_c, c)
+            new_h = np.where(keep, new_h, h)
+        h, c = new_h, new_c
+        outputs.append(h)
+    if config.get('return_sequences', False):
+        return np.stack(outputs, axis=1), mask
+
+    return h, None
+
+
+def quantize_activations(x, scale):
+    """
+    Quantizes the input of a layer to symmetric int8 values, i.e.
+    round(x / scale) clipped to [-127, 127]. The values are kept in
+    a float32 array so that the integer products can be summed by
+    the BLAS matrix multiplication, which is exact while the sums
+    stay below 2 ** 24. NumPy has no integer BLAS, so the int8
+    arithmetic is emulated rather than sped up: quantized layers
+    are smaller, not faster, than float ones.
+    """
+    return np.clip(np.rint(x / scale), -127, 127).astype(np.float32)
+
+
+def quantized_conv1d(x, config, weights, mask=None):
+    """
+    QuantizedConv1D layer: a Conv1D layer with int8 weights (one
+    scale per output channel) and int8 activations (a single scale
+    given by 'input_scale'), whose integer outputs are rescaled to
+    float32 before the bias and activation are applied. The kernel
+    is given as float32 integer values (see get_compute_weights).
+    """
+    kernel, kernel_scale, bias = weights
+    x_q = quantize_activations(x, config['input_scale'])
+    out, _ = conv1d(x_q, dict(config, use_bias=False, activation='linear'),
+                    [kernel])
+    out *= config['input_scale'] * kernel_scale
+    if config.get('use_bias', True):
+        out += bias
+
+    return ACTIVATIONS[config.get('activation', 'linear')](out), None
+
+
+def quantized_dense(x, config, weights, mask=None):
+    """
+    QuantizedDense layer: the Dense counterpart of
+    quantized_conv1d.
+    """
+    kernel, kernel_scale, bias = weights
+    x_q = quantize_activations(x, config['input_scale'])
+    out = np.matmul(x_q, kernel)
+    out *= config['input_scale'] * kernel_scale
+    if config.get('use_bias', True):
+        out += bias
+
+    return ACTIVATIONS[config.get('activation', 'linear')](out), mask
+
+
+LAYERS = {'Conv1D': conv1d,
+          'MaxPooling1D': pooling1d,
+          'AveragePooling1D': pooling1d,
+          'GlobalAveragePooling1D': global_pooling1d,
+          'GlobalMaxPooling1D': global_pooling1d,
+          'Dense': dense,
+          'Flatten': flatten,
+          'Dropout': dropout,
+          'Embedding': embedding,
+          'LSTM': lstm,
+          'QuantizedConv1D': quantized_conv1d,
+          'QuantizedDense': quantized_dense}
+
+
+def get_compute_weights(config, weights):
+    """
+    Returns the weights a layer is computed with: the int8 kernels
+    of the quantized layers are converted to float32 (see
+    quantize_activations) once, when the model is built, rather than
+    for every batch. Other layers' weights are returned as they are.
+    """
+    if config['class_name'] not in ('QuantizedConv1D', 'QuantizedDense'):
+        return weights
+
+    return [weights[0].astype(np.float32)] + list(weights[1:])
+
+
+class NumpyModel(object):
+    """
+    A Sequential model whose layers are run in NumPy. Has the same
+    predict() method and 'input_shape' attribute as a Keras model,
+    so it can be used wherever a loaded Keras model is expected for
+    inference.
+
+    Args:
+    -----
+        layers (list) -- (config, weights) pairs of each layer, in
+        order, where config is the Keras config dict of the layer
+        with its 'class_name' added, and weights is the list of its
+        weight arrays.
+
+        input_shape (tuple) -- the input shape of the model, i.e.
+        (None, 80, 5).
+    """
+    def __init__(self, layers, input_shape):
+        for config, weights in layers:
+            if config['class_name'] not in LAYERS:
+                raise Exception('Layer type %s is not supported by the \
+                NumPy runtime.' % (config['class_name']))
+        self.layers = layers
+        self.input_shape = input_shape
+        self.compute_layers = [(config, get_compute_weights(config, weights))
+                               for config, weights in layers]
+
+    def predict(self, x, batch_size=1024):
+        """
+        Predicts the outputs for a batch of encoded sequences, in
+        batches of 'batch_size'.
+        """
+        outputs = []
+        for start in range(0, len(x), batch_size):
+            out = np.asarray(x[start:start + batch_size])
+            if out.dtype != np.float32 and len(self.input_shape) != 2:
+                out = out.astype(np.float32)
+            mask = None
+            for config, weights in self.compute_layers:
+                out, mask = LAYERS[config['class_name']](out, config,
+                                                         weights, mask)
+            outputs.append(out)
+
+        return np.concatenate(outputs)
+
+    def predict_mc_dropout(self, x, num_samples=30, batch_size=1024,
+                           seed=None):
+        """
+        Predicts the outputs for a batch of encoded sequences with
+        Monte Carlo dropout: 'num_samples' predictions are made for
+        each sequence with the Dropout layers active, in a single
+        pass over the model. The layers before the first Dropout
+        layer are deterministic, so they are run once per sequence,
+        and only their outputs are tiled 'num_samples' times.
+
+        Args:
+        -----
+            x (numpy.ndarray) -- the encoded sequences.
+
+            num_samples (int) -- the number of dropout samples per
+            sequence. Default: 30.
+
+            batch_size (int) -- the number of sequences run through
+            the model at a time. Default: 1024.
+
+            seed (int) -- the seed of the dropout masks.
+            Default: None.
+
+        Returns:
+        -----
+            mean (numpy.ndarray) -- the mean of the samples of each
+            output, of shape (num_seqs, num_outputs).
+
+            std (numpy.ndarray) -- their standard deviation.
+        """
+        # Assertions
+        assert isinstance(num_samples, int) and num_samples > 0, \
+            'num_samples must be a positive integer.'
+        # Functionality
+        random_state = np.random.RandomState(seed)
+        class_names = [config['class_name'] for config, _ in self.layers]
+        first = class_names.index('Dropout') if 'Dropout' in class_names \
+            else len(self.layers)
+        means = []
+        stds = []
+        for start in range(0, len(x), batch_size):
+            out = np.asarray(x[start:start + batch_size])
+            if out.dtype != np.float32 and len(self.input_shape) != 2:
+                out = out.astype(np.float32)
+            num_seqs = len(out)
+            mask = None
+            for i, (config, weights) in enumerate(self.compute_layers):
+                if i == first:
+                    # Tile the deterministic part's outputs
+                    out = np.repeat(out, num_samples, axis=0)
+                    if mask is not None:
+                        mask = np.repeat(mask, num_samples, axis=0)
+                if config['class_name'] == 'Dropout':
+                    out = mc_dropout(out, config, random_state)
+                else:
+                    out, mask = LAYERS[config['class_name']](out, config,
+                                                             weights, mask)
+            if first == len(self.layers):
+                out = np.repeat(out, num_samples, axis=0)
+            out = out.reshape(num_seqs, num_samples, -1)
+            means.append(out.mean(axis=1))
+            stds.append(out.std(axis=1))
+
+        return np.concatenate(means), np.concatenate(stds)
+
+
+def load_numpy_model(saved_model):
+    """
+    Loads a saved Sequential Keras model (.hdf5) as a NumpyModel,
+    reading its architecture and weights with h5py.
+
+    Args:
+    -----
+        saved_model (str) -- the absolute path of the saved model.
+
+    Returns:
+    -----
+        numpy_model (NumpyModel) -- the loaded model.
+    """
+    # Assertions
+    assert isinstance(saved_model, str)
+    assert os.path.exists(saved_model), 'Saved model does not exist.'
+    # Functionality
+    import h5py
+    with h5py.File(saved_model, 'r') as f:
+        model_config = f.attrs['model_config']
+        if isinstance(model_config, bytes):
+            model_config = model_config.decode()
+        model_config = json.loads(model_config)
+        if model_config['class_name'] != 'Sequential':
+            raise Exception('Only Sequential models are supported by the \
+            NumPy runtime.')
+        layer_configs = model_config['config']
+        if isinstance(layer_configs, dict):
+            layer_configs = layer_configs['layers']
+        group = f['model_weights'] if 'model_weights' in f else f
+        layers = []
+        input_shape = None
+        for layer in layer_configs:
+            config = dict(layer['config'], class_name=layer['class_name'])
+            if input_shape is None and 'batch_input_shape' in config:
+                input_shape = tuple(None if dim is None else int(dim)
+                                    for dim in config['batch_input_shape'])
+            if layer['class_name'] == 'InputLayer':
+                continue
+            weights = []
+            if config['name'] in group:
+                layer_group = group[config['name']]
+                for name in layer_group.attrs['weight_names']:
+                    if isinstance(name, bytes):
+                        name = name.decode()
+                    weights.append(np.array(layer_group[name],
+                                            dtype=np.float32))
+            layers.append((config, weights))
+    numpy_model = NumpyModel(layers, input_shape)
+
+    return numpy_model
+
+
+def get_numpy_predictions_for_input_file(input_seqs, model_to_use,
+                                         sort_df=True, write_to_file=False,
+                                         batch_size=1024, top_k=None,
+                                         bottom_k=None):
+    """
+    Takes an input file of sequences and returns a DataFrame of the
+    sequences and their predicted expression levels, based on the
+    specified model run with the NumPy runtime. Gives the same
+    results as construct_neural_net.get_predictions_for_input_file,
+    without importing TensorFlow.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the input file
+        containing sequences to get predictions for. Must be one
+        sequence per line and sequences must be of the same length
+        as the sequences the model was trained on.
+
+        model_to_use (str) -- the type of pre-existing model to
+        load.
+
+        sort_df (bool) -- whether or not to sort the resulting
+        data frame in descending order based on expression level.
+        Default: True.
+
+        write_to_file (bool) -- whether or not to write the results
+        of the prediction to an output file. Default: False.
+
+        batch_size (int) -- the number of sequences run through the
+        model at a time. Default: 1024.
+
+        top_k (int) -- if given (or 'bottom_k'), only the 'top_k'
+        highest predictions are kept, streaming the input file (see
+        construct_neural_net.get_ranked_predictions). Default: None.
+
+        bottom_k (int) -- if given, the 'bottom_k' lowest predictions
+        are also kept, after the highest ones. Default: None.
+
+    Returns:
+    -----
+        results_df (pandas.DataFrame) -- the resulting data frame
+        containing input sequences and predicted expression levels.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert isinstance(model_to_use, str)
+    assert model_to_use in MODELS_TO_USE
+    assert isinstance(sort_df, bool)
+    # Functionality
+    import pandas as pd
+    numpy_model = load_numpy_model(get_saved_model_path(model_to_use))
+    ranked = top_k is not None or bottom_k is not None
+    if ranked:
+        import expressyeaself.construct_neural_net as construct
+        results_df = construct.get_ranked_predictions(
+            input_seqs, numpy_model, top_k or 0, bottom_k or 0, batch_size)
+    else:
+        results_df = pd.read_csv(input_seqs, names=['seq', 'el_prediction'])
+        if len(numpy_model.input_shape) == 2:
+            encoder = encode.integer_encode_sequence
+        else:
+            encoder = encode.one_hot_encode_sequence
+        encoded_seqs = np.array([encoder(seq) for seq in results_df['seq']])
+        predictions = numpy_model.predict(encoded_seqs, batch_size=batch_size)
+        results_df['el_prediction'] = predictions.reshape(len(results_df),
+                                                          -1)[:, 0]
+    if sort_df and not ranked:
+        results_df = results_df.sort_values('el_prediction', ascending=False)
+        results_df = results_df.reset_index()
+    if write_to_file:
+        out_path = get_output_path('expressyeaself/models/'
+                                   'prediction_results/')
+        stamp = get_time_stamp()
+        filename = stamp + '_' + model_to_use + '_prediction_results.txt'
+        abs_path = out_path + filename
+        if sort_df or ranked:
+            columns = ['index', 'seq', 'el_prediction']
+        else:
+            columns = ['seq', 'el_prediction']
+        with atomic_open(abs_path, 'w') as outfile:
+            results_df.to_csv(outfile, header=None, index=None,
+                              sep='\t', columns=columns)
+        print('Results can be found at: ' + abs_path)
+
+    return results_df
@@ -3,18 +3,26 @@ This script contains functions to organize and split up data based
 on several experimental parameters.
 """
 # import expressyeaself.utilities. as utilities  # noqa: F401
+from expressyeaself.utilities import atomic_open as atomic_open
 from expressyeaself.utilities import check_valid_line as check_valid_line
+from expressyeaself.utilities import get_output_path as get_output_path
 from expressyeaself.utilities import get_seq_count as get_seq_count
 from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import ROOT_DIR as ROOT_DIR  # noqa: F401
 from expressyeaself.utilities import (separate_seq_and_el_data as
                                       separate_seq_and_el_data)
 from expressyeaself.utilities import smart_open as smart_open
-import numpy as np
+import hashlib
 import os
-import pandas as pd
 import random
+import shutil
 
-ROOT_DIR = os.getcwd()[:os.getcwd().rfind('Express')] + 'ExpressYeaself/'
+AGGREGATES = ['mean', 'median']
+FLANKS = {'pTpA': ('TGCATTTTTTTCACATC', 'GGTTACGGCTGTT'),
+          'Abf1TATA': ('TCACGCAGTATAGTTC', 'GGTTTATTGTTTATAAAAA')}
+NATIVE_COLUMNS = ['seq', 'isNative', 'EL.originalHQ', 'EL.rep1', 'EL.rep2',
+                  'EL.combined']
+NATIVE_EL_COLUMNS = NATIVE_COLUMNS[2:]
 
 
 def sort_by_exp_level(input_seqs):
@@ -39,6 +47,7 @@ def sort_by_exp_level(input_seqs):
     passed as a string.'
     assert os.path.exists(input_seqs), 'Input file does not exist.'
     # Functionality
+    import pandas as pd
     with smart_open(input_seqs, 'r') as f:
         line = check_valid_line(f.readline())
         seq1, _ = separate_seq_and_el_data(line)
@@ -87,6 +96,7 @@ def discard_mid_data(sorted_df, percentile=0.25):
         rows. This data frame has length:
         (2 * percentile * len(sorted_df))
     """
+    import pandas as pd
     # Assertions
     assert isinstance(sorted_df, pd.DataFrame), ('Input data frame must be of'
                                                  ' type pandas.DataFrame')
@@ -138,10 +148,12 @@ def binarize_data(input_df):
         input_df (pandas.DataFrame) -- data frame modified so
         that expression levels have been binarized into 1 or 0.
     """
+    import pandas as pd
     # Assertions
     assert isinstance(input_df, pd.DataFrame), ('Input data frame must be of'
                                                 'type pandas.DataFrame')
     # Functionality
+    import numpy as np
     # Define an array of binary values
     does_express = np.ones(len(input_df) // 2).astype(int)
     does_not_express = np.zeros(len(input_df) // 2).astype(int)
@@ -170,6 +182,7 @@ def write_df_to_file(input_df):
         absolute_path (str) -- the absolute path of the the output
         file where the contents of the data frame are written.
     """
+    import pandas as pd
     # Assertions
     assert isinstance(input_df, pd.DataFrame), ('Input data frame must be of'
                                                 ' type pandas.DataFrame')
@@ -178,10 +191,11 @@ def write_df_to_file(input_df):
     time_stamp = get_time_stamp()
     relative_path = 'example/processed_data/' + time_stamp + '_df_to_file.txt'
 
-    absolute_path = os.path.join(ROOT_DIR, relative_path)
+    absolute_path = get_output_path(relative_path)
     # Writing to file
-    input_df.to_csv(absolute_path, header=None, index=None,
-                    sep='\t', mode='w+', columns=['seq', 'el'])
+    with atomic_open(absolute_path, 'w') as outfile:
+        input_df.to_csv(outfile, header=None, index=None,
+                        sep='\t', columns=['seq', 'el'])
 
     return absolute_path
 
@@ -273,10 +287,10 @@ def pull_homogeneous_seqs(input_seqs, scaffold_type=None):
     else:
         relative_path += (scaffold_type + '_data/' + time_stamp + '_' +
                           scaffold_type + '_homogeneous_seqs.txt')
-    absolute_path = os.path.join(ROOT_DIR, relative_path)
+    absolute_path = get_output_path(relative_path)
     # Open the input and output files.
     infile = smart_open(input_seqs, 'r')
-    output_seqs = smart_open(absolute_path, 'w')
+    output_seqs = atomic_open(absolute_path, 'w')
     # Retrieve modal length for sequences in input file.
     if scaffold_type == 'pTpA':
         modal_length = 110
@@ -361,6 +375,347 @@ def check_oligonucleotide_flanks(seq_infile, scaffold_type):
     return incorrect_lines
 
 
+def get_seq_hash(seq):
+    """
+    Returns a compact, deterministic 64-bit hash of a nucleotide
+    sequence. Unlike the built-in hash(), the value is the same
+    across processes and sessions, so it can be used to partition
+    sequences between files.
+
+    Args:
+    -----
+        seq (str) -- the nucleotide sequence to hash.
+
+    Returns:
+    -----
+        seq_hash (int) -- the 64-bit hash of the sequence.
+    """
+    # Assertions
+    assert isinstance(seq, str), 'Input sequence must be a string.'
+    # Functionality
+    digest = hashlib.blake2b(seq.encode(), digest_size=8).digest()
+    seq_hash = int.from_bytes(digest, 'little')
+
+    return seq_hash
+
+
+def aggregate_els(exp_levels, aggregate='mean'):
+    """
+    Aggregates the expression levels measured for replicates of
+    the same sequence into a single value.
+
+    Args:
+    -----
+        exp_levels (list) -- the expression levels (float) measured
+        for one sequence.
+
+        aggregate (str) -- the method of aggregation. Must be one
+        of: 'mean' or 'median'. Default: 'mean'.
+
+    Returns:
+    -----
+        exp_level (float) -- the aggregated expression level.
+    """
+    import numpy as np
+    # Assertions
+    assert len(exp_levels) > 0, 'At least one expression level needed.'
+    assert aggregate in AGGREGATES, 'Aggregate must be one of %s' \
+        % (AGGREGATES)
+    # Functionality
+    if aggregate == 'mean':
+        exp_level = float(np.mean(exp_levels))
+    elif aggregate == 'median':
+        exp_level = float(np.median(exp_levels))
+
+    return exp_level
+
+
+def deduplicate_seqs(input_seqs, aggregate='mean', write_counts=False,
+                     max_seqs_in_memory=5000000, num_partitions=16):
+    """
+    Merges repeated sequences in an input file of sequences and
+    their expression levels (tab separated), writing each distinct
+    sequence once along with the aggregate of its expression levels.
+    Sequences are keyed on a 64-bit hash, with the full sequence
+    kept alongside to verify against hash collisions. If the number
+    of distinct sequences exceeds 'max_seqs_in_memory', all data is
+    spilled to 'num_partitions' partition files by hash, and each
+    partition is then deduplicated in turn, bounding memory use to
+    roughly 1/num_partitions of the distinct sequences.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the input file
+        containing sequences and their expression levels.
+
+        aggregate (str) -- how to combine the expression levels of
+        repeated sequences. Must be one of: 'mean' or 'median'.
+        Default: 'mean'.
+
+        write_counts (bool) -- if True, the number of times each
+        sequence was measured is written as a third column of the
+        output file. Default: False.
+
+        max_seqs_in_memory (int) -- the number of distinct sequences
+        to hold in memory before spilling partitions to disk.
+        Default: 5000000.
+
+        num_partitions (int) -- the number of partition files to
+        spill to. Default: 16.
+
+    Returns:
+    -----
+        absolute_path (str) -- the absolute path of the output file
+        containing the deduplicated sequences.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str), 'Path name for input file must be \
+    passed as a string.'
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert aggregate in AGGREGATES, 'Aggregate must be one of %s' \
+        % (AGGREGATES)
+    assert isinstance(write_counts, bool), 'write_counts must be passed as \
+    a bool.'
+    assert isinstance(max_seqs_in_memory, int), 'max_seqs_in_memory must be \
+    passed as an integer.'
+    assert max_seqs_in_memory > 0, 'max_seqs_in_memory must be positive.'
+    assert isinstance(num_partitions, int), 'num_partitions must be passed \
+    as an integer.'
+    assert num_partitions > 0, 'num_partitions must be positive.'
+    # Functionality
+    # Define the path names of the output and partition files.
+    time_stamp = get_time_stamp()
+    relative_path = 'example/processed_data/' + time_stamp
+    absolute_path = get_output_path(relative_path)
+    partition_paths = [absolute_path + '_dedup_partition_%s.txt' % (i)
+                       for i in range(0, num_partitions)]
+    absolute_path += '_deduplicated_seqs.txt'
+    # Group expression levels by sequence, spilling to disk if needed.
+    groups = {}  # hash ---> list of [seq, [el, el, ...]] entries
+    distinct = 0
+    partitions = None
+    with smart_open(input_seqs, 'r') as infile:
+        for line in infile:
+            line = check_valid_line(line)
+            if line == 'skip_line':
+                continue
+            seq, exp_level = separate_seq_and_el_data(line)
+            seq_hash = get_seq_hash(seq)
+            if partitions is not None:
+                idx = seq_hash % num_partitions
+                partitions[idx].write(seq + '\t' + str(exp_level) + '\n')
+                continue
+            entries = groups.setdefault(seq_hash, [])
+            for entry in entries:
+                if entry[0] == seq:  # verify against hash collisions
+                    entry[1].append(exp_level)
+                    break
+            else:
+                entries.append([seq, [exp_level]])
+                distinct += 1
+            if distinct > max_seqs_in_memory:
+                # Spill everything seen so far to partition files.
+                partitions = [smart_open(path, 'w')
+                              for path in partition_paths]
+                for seq_hash, entries in groups.items():
+                    idx = seq_hash % num_partitions
+                    for seq, exp_levels in entries:
+                        for exp_level in exp_levels:
+                            partitions[idx].write(seq + '\t' +
+                                                  str(exp_level) + '\n')
+                groups = {}
+    # Write the aggregated data to the output file.
+    if partitions is None:
+        merged = [seq_data for entries in groups.values()
+                  for seq_data in entries]
+        partition_paths = []
+    else:
+        for partition in partitions:
+            partition.close()
+        merged = []
+    outfile = atomic_open(absolute_path, 'w')
+    for path in [None] + partition_paths:
+        if path is not None:
+            # Each partition holds every replicate of its sequences, so
+            # it can be keyed on the full sequence in memory.
+            part_groups = {}
+            with smart_open(path, 'r') as f:
+                for line in f:
+                    seq, exp_level = separate_seq_and_el_data(line)
+                    part_groups.setdefault(seq, []).append(exp_level)
+            merged = part_groups.items()
+        for seq, exp_levels in merged:
+            outline = seq + '\t' + str(aggregate_els(exp_levels, aggregate))
+            if write_counts:
+                outline += '\t' + str(len(exp_levels))
+            outfile.write(outline + '\n')
+    outfile.close()
+    remove_file_list(partition_paths)
+
+    return absolute_path
+
+
+def stream_native_data(input_seqs, el_column='EL.combined', is_native=None,
+                       deflank=False, scaffold_type='pTpA'):
+    """
+    A generator that streams sequences and expression levels from
+    a file in the multi-column native data format, i.e. a header
+    line followed by tab separated lines with the columns:
+    "seq  isNative  EL.originalHQ  EL.rep1  EL.rep2  EL.combined"
+    Only the columns needed are split out of each line, lines with
+    a missing ('NA') expression level are skipped, and the whole
+    table is never held in memory. Several expression level
+    columns can be streamed at once, i.e. all of NATIVE_EL_COLUMNS
+    for training a multi-target model.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the native data
+        file, i.e. example/native_data/native_data.txt.gz.
+
+        el_column (str or list) -- the name of the expression level
+        column to parse, or a list of names. Default: 'EL.combined'.
+
+        is_native (bool) -- if True, only sequences marked as native
+        promoters are yielded, if False only those that are not.
+        Default: None (all sequences are yielded).
+
+        deflank (bool) -- if True, everything up to and including
+        the first flank, and from the second flank onwards, is
+        removed so that only the variable region is yielded.
+        Default: False.
+
+        scaffold_type (str) -- the scaffold type (pTpA or Abf1TATA)
+        whose flanks are removed if 'deflank=True'. Default: 'pTpA'.
+
+    Yields:
+    -----
+        seq (str) -- the nucleotide sequence.
+
+        exp_level (float or list) -- its expression level, from
+        'el_column', or a list of its expression levels if a list of
+        columns was given (lines with a missing level in any of them
+        are skipped).
+    """
+    # Assertions
+    assert isinstance(input_seqs, str), 'Path name for input file must be \
+    passed as a string.'
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert isinstance(el_column, (str, list)), 'el_column must be passed as \
+    a string or a list.'
+    assert isinstance(is_native, (bool, type(None))), 'is_native must be \
+    passed as a bool or None.'
+    assert isinstance(deflank, bool), 'deflank must be passed as a bool.'
+    assert scaffold_type in FLANKS.keys(), 'Scaffold type must be either \
+    pTpA or Abf1TATA.'
+    # Functionality
+    flank_A, flank_B = FLANKS[scaffold_type]
+    with smart_open(input_seqs, 'rt') as f:
+        header = f.readline().rstrip('\n').split('\t')
+        el_columns = [el_column] if isinstance(el_column, str) else el_column
+        for column in el_columns:
+            assert column in header, 'Column %s not in file header %s' \
+                % (column, header)
+        seq_idx = header.index('seq')
+        native_idx = header.index('isNative')
+        el_idxs = [header.index(column) for column in el_columns]
+        max_split = max([seq_idx, native_idx] + el_idxs) + 1
+        for line in f:
+            data = line.rstrip('\n').split('\t', max_split)
+            if is_native is not None:
+                if (data[native_idx] == 'TRUE') != is_native:
+                    continue
+            if any(data[el_idx] == 'NA' for el_idx in el_idxs):
+                continue
+            seq = data[seq_idx]
+            if deflank:
+                start = seq.find(flank_A) + len(flank_A)
+                end = seq.rfind(flank_B)
+                assert start >= len(flank_A) and end >= start, "Sequence \
+                %s doesn't contain the %s flanks" % (seq, scaffold_type)
+                seq = seq[start:end]
+            if isinstance(el_column, str):
+                yield seq, float(data[el_idxs[0]])
+            else:
+                yield seq, [float(data[el_idx]) for el_idx in el_idxs]
+
+
+def write_native_data_to_file(input_seqs, el_column='EL.combined',
+                              is_native=None, deflank=False,
+                              scaffold_type='pTpA'):
+    """
+    Streams sequences and one or more columns of expression levels
+    out of a file in the multi-column native data format (see
+    stream_native_data) and writes them (tab separated) to an
+    output file. The output file starts with the 2 info lines:
+    "
+    number_of_seqs_in_file\t<###>
+    length_of_each_sequence\t<$$$>
+    "
+    so that it can be passed straight to the encoder, or used as
+    input to the rest of the processing pipeline.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the native data
+        file.
+
+        el_column (str or list) -- the name of the expression level
+        column to write, or a list of names, whose levels are
+        written in that order after each sequence (for encoding
+        with 'num_targets=len(el_column)'). Default: 'EL.combined'.
+
+        is_native (bool) -- if True or False, filters on the
+        'isNative' column. Default: None (no filtering).
+
+        deflank (bool) -- if True, only the variable region of each
+        sequence is written. Default: False.
+
+        scaffold_type (str) -- the scaffold type whose flanks are
+        removed if 'deflank=True'. Default: 'pTpA'.
+
+    Returns:
+    -----
+        absolute_path (str) -- the absolute path of the output file.
+    """
+    # Assertions
+    assert isinstance(input_seqs, str), 'Path name for input file must be \
+    passed as a string.'
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    # Functionality
+    # Define the path names of the output and temporary files.
+    time_stamp = get_time_stamp()
+    el_columns = [el_column] if isinstance(el_column, str) else el_column
+    relative_path = ('example/native_data/' + time_stamp + '_native_data_' +
+                     '_'.join(el_columns).replace('.', '_') + '.txt')
+    absolute_path = get_output_path(relative_path)
+    temp_path = absolute_path.replace('.txt', '_temp.txt')
+    # Stream the requested data to the temporary file, counting lines.
+    num_seqs = 0
+    len_seqs = 0
+    with smart_open(temp_path, 'w') as temp:
+        for seq, exp_level in stream_native_data(input_seqs, el_column,
+                                                 is_native, deflank,
+                                                 scaffold_type):
+            if isinstance(el_column, str):
+                temp.write(seq + '\t' + str(exp_level) + '\n')
+            else:
+                temp.write(seq + '\t' + '\t'.join(map(str, exp_level)) +
+                           '\n')
+            num_seqs += 1
+            len_seqs = max(len_seqs, len(seq))
+    assert num_seqs > 0, 'No sequences matched the specified filters.'
+    # Write the info lines, then the data.
+    with atomic_open(absolute_path, 'w') as outfile:
+        outfile.write('number_of_seqs_in_file\t' + str(num_seqs) + '\n')
+        outfile.write('length_of_each_sequence\t' + str(len_seqs) + '\n')
+        with smart_open(temp_path, 'r') as temp:
+            shutil.copyfileobj(temp, outfile)
+    os.remove(temp_path)
+
+    return absolute_path
+
+
 def remove_file_list(files):
     """
     Takes a list of path names for files and deletes each of the
@@ -428,7 +783,7 @@ def write_num_and_len_of_seqs_to_file(input_seqs):
         len_seqs = len(seq)  # assumes all sequences padded to same length
     with smart_open(input_seqs, 'r+') as f:
         contents = f.read()
-    with smart_open(input_seqs, 'w+') as f:
+    with atomic_open(input_seqs, 'w') as f:
         line_to_append = 'number_of_seqs_in_file\t' + str(num_seqs) + '\n'
         line_to_append += 'length_of_each_sequence\t' + str(len_seqs) + '\n'
         if input_seqs.endswith('.gz'):
@@ -549,7 +904,7 @@ def create_sample_data(input_seqs, sample_size):
         all_lines = inf.readlines()
         for i in range(50):
             lines = random.sample(all_lines, sample_size)
-    with smart_open(sample_seqs, 'w') as g:
+    with atomic_open(sample_seqs, 'w') as g:
         for line in lines:
             g.write(line)
     # Write number and length of sequence info to top of resulting file
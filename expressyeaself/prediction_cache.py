@@ -0,0 +1,268 @@
+"""
+This script contains a persistent store for memoizing model
+predictions, so that the same sequences are never scored twice by
+the same model, across tools and sessions. Predictions are keyed by
+the sequence and a fingerprint of the saved model file, held in an
+in-memory LRU cache in front of an on-disk SQLite database. On disk
+they are indexed by the 64-bit hash of the sequence, and the stored
+sequence is checked on lookup so a hash collision is a miss.
+"""
+from expressyeaself.organize_data import get_seq_hash as get_seq_hash
+from expressyeaself.utilities import ROOT_DIR as ROOT_DIR
+from expressyeaself.utilities import smart_open as smart_open
+import collections
+import hashlib
+import numpy as np
+import os
+import sqlite3
+
+DEFAULT_DB = 'expressyeaself/models/prediction_results/prediction_cache.db'
+SQL_CHUNK = 500  # max number of keys per SQL query
+
+fingerprints = {}  # memoizes fingerprints by (path, size, mtime)
+
+
+def get_model_fingerprint(saved_model):
+    """
+    Returns a fingerprint of a saved model file, i.e. a hash of its
+    contents, so that cached predictions are invalidated whenever
+    the model weights change. Fingerprints are memoized by the
+    path, size and modification time of the file.
+
+    Args:
+    -----
+        saved_model (str) -- the absolute path of the saved model.
+
+    Returns:
+    -----
+        fingerprint (str) -- the hex digest of the file contents.
+    """
+    # Assertions
+    assert isinstance(saved_model, str), 'Saved model path must be passed \
+    as a string.'
+    assert os.path.exists(saved_model), 'Saved model does not exist.'
+    # Functionality
+    stat = os.stat(saved_model)
+    key = (os.path.abspath(saved_model), stat.st_size, stat.st_mtime)
+    if key not in fingerprints:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(saved_model, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        fingerprints[key] = digest.hexdigest()
+
+    return fingerprints[key]
+
+
+def to_sql_int(seq_hash):
+    """
+    Converts an unsigned 64-bit sequence hash into the signed 64-bit
+    range of an SQLite INTEGER.
+    """
+    return seq_hash - (1 << 64) if seq_hash >= (1 << 63) else seq_hash
+
+
+class PredictionCache(object):
+    """
+    A two-level store of model predictions: an in-memory LRU cache
+    of at most 'max_memory_items' predictions in front of an SQLite
+    database holding every prediction ever stored. Keeps count of
+    cache hits and misses so the hit rate can be reported.
+
+    Args:
+    -----
+        db_path (str) -- the absolute path of the SQLite database,
+        created if it does not exist. Default: None (the
+        prediction_cache.db file in the prediction_results
+        directory). Pass ':memory:' for a cache that is not
+        persisted.
+
+        max_memory_items (int) -- the capacity of the in-memory LRU
+        cache. Default: 100000.
+    """
+    def __init__(self, db_path=None, max_memory_items=100000):
+        # Assertions
+        assert isinstance(max_memory_items, int) and max_memory_items >= 0, \
+            'max_memory_items must be a non-negative integer.'
+        # Functionality
+        if db_path is None:
+            db_path = os.path.join(ROOT_DIR, DEFAULT_DB)
+        self.db_path = db_path
+        self.max_memory_items = max_memory_items
+        self.memory = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(db_path)
+        if db_path != ':memory:':
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+        columns = [row[1] for row in self.connection.execute(
+            'PRAGMA table_info(predictions)')]
+        if columns and 'seq' not in columns:
+            # Written before sequences were stored, so can't be checked
+            self.connection.execute('DROP TABLE predictions')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            'fingerprint TEXT NOT NULL, seq_hash INTEGER NOT NULL, '
+            'seq TEXT NOT NULL, el_prediction REAL NOT NULL, '
+            'PRIMARY KEY (fingerprint, seq_hash)) WITHOUT ROWID')
+        self.connection.commit()
+
+    def remember(self, key, prediction):
+        """
+        Adds a prediction to the in-memory LRU cache, evicting the
+        least recently used predictions if it is full.
+        """
+        self.memory[key] = prediction
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_items:
+            self.memory.popitem(last=False)
+
+    def get_many(self, fingerprint, seqs):
+        """
+        Looks up the cached predictions of a model for a list of
+        sequences, first in memory and then on disk.
+
+        Args:
+        -----
+            fingerprint (str) -- the fingerprint of the model (see
+            get_model_fingerprint).
+
+            seqs (list) -- the sequences (str) to look up.
+
+        Returns:
+        -----
+            predictions (numpy.ndarray) -- the cached prediction of
+            each sequence, or NaN where it is not cached.
+
+            misses (numpy.ndarray) -- the indices of the sequences
+            whose predictions are not cached.
+        """
+        # Functionality
+        predictions = np.full(len(seqs), np.nan)
+        on_disk = collections.defaultdict(list)
+        for i, seq in enumerate(seqs):
+            key = (fingerprint, seq)
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                predictions[i] = self.memory[key]
+            else:
+                on_disk[to_sql_int(get_seq_hash(seq))].append(i)
+        hashes = list(on_disk.keys())
+        for start in range(0, len(hashes), SQL_CHUNK):
+            chunk = hashes[start:start + SQL_CHUNK]
+            rows = self.connection.execute(
+                'SELECT seq_hash, seq, el_prediction FROM predictions '
+                'WHERE fingerprint = ? AND seq_hash IN (%s)' %
+                (','.join('?' * len(chunk))), [fingerprint] + chunk)
+            for seq_hash, stored_seq, prediction in rows:
+                # A different sequence with the same hash is a miss
+                for i in on_disk[seq_hash]:
+                    if seqs[i] == stored_seq:
+                        predictions[i] = prediction
+                        self.remember((fingerprint, stored_seq), prediction)
+        misses = np.flatnonzero(np.isnan(predictions))
+        self.misses += len(misses)
+        self.hits += len(seqs) - len(misses)
+
+        return predictions, misses
+
+    def put_many(self, fingerprint, seqs, predictions):
+        """
+        Stores the predictions of a model for a list of sequences,
+        in memory and on disk.
+
+        Args:
+        -----
+            fingerprint (str) -- the fingerprint of the model (see
+            get_model_fingerprint).
+
+            seqs (list) -- the sequences (str) that were scored.
+
+            predictions (list) -- the prediction (float) for each
+            sequence.
+        """
+        # Assertions
+        assert len(seqs) == len(predictions), 'Must have a prediction for \
+        every sequence.'
+        # Functionality
+        rows = []
+        for seq, prediction in zip(seqs, predictions):
+            seq_hash = to_sql_int(get_seq_hash(seq))
+            self.remember((fingerprint, seq), float(prediction))
+            rows.append((fingerprint, seq_hash, seq, float(prediction)))
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)', rows)
+        self.connection.commit()
+
+    def get(self, fingerprint, seq):
+        """
+        Returns the cached prediction of a model for a sequence, or
+        None if it is not cached.
+        """
+        predictions, misses = self.get_many(fingerprint, [seq])
+
+        return None if len(misses) > 0 else predictions[0]
+
+    def put(self, fingerprint, seq, prediction):
+        """
+        Stores the prediction of a model for a sequence.
+        """
+        self.put_many(fingerprint, [seq], [prediction])
+
+    def get_hit_rate(self):
+        """
+        Returns the fraction of lookups so far that were cache hits.
+        """
+        lookups = self.hits + self.misses
+
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def warm_up_from_file(self, results_file, fingerprint):
+        """
+        Bulk loads the predictions in an existing prediction results
+        file (as written by construct_neural_net.
+        get_predictions_for_input_file) into the cache.
+
+        Args:
+        -----
+            results_file (str) -- the absolute path of the prediction
+            results file: tab separated, with either [index, seq,
+            el_prediction] or [seq, el_prediction] on each line.
+
+            fingerprint (str) -- the fingerprint of the model that
+            made the predictions (see get_model_fingerprint).
+
+        Returns:
+        -----
+            num_loaded (int) -- the number of predictions loaded.
+        """
+        # Assertions
+        assert os.path.exists(results_file), 'Results file does not exist.'
+        # Functionality
+        num_loaded = 0
+        seqs = []
+        predictions = []
+        with smart_open(results_file, 'r') as infile:
+            for line in infile:
+                if isinstance(line, bytes):
+                    line = line.decode()
+                fields = line.rstrip().split('\t')
+                if len(fields) < 2:
+                    continue
+                seqs.append(fields[-2])
+                predictions.append(float(fields[-1]))
+                if len(seqs) >= 100000:
+                    self.put_many(fingerprint, seqs, predictions)
+                    num_loaded += len(seqs)
+                    seqs, predictions = [], []
+        self.put_many(fingerprint, seqs, predictions)
+        num_loaded += len(seqs)
+
+        return num_loaded
+
+    def close(self):
+        """
+        Closes the connection to the on-disk database.
+        """
+        self.connection.close()
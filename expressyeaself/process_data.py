@@ -3,20 +3,21 @@ This script contains a wrapper function that processes raw data.
 """
 import expressyeaself.build_promoter as build
 import expressyeaself.organize_data as organize
+from expressyeaself.utilities import get_output_path as get_output_path
 from expressyeaself.utilities import get_seq_count as get_seq_count
 from expressyeaself.utilities import get_time_stamp as get_time_stamp
 from expressyeaself.utilities import smart_open as smart_open
 import os
 import time as t
 
-ROOT_DIR = os.getcwd()[:os.getcwd().rfind('Express')] + 'ExpressYeaself/'
-
 
 def process_raw_data(input_seqs, scaffold_type=None, percentile=None,
                      binarize_els=True, homogeneous=False, deflank=True,
                      insert_into_scaffold=True, extra_padding=0,
                      pad_front=False, report_loss=True, report_times=True,
-                     remove_files=True, create_sample_of_size=None):
+                     remove_files=True, create_sample_of_size=None,
+                     deduplicate=False, aggregate='mean',
+                     max_seqs_in_memory=5000000):
     """
     A wrapper function that:
     Takes raw data as retrieved from Carl de Boer's publication
@@ -87,6 +88,19 @@ def process_raw_data(input_seqs, scaffold_type=None, percentile=None,
         the file containing processed data, and written to a
         separate file.
 
+        deduplicate (bool) -- if True, repeated sequences in the raw
+        data are merged into one line before any other processing,
+        with their expression levels aggregated. Default: False.
+
+        aggregate (str) -- if (and only if) 'deduplicate=True', how
+        the expression levels of repeated sequences are combined.
+        Must be one of: 'mean' or 'median'. Default: 'mean'.
+
+        max_seqs_in_memory (int) -- if (and only if)
+        'deduplicate=True', the maximum number of distinct sequences
+        held in memory while merging repeated sequences (see
+        organize_data.deduplicate_seqs). Default: 5000000.
+
     Returns:
     -----
         processed_data (str) -- the absolute path for the file
@@ -129,13 +143,17 @@ def process_raw_data(input_seqs, scaffold_type=None, percentile=None,
     if create_sample_of_size is not None:
         assert isinstance(create_sample_of_size, int), ('Sample size must be '
                                                         'passed as an int')
+    assert isinstance(deduplicate, bool), ('The deduplicate argument must be '
+                                           'passed as a bool.')
+    assert aggregate in organize.AGGREGATES, ('aggregate must be one of %s'
+                                              % (organize.AGGREGATES))
     # Functionality
     print('Starting processing of raw data...')
     raw_data = input_seqs
     # Define final output file path
     time_stamp = get_time_stamp()
     relative_path = 'example/processed_data/' + time_stamp
-    processed_data = os.path.join(ROOT_DIR, relative_path)
+    processed_data = get_output_path(relative_path)
     # Create log file to write reports to
     if report_loss or report_times:
         report = smart_open(processed_data + '_process_report' + '.txt', 'w')
@@ -148,6 +166,23 @@ def process_raw_data(input_seqs, scaffold_type=None, percentile=None,
         t0 = t_init
     if remove_files:
         created_files = []  # keep track of the intermediate files created.
+    # Merge repeated sequences, aggregating their expression levels
+    if deduplicate:
+        print('Merging repeated sequences...')
+        input_seqs = organize.deduplicate_seqs(
+            input_seqs, aggregate=aggregate,
+            max_seqs_in_memory=max_seqs_in_memory)
+        processed_data += '_deduplicated'
+        if report_loss:
+            loss_report['Deduplicated Seqs'] = get_seq_count(input_seqs)
+        if report_times:
+            t1 = t.time()
+            text = '\tFile created in %s s' % (t1 - t0)
+            print(text)
+            report.write('Repeated sequences merged...\n' + text + '\n')
+            t0 = t1
+        if remove_files:
+            created_files.append(input_seqs)
     # Pull out the top and bottom percentiles of data
     if percentile is not None:
         print('Pulling out the top and bottom percentiles...')
@@ -250,7 +285,7 @@ def process_raw_data(input_seqs, scaffold_type=None, percentile=None,
     processed_data += '_with_exp_levels.txt'
     # Report end of process and print final output file locations.
     if input_seqs != raw_data:  # i.e. if data has been processed in some way
-        os.rename(input_seqs, processed_data)
+        os.replace(input_seqs, processed_data)
         # Report end of process and print absolute path of processed data.
         text = ('\nRaw data successfully processed.\nLocation: %s\n'
                 % (processed_data))
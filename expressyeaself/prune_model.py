@@ -0,0 +1,328 @@
+"""
+This script contains functions for structured magnitude pruning of
+the saved models: the filters of the Conv1D layers and units of the
+Dense layers with the smallest weights are removed, along with the
+matching input weights of the next layer, and the model is rebuilt
+with physically smaller layers (rather than masking the weights), so
+it runs faster. The pruned model is fine-tuned briefly, and its
+accuracy, size and inference throughput are reported against the
+original model's.
+"""
+import expressyeaself.construct_neural_net as construct
+import expressyeaself.cross_validation as cross_validation
+import expressyeaself.distill_model as distill_model
+import expressyeaself.encode_sequences as encode
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import (get_saved_model_path as
+                                      get_saved_model_path)
+from expressyeaself.utilities import get_temp_path as get_temp_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import MODELS_TO_USE as MODELS_TO_USE
+import copy
+import numpy as np
+import os
+
+PRUNABLE = {'Conv1D': 'filters', 'Dense': 'units'}  # layer ---> config key
+INPUT_AXES = {'Conv1D': 1, 'Dense': 0, 'LSTM': 0}  # of the kernel's inputs
+PASS_THROUGH = ['MaxPooling1D', 'AveragePooling1D', 'GlobalAveragePooling1D',
+                'GlobalMaxPooling1D', 'Dropout']
+
+
+def get_unit_importance(kernel):
+    """
+    Returns the L1 norm of the weights of each output filter or unit
+    (the last axis) of a kernel.
+    """
+    axes = tuple(range(0, kernel.ndim - 1))
+
+    return np.abs(kernel).sum(axis=axes)
+
+
+def get_next_weighted_layer(layers, i):
+    """
+    Returns the index of the layer that takes the outputs of layer i
+    channel for channel, skipping the layers in between that keep
+    the channels as they are (pooling, dropout), or None if there is
+    no such layer (i.e. layer i is the output layer, or its outputs
+    are flattened).
+    """
+    for j in range(i + 1, len(layers)):
+        class_name = layers[j][0]['class_name']
+        if class_name in INPUT_AXES:
+            return j
+        if class_name not in PASS_THROUGH:
+            return None
+
+    return None
+
+
+def prune_layers(layers, amount=0.5, min_units=1):
+    """
+    Prunes the filters of the Conv1D layers and units of the Dense
+    layers of a Sequential model with the smallest L1 norms, and
+    removes their input weights from the layer that follows. The
+    output layer, and layers whose outputs are flattened or go into
+    a layer type that can't be sliced, are left as they are.
+
+    Args:
+    -----
+        layers (list) -- (config, weights) pairs of each layer, as
+        in numpy_inference.NumpyModel, with the Keras config dict of
+        each layer plus its 'class_name'.
+
+        amount (float or dict) -- the fraction of filters or units
+        removed from each prunable layer, between 0 and 1, or a dict
+        of the fraction removed from each layer by name (layers not
+        in it are not pruned). Default: 0.5.
+
+        min_units (int) -- the least number of filters or units
+        kept in a layer. Default: 1.
+
+    Returns:
+    -----
+        pruned_layers (list) -- the (config, weights) pairs of the
+        pruned model, with the 'filters' or 'units' of the configs
+        updated to the new layer sizes.
+    """
+    # Assertions
+    amounts = amount if isinstance(amount, dict) else {None: amount}
+    for fraction in amounts.values():
+        assert 0 <= fraction < 1, 'amount must be between 0 and 1.'
+    assert isinstance(min_units, int) and min_units > 0, 'min_units must be \
+    a positive integer.'
+    # Functionality
+    pruned_layers = [(copy.deepcopy(config), list(weights)) for config,
+                     weights in layers]
+    for i, (config, weights) in enumerate(pruned_layers):
+        if isinstance(amount, dict):
+            fraction = amount.get(config.get('name'), 0)
+        else:
+            fraction = amount
+        if config['class_name'] not in PRUNABLE or not weights or \
+                fraction == 0:
+            continue
+        j = get_next_weighted_layer(pruned_layers, i)
+        if j is None:
+            continue
+        importance = get_unit_importance(weights[0])
+        num_keep = max(min_units, int(round(len(importance) *
+                                            (1 - fraction))))
+        keep = np.sort(np.argsort(-importance, kind='mergesort')[:num_keep])
+        # Remove the pruned outputs...
+        weights[0] = weights[0][..., keep]
+        if len(weights) > 1:
+            weights[1] = weights[1][keep]
+        config[PRUNABLE[config['class_name']]] = int(num_keep)
+        # ...and the matching inputs of the next layer.
+        next_config, next_weights = pruned_layers[j]
+        axis = INPUT_AXES[next_config['class_name']]
+        next_weights[0] = np.take(next_weights[0], keep, axis=axis)
+
+    return pruned_layers
+
+
+def count_params(layers):
+    """
+    Returns the total number of weights of a model's layers.
+    """
+    return int(sum(weight.size for config, weights in layers
+                   for weight in weights))
+
+
+def get_keras_layers(model):
+    """
+    Returns the (config, weights) pairs of each layer of a
+    Sequential Keras model (see prune_layers).
+    """
+    return [(dict(layer.get_config(), class_name=type(layer).__name__),
+             layer.get_weights()) for layer in model.layers]
+
+
+def rebuild_keras_model(model, pruned_layers):
+    """
+    Builds a new Sequential Keras model with the architecture of a
+    model but the (smaller) layer sizes and weights of its pruned
+    layers, compiled with the same loss and optimizer.
+    """
+    import tensorflow as tf
+    model_config = model.get_config()
+    layer_configs = model_config
+    if isinstance(model_config, dict):
+        layer_configs = model_config['layers']
+    pruned = {config['name']: (config, weights) for config, weights in
+              pruned_layers}
+    for layer in layer_configs:
+        name = layer['config']['name']
+        if name in pruned and layer['class_name'] in PRUNABLE:
+            key = PRUNABLE[layer['class_name']]
+            layer['config'][key] = pruned[name][0][key]
+    new_model = tf.keras.Sequential.from_config(model_config)
+    for layer in new_model.layers:
+        if layer.name in pruned and pruned[layer.name][1]:
+            layer.set_weights(pruned[layer.name][1])
+    new_model.compile(loss=model.loss,
+                      optimizer=type(model.optimizer).__name__.lower(),
+                      metrics=['mae'])
+
+    return new_model
+
+
+def fine_tune(model, input_seqs, epochs=1, batch_size=128, seed=0):
+    """
+    Trains a model for a few epochs on a processed data file,
+    streaming batches from a memory mapped copy of the encoded data.
+    """
+    prefix = get_output_path('example/processed_data/' + get_time_stamp() +
+                             '_fine_tune')
+    seqs_path, els_path = cross_validation.encode_to_memmap(input_seqs,
+                                                            prefix)
+    try:
+        encoded_seqs = np.load(seqs_path, mmap_mode='r')
+        exp_levels = np.load(els_path)
+        generator = encode.batch_generator(encoded_seqs, exp_levels,
+                                           batch_size=batch_size, seed=seed)
+        model.fit_generator(generator, epochs=epochs, verbose=0,
+                            steps_per_epoch=int(np.ceil(len(exp_levels) /
+                                                        batch_size)))
+    finally:
+        os.remove(seqs_path)
+        os.remove(els_path)
+
+    return model
+
+
+def evaluate_model(model, input_seqs, num_seqs=10000, batch_size=1024):
+    """
+    Returns the loss, mean absolute error and Pearson correlation of
+    a model's predictions against the measured expression levels
+    (scaled to between -1 and 1) of the first sequences of a
+    processed data file, and the sequences it predicts per second.
+    """
+    seqs = []
+    exp_levels = []
+    for batch_seqs, batch_els in distill_model.read_seq_and_el_batches(
+            input_seqs, max_seqs=num_seqs):
+        seqs += batch_seqs
+        exp_levels += batch_els
+    exp_levels = np.array(exp_levels) / np.abs(exp_levels).max()
+    predictions = construct.get_batch_predictions(model, seqs,
+                                                  batch_size=batch_size)
+    metrics = cross_validation.get_metrics(exp_levels, predictions)
+    metrics['seqs_per_second'] = distill_model.measure_throughput(
+        model, seqs, batch_size)
+
+    return metrics
+
+
+def format_table(rows):
+    """
+    Formats the metrics of the original and pruned models into a
+    tab separated table, with the change in loss relative to the
+    first (original) model.
+
+    Args:
+    -----
+        rows (list) -- (name, num_params, metrics) of each model.
+
+    Returns:
+    -----
+        table (str) -- the table.
+    """
+    lines = ['model\tparams\tloss\tdelta_loss\tpearson_r\tseqs_per_second']
+    base_loss = rows[0][2]['loss']
+    for name, num_params, metrics in rows:
+        lines.append('%s\t%d\t%.6f\t%+.6f\t%.4f\t%.1f' % (
+            name, num_params, metrics['loss'], metrics['loss'] - base_loss,
+            metrics['pearson_r'], metrics['seqs_per_second']))
+    table = '\n'.join(lines)
+
+    return table
+
+
+def prune_saved_model(saved_model, input_seqs, amount=0.5,
+                      fine_tune_epochs=1, batch_size=128, out_path=None,
+                      eval_seqs=None, num_eval_seqs=10000, seed=0):
+    """
+    Prunes a saved Sequential model by magnitude (see prune_layers),
+    rebuilds it with smaller layers, fine-tunes it and saves it as a
+    new .hdf5 file, reporting the accuracy, number of parameters and
+    CPU inference throughput of the original and pruned models.
+
+    Args:
+    -----
+        saved_model (str) -- one of MODELS_TO_USE, or the absolute
+        path of a saved .hdf5 model.
+
+        input_seqs (str) -- the absolute path of the processed data
+        file to fine-tune on.
+
+        amount (float or dict) -- the fraction of filters or units
+        removed from each prunable layer, or from each layer by name
+        (see prune_layers). Default: 0.5.
+
+        fine_tune_epochs (int) -- the number of epochs to fine-tune
+        the pruned model for. 0 skips fine-tuning. Default: 1.
+
+        batch_size (int) -- the number of sequences per batch of
+        fine-tuning. Default: 128.
+
+        out_path (str) -- the absolute path the pruned model is
+        saved to. Default: None (a time stamped file in
+        expressyeaself/models/pruned_models/ under the work
+        directory).
+
+        eval_seqs (str) -- the absolute path of a processed data
+        file to evaluate the models on. Default: None (the input
+        file).
+
+        num_eval_seqs (int) -- the number of sequences evaluated
+        on. Default: 10000.
+
+        seed (int) -- the seed of the order of the sequences when
+        fine-tuning. Default: 0.
+
+    Returns:
+    -----
+        out_path (str) -- the absolute path of the pruned model.
+
+        table (str) -- the comparison of the original and pruned
+        models (see format_table).
+    """
+    # Assertions
+    assert isinstance(saved_model, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    # Functionality
+    name = saved_model
+    if saved_model in MODELS_TO_USE:
+        saved_model = get_saved_model_path(saved_model)
+    else:
+        name = os.path.splitext(os.path.basename(saved_model))[0]
+    if out_path is None:
+        out_path = get_output_path('expressyeaself/models/pruned_models/' +
+                                   get_time_stamp() + '_' + name +
+                                   '_pruned.hdf5')
+    eval_seqs = eval_seqs or input_seqs
+    model = construct.load_saved_model(saved_model)
+    layers = get_keras_layers(model)
+    rows = [(name, count_params(layers),
+             evaluate_model(model, eval_seqs, num_eval_seqs))]
+    pruned_layers = prune_layers(layers, amount)
+    pruned_model = rebuild_keras_model(model, pruned_layers)
+    rows.append((name + '_pruned', count_params(pruned_layers),
+                 evaluate_model(pruned_model, eval_seqs, num_eval_seqs)))
+    if fine_tune_epochs > 0:
+        fine_tune(pruned_model, input_seqs, fine_tune_epochs, batch_size,
+                  seed)
+        rows.append((name + '_pruned_fine_tuned',
+                     count_params(pruned_layers),
+                     evaluate_model(pruned_model, eval_seqs, num_eval_seqs)))
+    temp_path = get_temp_path(out_path)
+    try:
+        pruned_model.save(temp_path)
+        os.replace(temp_path, out_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    table = format_table(rows)
+
+    return out_path, table
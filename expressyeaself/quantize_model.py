@@ -0,0 +1,316 @@
+"""
+This script contains functions for quantizing the saved models to
+smaller ones for the NumPy runtime: either to int8 weights and
+activations, calibrated on a sample of processed sequences, or to
+float16 weights. The int8 arithmetic is emulated in float32 (see
+numpy_inference.quantize_activations), so the quantized models are
+smaller but not faster than the float ones. Also contains functions
+for reporting the change in predictions relative to the float model.
+"""
+import expressyeaself.encode_sequences as encode
+import expressyeaself.numpy_inference as numpy_inference
+from expressyeaself.utilities import ROOT_DIR as ROOT_DIR
+from expressyeaself.utilities import smart_open as smart_open
+import json
+import numpy as np
+import os
+
+MODES = ['int8', 'float16']
+INFO_TOKENS = ('number_of_seqs_in_file', 'length_of_each_sequence')
+QUANTIZED_LAYERS = {'Conv1D': 'QuantizedConv1D', 'Dense': 'QuantizedDense'}
+FLOAT16_LAYERS = ['Conv1D', 'Dense', 'LSTM']
+# Calibrated on processed data, and compared on the native sample, so
+# the reported change in predictions is not measured on the calibration set
+CALIBRATION_DATA = 'example/processed_data/10000_from_20190611170757656183_' \
+    'homogeneous_deflanked_sequences_with_exp_levels.txt.gz'
+NATIVE_SAMPLE = 'expressyeaself/models/1d_cnn/native_sample.txt'
+
+
+def get_calibration_seqs(input_seqs, num_seqs=1000, seed=None):
+    """
+    Draws a uniform random sample of sequences from a processed
+    data file (via reservoir sampling, so the file is read once
+    without being loaded into memory) and One-Hot encodes them, for
+    calibrating the activation ranges of a quantized model.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file, with one sequence (and optionally its expression level,
+        tab separated) per line.
+
+        num_seqs (int) -- the number of sequences to sample.
+        Default: 1000.
+
+        seed (int) -- the seed of the random number generator.
+        Default: None.
+
+    Returns:
+    -----
+        calibration_seqs (numpy.ndarray) -- the One-Hot encoded
+        sample, of shape (num_seqs, len_seq, 5).
+    """
+    # Assertions
+    assert isinstance(input_seqs, str)
+    assert os.path.exists(input_seqs), 'Input file does not exist.'
+    assert isinstance(num_seqs, int) and num_seqs > 0, 'num_seqs must be a \
+    positive integer.'
+    # Functionality
+    random_state = np.random.RandomState(seed)
+    sample = []
+    seen = 0
+    with smart_open(input_seqs, 'r') as infile:
+        for line in infile:
+            if isinstance(line, bytes):
+                line = line.decode()
+            seq = line.rstrip().split('\t')[0]
+            if seq == '' or seq in INFO_TOKENS:
+                continue
+            if len(sample) < num_seqs:
+                sample.append(seq)
+            else:
+                j = random_state.randint(0, seen + 1)
+                if j < num_seqs:
+                    sample[j] = seq
+            seen += 1
+    assert len(sample) > 0, 'No sequences found in the input file.'
+    calibration_seqs = np.array([encode.one_hot_encode_sequence(seq)
+                                 for seq in sample], dtype=np.float32)
+
+    return calibration_seqs
+
+
+def quantize_weights(kernel):
+    """
+    Quantizes a kernel to symmetric int8 values with one scale per
+    output channel (the last axis).
+
+    Args:
+    -----
+        kernel (numpy.ndarray) -- the float kernel.
+
+    Returns:
+    -----
+        quantized_kernel (numpy.ndarray) -- the int8 kernel.
+
+        scale (numpy.ndarray) -- the float32 scale of each output
+        channel, so that kernel ~= quantized_kernel * scale.
+    """
+    # Functionality
+    axes = tuple(range(0, kernel.ndim - 1))
+    scale = np.abs(kernel).max(axis=axes) / 127
+    scale[scale == 0] = 1.0
+    quantized_kernel = np.clip(np.rint(kernel / scale), -127,
+                               127).astype(np.int8)
+
+    return quantized_kernel, scale.astype(np.float32)
+
+
+def quantize_numpy_model(numpy_model, calibration_seqs=None, mode='int8',
+                         percentile=100.0, batch_size=1024):
+    """
+    Quantizes a model loaded into the NumPy runtime.
+
+    In 'int8' mode the Conv1D and Dense layers are replaced by
+    quantized layers with per-channel int8 weights and int8 inputs.
+    The scale of each quantized layer's input is set from the
+    largest absolute value (or the given percentile of the absolute
+    values) the layer sees over the calibration sequences. Other
+    layers (pooling, LSTM, etc.) are left in float32.
+
+    In 'float16' mode the weights of the Conv1D, Dense and LSTM
+    layers are stored as float16 and computed in float32 (dynamic
+    range float16), so no calibration is needed.
+
+    Args:
+    -----
+        numpy_model (numpy_inference.NumpyModel) -- the float
+        model.
+
+        calibration_seqs (numpy.ndarray) -- the encoded calibration
+        sequences (see get_calibration_seqs). Required in 'int8'
+        mode. Default: None.
+
+        mode (str) -- 'int8' or 'float16'. Default: 'int8'.
+
+        percentile (float) -- the percentile of the absolute values
+        of each layer's input used as its range. Default: 100.0
+        (the maximum).
+
+        batch_size (int) -- the number of calibration sequences run
+        through the model at a time. Default: 1024.
+
+    Returns:
+    -----
+        quantized_model (numpy_inference.NumpyModel) -- the
+        quantized model.
+    """
+    # Assertions
+    assert isinstance(numpy_model, numpy_inference.NumpyModel), 'Model \
+    must be loaded into the NumPy runtime.'
+    assert mode in MODES, 'mode must be one of %s.' % (MODES)
+    assert mode != 'int8' or calibration_seqs is not None, 'Calibration \
+    sequences are required for int8 quantization.'
+    assert 0 < percentile <= 100, 'percentile must be in (0, 100].'
+    # Functionality
+    if mode == 'float16':
+        layers = []
+        for config, weights in numpy_model.layers:
+            if config['class_name'] in FLOAT16_LAYERS:
+                weights = [w.astype(np.float16) for w in weights]
+            layers.append((config, weights))
+        return numpy_inference.NumpyModel(layers, numpy_model.input_shape)
+    # Record the range of the input to each layer over the calibration set
+    ranges = np.zeros(len(numpy_model.layers))
+    for start in range(0, len(calibration_seqs), batch_size):
+        out = np.asarray(calibration_seqs[start:start + batch_size],
+                         dtype=np.float32)
+        mask = None
+        for i, (config, weights) in enumerate(numpy_model.layers):
+            if config['class_name'] in QUANTIZED_LAYERS:
+                ranges[i] = max(ranges[i], np.percentile(np.abs(out),
+                                                         percentile))
+            layer = numpy_inference.LAYERS[config['class_name']]
+            out, mask = layer(out, config, weights, mask)
+    layers = []
+    for i, (config, weights) in enumerate(numpy_model.layers):
+        if config['class_name'] in QUANTIZED_LAYERS:
+            quantized_kernel, scale = quantize_weights(weights[0])
+            bias = weights[1] if len(weights) > 1 else \
+                np.zeros(len(scale), dtype=np.float32)
+            input_scale = ranges[i] / 127 if ranges[i] > 0 else 1.0
+            config = dict(config,
+                          class_name=QUANTIZED_LAYERS[config['class_name']],
+                          input_scale=float(input_scale))
+            weights = [quantized_kernel, scale, bias]
+        layers.append((config, weights))
+    quantized_model = numpy_inference.NumpyModel(layers,
+                                                 numpy_model.input_shape)
+
+    return quantized_model
+
+
+def save_quantized_model(numpy_model, out_path):
+    """
+    Saves a (quantized) NumPy runtime model to a .npz file, holding
+    the layer configs as JSON and the weights in their quantized
+    dtypes.
+
+    Args:
+    -----
+        numpy_model (numpy_inference.NumpyModel) -- the model.
+
+        out_path (str) -- the absolute path of the output file.
+
+    Returns:
+    -----
+        out_path (str) -- the absolute path of the output file.
+    """
+    # Assertions
+    assert isinstance(numpy_model, numpy_inference.NumpyModel)
+    assert isinstance(out_path, str)
+    # Functionality
+    arrays = {}
+    configs = []
+    for i, (config, weights) in enumerate(numpy_model.layers):
+        configs.append(config)
+        for j, weight in enumerate(weights):
+            arrays['layer_%d_weight_%d' % (i, j)] = weight
+    header = {'input_shape': list(numpy_model.input_shape),
+              'layers': configs}
+    arrays['header'] = np.array(json.dumps(header))
+    with open(out_path, 'wb') as f:
+        np.savez(f, **arrays)
+
+    return out_path
+
+
+def load_quantized_model(saved_model):
+    """
+    Loads a model saved by save_quantized_model.
+
+    Args:
+    -----
+        saved_model (str) -- the absolute path of the .npz file.
+
+    Returns:
+    -----
+        numpy_model (numpy_inference.NumpyModel) -- the model.
+    """
+    # Assertions
+    assert isinstance(saved_model, str)
+    assert os.path.exists(saved_model), 'Saved model does not exist.'
+    # Functionality
+    with np.load(saved_model) as f:
+        header = json.loads(str(f['header']))
+        layers = []
+        for i, config in enumerate(header['layers']):
+            weights = []
+            while 'layer_%d_weight_%d' % (i, len(weights)) in f:
+                weights.append(f['layer_%d_weight_%d' % (i, len(weights))])
+            layers.append((config, weights))
+    numpy_model = numpy_inference.NumpyModel(layers,
+                                             tuple(header['input_shape']))
+
+    return numpy_model
+
+
+def get_model_size(numpy_model):
+    """
+    Returns the total size in bytes of the weights of a NumPy
+    runtime model.
+    """
+    return sum(weight.nbytes for config, weights in numpy_model.layers
+               for weight in weights)
+
+
+def compare_to_float_model(float_model, quantized_model, input_seqs=None,
+                           batch_size=1024):
+    """
+    Reports how much a quantized model's predictions differ from
+    those of the float model it was made from, over a file of
+    sequences.
+
+    Args:
+    -----
+        float_model (numpy_inference.NumpyModel) -- the float
+        model.
+
+        quantized_model (numpy_inference.NumpyModel) -- the
+        quantized model.
+
+        input_seqs (str) -- the absolute path of a file with one
+        sequence per line. Default: None (the native_sample.txt
+        file of the 1D CNN models).
+
+        batch_size (int) -- the number of sequences run through the
+        models at a time. Default: 1024.
+
+    Returns:
+    -----
+        report (str) -- the mean and maximum absolute difference
+        between the predictions, their Pearson correlation and the
+        size of the weights of each model.
+    """
+    # Assertions
+    assert isinstance(float_model, numpy_inference.NumpyModel)
+    assert isinstance(quantized_model,
+                      numpy_inference.NumpyModel)
+    # Functionality
+    if input_seqs is None:
+        input_seqs = ROOT_DIR + NATIVE_SAMPLE
+    seqs = get_calibration_seqs(input_seqs, num_seqs=10 ** 9)
+    float_preds = float_model.predict(seqs, batch_size=batch_size)[:, 0]
+    quantized_preds = quantized_model.predict(seqs,
+                                              batch_size=batch_size)[:, 0]
+    delta = np.abs(float_preds - quantized_preds)
+    if float_preds.std() > 0 and quantized_preds.std() > 0:
+        pearson_r = np.corrcoef(float_preds, quantized_preds)[0, 1]
+    else:
+        pearson_r = np.nan
+    report = 'Values: mean_abs_delta: %.6f max_abs_delta: %.6f ' \
+        'pearson_r: %.4f float_bytes: %d quantized_bytes: %d' % (
+            delta.mean(), delta.max(), pearson_r, get_model_size(float_model),
+            get_model_size(quantized_model))
+
+    return report
@@ -5,8 +5,93 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
                                                 '..')))
 
+import benchmark_models  # noqa: E402,F401
 import build_promoter  # noqa: E402,F401
+import cli  # noqa: E402,F401
+import construct_linear_model  # noqa: E402,F401
+import construct_neural_net  # noqa: E402,F401
+import cross_validation  # noqa: E402,F401
+import design_promoters  # noqa: E402,F401
+import distill_model  # noqa: E402,F401
 import encode_sequences  # noqa: E402,F401
+import generate_data  # noqa: E402,F401
+import hyperparameter_sweep  # noqa: E402,F401
+import mutagenesis  # noqa: E402,F401
+import numpy_inference  # noqa: E402,F401
 import organize_data  # noqa: E402,F401
+import prediction_cache  # noqa: E402,F401
 import process_data  # noqa: E402,F401
+import prune_model  # noqa: E402,F401
+import quantize_model  # noqa: E402,F401
+import train_model  # noqa: E402,F401
 import utilities  # noqa: E402,F401
+
+import numpy as np  # noqa: E402
+
+
+def write_trial_file(trial_path, num_seqs=50, len_seq=80, bases='ATGC'):
+    """
+    Writes a processed-style trial file of random sequences and
+    their expression levels (the number of 'A's in each sequence),
+    with the 2 info lines at the top.
+    """
+    random_state = np.random.RandomState(0)
+    with open(trial_path, 'w') as f:
+        for i in range(0, num_seqs):
+            seq = ''.join(random_state.choice(list(bases), size=len_seq))
+            f.write(seq + '\t' + str(float(seq.count('A'))) + '\n')
+    organize_data.write_num_and_len_of_seqs_to_file(trial_path)
+
+    return
+
+
+class ToyModel(object):
+    """
+    A stand-in for a Keras model: a linear model on the One-Hot
+    encoded sequence, trained by SGD with momentum, whose velocity
+    is its optimizer state.
+    """
+    def __init__(self, len_seq, learning_rate=0.01, momentum=0.0):
+        self.input_shape = (None, len_seq, 5)
+        self.learning_rate = learning_rate
+        self.momentum = momentum
+        self.weights = np.zeros(len_seq * 5)
+        self.velocity = np.zeros(len_seq * 5)
+
+    def train_on_batch(self, x, y):
+        x = x.reshape(len(x), -1)
+        error = x.dot(self.weights) - y
+        self.velocity = self.momentum * self.velocity - \
+            self.learning_rate * x.T.dot(error) / len(x)
+        self.weights = self.weights + self.velocity
+
+        return float((error ** 2).mean())
+
+    def predict(self, x, batch_size=None):
+        return np.asarray(x).reshape(len(x), -1).dot(self.weights)[:, None]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, weights=self.weights, velocity=self.velocity,
+                     hyperparameters=[self.learning_rate, self.momentum])
+
+
+def build_toy_model(model_type, len_seq, params=None):
+    """
+    Builds a ToyModel, as train_model.build_keras_model builds a
+    Keras model.
+    """
+    return ToyModel(len_seq, **(params or {}))
+
+
+def load_toy_model(path):
+    """
+    Loads a ToyModel saved by its save() method.
+    """
+    with open(path, 'rb') as f:
+        saved = np.load(f)
+        learning_rate, momentum = saved['hyperparameters']
+        model = ToyModel(len(saved['weights']) // 5, learning_rate, momentum)
+        model.weights, model.velocity = saved['weights'], saved['velocity']
+
+    return model
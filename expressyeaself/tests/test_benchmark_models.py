@@ -0,0 +1,48 @@
+"""
+A script containing unit tests for the functions in the
+benchmark_models.py script.
+"""
+import expressyeaself.tests.context as context
+import os
+
+test = context.benchmark_models
+
+
+def test_make_synthetic_seqs():
+    """
+    Tests the function that makes random nucleotide sequences.
+    """
+    seqs = test.make_synthetic_seqs(10, 80, seed=1)
+    assert len(seqs) == 10
+    assert all(len(seq) == 80 and set(seq) <= set('ATGC') for seq in seqs)
+    assert seqs == test.make_synthetic_seqs(10, 80, seed=1)
+
+    return
+
+
+def test_benchmark_models():
+    """
+    Tests the function that benchmarks the saved models.
+    """
+    trial_path = 'trial_file.txt'
+    out_path, table = test.benchmark_models(
+        models=['1d_cnn_sequential', 'not_a_model.hdf5'],
+        batch_sizes=(4, 1), thread_counts=(1,), num_batches=3,
+        out_path=trial_path)
+    lines = table.split('\n')
+    assert lines[0] == '\t'.join(test.COLUMNS)
+    # One line per batch size, in increasing order; the missing model
+    # is skipped.
+    assert len(lines) == 3
+    rows = [dict(zip(test.COLUMNS, line.split('\t'))) for line in lines[1:]]
+    assert [row['model'] for row in rows] == ['1d_cnn_sequential'] * 2
+    assert [row['batch_size'] for row in rows] == ['1', '4']
+    for row in rows:
+        assert float(row['p99_ms']) >= float(row['p50_ms']) > 0
+        assert float(row['seqs_per_second']) > 0
+        assert float(row['peak_rss_mb']) > 0
+    with open(out_path, 'r') as f:
+        assert f.read() == table + '\n'
+    os.remove(trial_path)
+
+    return
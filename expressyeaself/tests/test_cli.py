@@ -0,0 +1,120 @@
+"""
+A script containing unit tests for the functions in the cli.py
+script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+import scipy.sparse as sparse
+
+test = context.cli
+organize = context.organize_data
+
+
+def test_get_batch_size():
+    """
+    Tests the function that sizes batches to a memory budget.
+    """
+    assert test.get_batch_size(None, 100, 7) == 7
+    assert test.get_batch_size(1, 2 ** 10, 7) == 2 ** 10
+    assert test.get_batch_size(1, 2 ** 30, 7) == 1
+
+    return
+
+
+def test_build_parser():
+    """
+    Tests the argument parser of the command line interface.
+    """
+    parser = test.build_parser()
+    args = parser.parse_args(['predict', '-', '--sort', '--workers', '2'])
+    assert args.func == test.run_predict
+    assert args.sort and args.workers == 2
+    assert args.model == '1d_cnn_sequential'
+    # Test case 2: missing subcommand
+    try:
+        parser.parse_args([])
+    except SystemExit:
+        pass
+
+    return
+
+
+def test_run_process():
+    """
+    Tests the 'process' subcommand.
+    """
+    raw_path = context.generate_data.generate_raw_library(100, seed=0)
+    args = test.build_parser().parse_args(['process', raw_path,
+                                           '--scaffold-type', 'pTpA',
+                                           '--quiet', '-o',
+                                           'trial_file.txt'])
+    processed_data = args.func(args)
+    num, length = organize.get_num_and_len_of_seqs_from_file('trial_file.txt')
+    assert num == 100
+    os.remove(raw_path)
+    os.remove(processed_data)
+    os.remove('trial_file.txt')
+
+    return
+
+
+def test_run_encode():
+    """
+    Tests the 'encode' subcommand.
+    """
+    trial_path = 'trial_file.txt'
+    context.write_trial_file(trial_path)
+    # Test case 1: One-Hot encoding
+    test.main(['encode', trial_path, '-o', 'trial_file.npz'])
+    with np.load('trial_file.npz') as encoded:
+        assert encoded['encoded_seqs'].shape == (50, 80, 5)
+        assert encoded['exp_levels'].shape == (50,)
+    # Test case 2: K-mer encoding can be read by scipy
+    test.main(['encode', trial_path, '-o', 'trial_file.npz', '--method',
+               'K-mer', '-k', '3'])
+    assert sparse.load_npz('trial_file.npz').shape == (50, 64)
+    os.remove('trial_file.npz')
+    os.remove(trial_path)
+
+    return
+
+
+def test_run_train_and_predict():
+    """
+    Tests the 'train' and 'predict' subcommands.
+    """
+    trial_path = 'trial_file.txt'
+    context.write_trial_file(trial_path)
+    # Test case 1: train and predict with a linear model
+    test.main(['train', trial_path, '--model', 'ridge', '-k', '2', '-o',
+               'trial_model.pkl', '--seed', '0'])
+    test.main(['predict', trial_path, '--model', 'trial_model.pkl', '-o',
+               'trial_results.txt', '--sort'])
+    with open('trial_results.txt') as f:
+        lines = [line.rstrip().split('\t') for line in f]
+    assert len(lines) == 50
+    preds = [float(line[2]) for line in lines]
+    assert preds == sorted(preds, reverse=True)
+    os.remove('trial_model.pkl')
+    # Test case 2: saved model, with multiple workers
+    test.main(['predict', trial_path, '-o', 'trial_results.txt'])
+    with open('trial_results.txt') as f:
+        single = f.read()
+    test.main(['predict', trial_path, '-o', 'trial_results.txt',
+               '--workers', '2', '--batch-size', '8'])
+    with open('trial_results.txt') as f:
+        assert f.read() == single
+    assert len(single.splitlines()) == 50
+    # Test case 3: only the highest and lowest of the sorted results
+    test.main(['predict', trial_path, '-o', 'trial_results.txt', '--sort'])
+    with open('trial_results.txt') as f:
+        ranked = f.read().splitlines()
+    test.main(['predict', trial_path, '-o', 'trial_results.txt',
+               '--top-k', '5', '--bottom-k', '3', '--batch-size', '8'])
+    with open('trial_results.txt') as f:
+        assert f.read().splitlines() == ranked[:5] + ranked[-3:]
+    os.remove('trial_results.txt')
+    os.remove(trial_path)
+
+    return
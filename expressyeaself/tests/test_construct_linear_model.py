@@ -0,0 +1,134 @@
+"""
+A script containing unit tests for the functions in the
+construct_linear_model.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+
+test = context.construct_linear_model
+organize = context.organize_data
+
+
+def write_trial_file(trial_path, num_seqs=400, binarize=False):
+    """
+    Writes a processed-style trial file of random sequences whose
+    expression level is the number of 'A's in the first half of
+    the sequence (or whether it exceeds the median, if binarize).
+    """
+    random_state = np.random.RandomState(1)
+    with open(trial_path, 'w') as f:
+        for i in range(0, num_seqs):
+            seq = ''.join(random_state.choice(list('ATGC'), size=20))
+            el = float(seq[:10].count('A'))
+            if binarize:
+                el = int(el > 2)
+            f.write(seq + '\t' + str(el) + '\n')
+    organize.write_num_and_len_of_seqs_to_file(trial_path)
+
+    return
+
+
+def test_featurize_seqs():
+    """
+    Tests the function that encodes sequences into a 2D feature
+    matrix for a linear model.
+    """
+    # Test case 1: K-mer features
+    features = test.featurize_seqs(['AAAA', 'ATGC'], method='K-mer', k=2)
+    assert features.shape == (2, 16)
+    assert list(features.sum(axis=1).A1) == [3, 3]
+    # Test case 2: One-Hot features
+    features = test.featurize_seqs(['AAAA', 'ATGC'], method='One-Hot')
+    assert features.shape == (2, 20)
+    # Test case 3: invalid method
+    try:
+        test.featurize_seqs(['AAAA'], method='Nope')
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_stream_feature_batches():
+    """
+    Tests the generator that streams featurized batches from a file.
+    """
+    trial_path = 'trial_file.txt'
+    write_trial_file(trial_path, num_seqs=25)
+    batches = list(test.stream_feature_batches(trial_path, k=3,
+                                               batch_size=10))
+    assert sum([len(els) for _, els, _ in batches]) == 25
+    assert all([features.shape[1] == 64 for features, _, _ in batches])
+    assert all([len(seqs) == len(els) for _, els, seqs in batches])
+    os.remove(trial_path)
+
+    return
+
+
+def test_train_linear_model():
+    """
+    Tests the function that trains a ridge or logistic regression
+    model on streamed features.
+    """
+    # Test case 1: ridge regression learns the signal
+    trial_path = 'trial_file.txt'
+    write_trial_file(trial_path)
+    model, scores = test.train_linear_model(trial_path, method='One-Hot',
+                                            epochs=5, batch_size=50, seed=2)
+    assert scores.startswith('Values: loss: ')
+    assert 'mae' in scores
+    assert float(scores.split(' ')[2]) < 1.0
+    # Test case 2: logistic regression on binarized data
+    write_trial_file(trial_path, binarize=True)
+    model, scores = test.train_linear_model(trial_path,
+                                            task='classification', k=1,
+                                            epochs=5, batch_size=50, seed=2)
+    assert scores.endswith('%')
+    assert float(scores.split(' ')[4][:-1]) > 60
+    os.remove(trial_path)
+    # Test case 3: invalid task
+    try:
+        test.train_linear_model(trial_path, task='Nope')
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_evaluate_predictions():
+    """
+    Tests the function that reports validation metrics.
+    """
+    # Test case 1: regression
+    scores = test.evaluate_predictions(np.array([1.0, 2.0]),
+                                       np.array([1.0, 4.0]))
+    assert scores == 'Values: loss: 2.0 mae: 1.0'
+    # Test case 2: classification
+    scores = test.evaluate_predictions(np.array([1, 0]),
+                                       np.array([0.9, 0.6]),
+                                       task='classification')
+    assert scores.endswith('acc: 50.0%')
+    # Test case 3: nothing held out
+    scores = test.evaluate_predictions(np.array([]), np.array([]))
+    assert 'no sequences' in scores
+
+    return
+
+
+def test_get_linear_predictions_for_input_file():
+    """
+    Tests the function that predicts expression levels for every
+    sequence in an input file.
+    """
+    trial_path = 'trial_file.txt'
+    write_trial_file(trial_path, num_seqs=50)
+    model, _ = test.train_linear_model(trial_path, k=2, seed=0)
+    df = test.get_linear_predictions_for_input_file(trial_path, model,
+                                                    'ridge_kmer2', k=2)
+    assert len(df) == 50
+    assert list(df.columns) == ['index', 'seq', 'el_prediction']
+    assert df['el_prediction'].is_monotonic_decreasing
+    os.remove(trial_path)
+
+    return
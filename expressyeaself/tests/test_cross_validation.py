@@ -0,0 +1,81 @@
+"""
+A script containing unit tests for the functions in the
+cross_validation.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+
+test = context.cross_validation
+organize = context.organize_data
+
+
+def train_mean_fold(encoded_seqs, exp_levels, train_indices, val_indices,
+                    offset=0.0):
+    """
+    A stand-in for train_keras_fold that predicts the mean training
+    expression level, checking that the data is a read-only memory
+    map rather than a copy.
+    """
+    assert isinstance(encoded_seqs, np.memmap)
+    assert not encoded_seqs.flags.writeable
+    assert len(np.intersect1d(train_indices, val_indices)) == 0
+    prediction = exp_levels[train_indices].mean() + offset
+    metrics = test.get_metrics(exp_levels[val_indices],
+                               np.full(len(val_indices), prediction))
+
+    return metrics
+
+
+def test_encode_to_memmap():
+    """
+    Tests the function that encodes a file into memory mapped
+    arrays.
+    """
+    trial_path = 'trial_file.txt'
+    context.write_trial_file(trial_path, num_seqs=30, len_seq=20,
+                             bases='ATGCN')
+    seqs_path, els_path = test.encode_to_memmap(
+        trial_path, out_prefix=os.path.abspath('trial_file'), chunk_size=7)
+    encoded, els, _ = context.encode_sequences.encode_sequences_with_method(
+        trial_path)
+    assert np.array_equal(np.load(seqs_path, mmap_mode='r'), encoded)
+    assert np.allclose(np.load(els_path), els)
+    organize.remove_file_list([trial_path, seqs_path, els_path])
+
+    return
+
+
+def test_get_fold_indices():
+    """
+    Tests the function that splits indices into folds.
+    """
+    folds = test.get_fold_indices(10, num_folds=3, seed=0)
+    assert [len(val) for train, val in folds] == [4, 3, 3]
+    assert np.array_equal(np.sort(np.concatenate([val for train, val in
+                                                  folds])), np.arange(10))
+    for train, val in folds:
+        assert len(train) + len(val) == 10
+
+    return
+
+
+def test_cross_validate():
+    """
+    Tests running k-fold cross-validation in one or more processes.
+    """
+    trial_path = 'trial_file.txt'
+    context.write_trial_file(trial_path, num_seqs=30, len_seq=20,
+                             bases='ATGCN')
+    fold_metrics, report = test.cross_validate(
+        trial_path, num_folds=3, train_fn=train_mean_fold,
+        train_kwargs={'offset': 0.1}, seed=0)
+    assert [m['fold'] for m in fold_metrics] == [0, 1, 2]
+    assert report.splitlines()[-1].startswith('Values: loss: ')
+    parallel, _ = test.cross_validate(
+        trial_path, num_folds=3, num_workers=2, train_fn=train_mean_fold,
+        train_kwargs={'offset': 0.1}, seed=0)
+    assert [m['loss'] for m in parallel] == [m['loss'] for m in fold_metrics]
+    os.remove(trial_path)
+
+    return
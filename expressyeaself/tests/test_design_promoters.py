@@ -0,0 +1,141 @@
+"""
+A script containing unit tests for the functions in the
+design_promoters.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+
+test = context.design_promoters
+
+
+class GCountModel(object):
+    """
+    A stand-in for a Keras model, predicting the fraction of 'G's
+    in One-Hot encoded sequences.
+    """
+    def __init__(self, len_seq):
+        self.input_shape = (None, len_seq, 5)
+
+    def predict(self, encoded_seqs, batch_size=32):
+        return encoded_seqs[:, :, 2].mean(axis=1)[:, None]
+
+
+def test_get_scaffold():
+    """
+    Tests the function that retrieves a scaffold sequence.
+    """
+    # Test case 1: pTpA scaffold
+    scaffold = test.get_scaffold('pTpA')
+    assert scaffold.count('N') == 80
+    # Test case 2: invalid scaffold type
+    try:
+        test.get_scaffold('Nope')
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_codes_to_seqs():
+    """
+    Tests the function that converts base codes to sequences.
+    """
+    codes = np.array([[0, 1, 2, 3], [3, 3, 0, 0]], dtype=np.uint8)
+    assert test.codes_to_seqs(codes) == ['ATGC', 'CCAA']
+
+    return
+
+
+def test_encode_population():
+    """
+    Tests the function that One-Hot encodes variable regions into a
+    template sequence.
+    """
+    template = context.encode_sequences.one_hot_encode_sequence('AANNNA')
+    codes = np.array([[2, 2, 1]], dtype=np.uint8)
+    encoded = test.encode_population(codes, template, 2)
+    expected = context.encode_sequences.one_hot_encode_sequence('AAGGTA')
+    assert np.array_equal(encoded[0], expected)
+
+    return
+
+
+def test_score_population():
+    """
+    Tests the function that scores a population through the cache.
+    """
+    template = np.zeros((4, 5), dtype=np.float32)
+    test.init_scoring_worker(GCountModel(4))
+    codes = np.array([[2, 2, 2, 2], [0, 0, 0, 0], [2, 2, 2, 2]],
+                     dtype=np.uint8)
+    cache = {}
+    scores = test.score_population(codes, cache, template, 0)
+    assert list(scores) == [1.0, 0.0, 1.0]
+    assert sorted(cache) == sorted(test.codes_to_seqs(codes[:2]))
+    # Test case 2: cached scores are not recomputed
+    cache[list(cache.keys())[0]] = 5.0
+    scores = test.score_population(codes, cache, template, 0)
+    assert list(scores) == [5.0, 0.0, 5.0]
+
+    return
+
+
+def test_optimize_promoters():
+    """
+    Tests the function that evolves variable regions to maximize
+    predicted expression level.
+    """
+    model = GCountModel(80)
+    # Test case 1: genetic algorithm improves on random regions
+    df = test.optimize_promoters(model, insert_into_scaffold=False,
+                                 pop_size=50, generations=30, num_elite=2,
+                                 mutation_rate=0.02, seed=0)
+    assert len(df) == 10
+    assert df['el_prediction'].iloc[0] > 0.5
+    assert df['el_prediction'].is_monotonic_decreasing
+    assert df['seq'].iloc[0] == df['variable_region'].iloc[0]
+    # Test case 2: simulated annealing in the complete scaffold
+    model = GCountModel(len(test.get_scaffold('pTpA')))
+    df = test.optimize_promoters(model, method='SA', pop_size=20,
+                                 generations=50, num_results=3, seed=0)
+    assert len(df) == 3
+    assert len(df['seq'].iloc[0]) == len(test.get_scaffold('pTpA'))
+    assert df['variable_region'].iloc[0] in df['seq'].iloc[0]
+    # Test case 3: resuming from a checkpoint matches an unbroken run
+    model = GCountModel(80)
+    checkpoint = 'trial_checkpoint.npz'
+    kwargs = {'insert_into_scaffold': False, 'pop_size': 20, 'num_elite': 2,
+              'seed': 1}
+    full_df = test.optimize_promoters(model, generations=10, **kwargs)
+    test.optimize_promoters(model, generations=4, checkpoint_path=checkpoint,
+                            checkpoint_every=2, **kwargs)
+    resumed_df = test.optimize_promoters(model, generations=10,
+                                         checkpoint_path=checkpoint,
+                                         **kwargs)
+    assert full_df.equals(resumed_df)
+    os.remove(checkpoint)
+    # Test case 4: multiple scoring processes give the same designs
+    multi_df = test.optimize_promoters(model, generations=10, num_workers=2,
+                                       **kwargs)
+    assert full_df.equals(multi_df)
+    # Test case 5: the scaffold is used only if the model takes it
+    df = test.optimize_promoters(GCountModel(80), pop_size=20,
+                                 generations=2, seed=0)
+    assert df['seq'].iloc[0] == df['variable_region'].iloc[0]
+    try:
+        test.optimize_promoters(GCountModel(50), pop_size=20, generations=2)
+    except Exception as e:
+        assert 'length 50' in str(e)
+    # Test case 6: the best designs of any generation are kept, and
+    # the last generation is checkpointed
+    df = test.optimize_promoters(model, method='SA', temperature=10.0,
+                                 cooling=1.0, generations=7,
+                                 checkpoint_path=checkpoint,
+                                 checkpoint_every=5, **kwargs)
+    state, cache = test.load_checkpoint(checkpoint)
+    assert int(state['generation']) == 7
+    assert df['el_prediction'].iloc[0] == max(cache.values())
+    os.remove(checkpoint)
+
+    return
@@ -0,0 +1,63 @@
+"""
+A script containing unit tests for the functions in the
+distill_model.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+import shutil
+
+test = context.distill_model
+organize = context.organize_data
+
+
+def test_distill_model():
+    """
+    Tests labelling data with a teacher and distilling it into a
+    student.
+    """
+    trial_path = 'trial_file.txt'
+    context.write_trial_file(trial_path, num_seqs=200, len_seq=10)
+    # The teacher counts the A's in a sequence
+    weights = np.zeros((10, 5), dtype=np.float32)
+    weights[:, 0] = 0.1
+    teacher = context.numpy_inference.NumpyModel(
+        [({'class_name': 'Flatten'}, []),
+         ({'class_name': 'Dense', 'activation': 'linear'},
+          [weights.reshape(50, 1), np.zeros(1, dtype=np.float32)])],
+        (None, 10, 5))
+    # Test case 1: labels are the teacher's predictions
+    labels_path = test.label_with_teacher(trial_path, teacher,
+                                          'trial_file_labels.txt',
+                                          batch_size=64)
+    num, length = organize.get_num_and_len_of_seqs_from_file(labels_path)
+    assert num == 200 and length == 10
+    with open(labels_path) as f:
+        lines = [line.rstrip().split('\t') for line in f][2:]
+    for seq, label, exp_level in lines:
+        assert np.isclose(float(label), 0.1 * seq.count('A'))
+        assert float(exp_level) == seq.count('A')
+    os.remove(labels_path)
+    assert not [name for name in os.listdir('.')
+                if name.startswith('.') and name.endswith(labels_path)]
+    # Test case 2: the student learns the teacher's predictions
+    shutil.rmtree('trial_distill', ignore_errors=True)
+    out_path, report = test.distill_model(
+        trial_path, teacher, epochs=20, batch_size=16,
+        out_path='trial_student.npy', checkpoint_dir='trial_distill',
+        build_fn=context.build_toy_model, load_fn=context.load_toy_model)
+    assert os.path.exists(out_path)
+    assert not os.path.exists('trial_distill')
+    lines = report.splitlines()
+    assert lines[0].startswith('Teacher: ')
+    assert lines[1].startswith('Student: ') and 'seqs_per_second' in lines[1]
+    agreement = float(lines[2].split('pearson_r: ')[1].split()[0])
+    assert agreement > 0.9
+    # Test case 3: the student can be selected by name
+    assert test.STUDENT in test.MODELS_TO_USE
+    assert test.get_saved_model_path(test.STUDENT).endswith(
+        '1d_cnn_student_onehot.hdf5')
+    os.remove(out_path)
+    os.remove(trial_path)
+
+    return
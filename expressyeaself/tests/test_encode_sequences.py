@@ -5,6 +5,7 @@ encode_sequences.py script.
 import expressyeaself.tests.context as context
 import numpy as np
 import os
+import pytest
 
 test = context.encode_sequences
 organize = context.organize_data
@@ -33,6 +34,99 @@ def test_encode_sequences_with_method():
     assert max(els) <= 1
     assert min(els) >= -1
     assert abs_max == - 0.67 + (4 * 5.5)
+    # Test case 2: K-mer method returns sparse count matrix
+    seqs, els, abs_max = test.encode_sequences_with_method(trial_path,
+                                                           method='K-mer',
+                                                           k=2)
+    assert seqs.shape == (len(oligos), 16)
+    assert list(seqs.sum(axis=1).A1) == [3] * len(oligos)
+    assert len(els) == len(oligos)
+    # Test case 3: Integer method returns compact token ids
+    seqs, els, abs_max = test.encode_sequences_with_method(trial_path,
+                                                           method='Integer')
+    assert seqs.shape == (len(oligos), 4)
+    assert seqs.dtype == np.uint8
+    assert list(seqs[:, 0]) == [1, 2, 3, 4]
+    # Test case 4: several targets, each scaled separately
+    with open(trial_path, 'w') as f:
+        for i, oligo in enumerate(oligos):
+            f.write(oligo + '\t' + str(i + 1) + '\t' + str(-2 * i) + '\n')
+    organize.write_num_and_len_of_seqs_to_file(trial_path)
+    seqs, els, abs_max = test.encode_sequences_with_method(trial_path,
+                                                           num_targets=2)
+    assert seqs.shape == (len(oligos), 4, 5)
+    assert els.shape == (len(oligos), 2)
+    assert list(abs_max) == [4.0, 6.0]
+    assert list(els[:, 0]) == [0.25, 0.5, 0.75, 1.0]
+    assert els[-1, 1] == -1.0
+    os.remove(trial_path)
+
+    return
+
+
+def test_integer_encode_sequence():
+    """
+    Tests the function that encodes the string representation of a
+    nucleotide sequence as uint8 token ids.
+    """
+    # Test case 1: valid input, mixed case
+    int_seq = test.integer_encode_sequence('ATgcNP')
+    assert int_seq.dtype == np.uint8
+    assert list(int_seq) == [1, 2, 3, 4, 5, 0]
+    # Test case 2: invalid input
+    try:
+        test.integer_encode_sequence('XYZ')
+    except Exception:
+        pass
+
+    return
+
+
+def test_kmer_encode_sequences():
+    """
+    Tests the function that counts the k-mers in a list of sequences
+    into a sparse matrix, using rolling 2-bit hashes.
+    """
+    # Test case 1: known counts (A=0, T=1, G=2, C=3)
+    counts = test.kmer_encode_sequences(['AATA', 'CCNCCP'], k=2)
+    assert counts.shape == (2, 16)
+    assert counts[0, 0] == 1  # AA
+    assert counts[0, 1] == 1  # AT
+    assert counts[0, 4] == 1  # TA
+    assert counts[0].sum() == 3
+    assert counts[1, 15] == 2  # CC, not counted across the N or P
+    assert counts[1].sum() == 2
+    # Test case 2: k-mers of length 1 are base counts
+    counts = test.kmer_encode_sequences(['ATGCA'], k=1).toarray()
+    assert list(counts[0]) == [2, 1, 1, 1]
+    # Test case 3: invalid k
+    try:
+        test.kmer_encode_sequences(['ATGC'], k=9)
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_kmer_encode_file():
+    """
+    Tests the function that streams a file of sequences in chunks
+    and k-mer encodes them, optionally in parallel.
+    """
+    trial_path = 'trial_file.txt'
+    oligos = ['AAAAAA', 'TTTTTT', 'GGGGGG', 'CCCCCC', 'ATATAT']
+    with open(trial_path, 'w') as f:
+        for i, oligo in enumerate(oligos):
+            f.write(oligo + '\t' + str(i) + '\n')
+    organize.write_num_and_len_of_seqs_to_file(trial_path)
+    # Test case 1: serial and parallel encoding agree
+    serial, els = test.kmer_encode_file(trial_path, k=3, chunk_size=2)
+    parallel, par_els = test.kmer_encode_file(trial_path, k=3, chunk_size=2,
+                                              num_workers=2)
+    assert serial.shape == (len(oligos), 64)
+    assert (serial != parallel).nnz == 0
+    assert list(els) == list(par_els) == list(range(len(oligos)))
+    assert serial[0, 0] == 4  # AAA occurs 4 times in AAAAAA
     os.remove(trial_path)
 
     return
@@ -68,6 +162,96 @@ def test_one_hot_encode_sequence():
     return
 
 
+def test_augment_encoded_seqs():
+    """
+    Tests the function that reverse complements and shifts One-Hot
+    encoded sequences by index arithmetic.
+    """
+    seqs = ['ATGCN', 'AAGGT']
+    encoded = np.array([test.one_hot_encode_sequence(seq) for seq in seqs])
+    # Test case 1: no augmentation returns the same sequences
+    assert np.array_equal(test.augment_encoded_seqs(encoded), encoded)
+    # Test case 2: reverse complement
+    out = test.augment_encoded_seqs(encoded, reverse_complement=True)
+    exp = np.array([test.one_hot_encode_sequence(seq)
+                    for seq in ['NGCAT', 'ACCTT']])
+    assert np.array_equal(out, exp)
+    # Test case 3: shifts (vacated positions are padding vectors)
+    out = test.augment_encoded_seqs(encoded, shifts=np.array([1, -2]))
+    exp = np.array([test.one_hot_encode_sequence(seq)
+                    for seq in ['PATGC', 'GGTPP']])
+    assert np.array_equal(out, exp)
+    # Test case 4: per sequence choice on a subset of indices
+    out = test.augment_encoded_seqs(encoded, indices=np.array([1]),
+                                    reverse_complement=np.array([True]),
+                                    shifts=np.array([1]))
+    assert np.array_equal(out[0], test.one_hot_encode_sequence('PACCT'))
+    # Test case 5: Integer encoded sequences
+    encoded = np.array([test.integer_encode_sequence(seq) for seq in seqs])
+    out = test.augment_encoded_seqs(encoded, reverse_complement=np.array(
+        [True, False]), shifts=np.array([1, -2]))
+    exp = np.array([test.integer_encode_sequence(seq)
+                    for seq in ['PNGCA', 'GGTPP']])
+    assert np.array_equal(out, exp)
+
+    return
+
+
+def test_batch_generator():
+    """
+    Tests the generator that yields (optionally augmented) batches of
+    encoded sequences and expression levels.
+    """
+    seqs = ['AAAA', 'TTTT', 'GGGG', 'CCCC', 'ATAT']
+    encoded = np.array([test.one_hot_encode_sequence(seq) for seq in seqs])
+    els = np.arange(len(seqs), dtype=float)
+    # Test case 1: no augmentation, no shuffling
+    gen = test.batch_generator(encoded, els, batch_size=2, shuffle=False)
+    batches = [next(gen) for i in range(0, 4)]
+    assert [len(b[1]) for b in batches] == [2, 2, 1, 2]  # wraps around
+    assert np.array_equal(batches[0][0], encoded[:2])
+    # Test case 2: augmented batches keep their labels and shape
+    gen = test.batch_generator(encoded, els, batch_size=5,
+                               reverse_complement=True, max_shift=1, seed=0)
+    batch_seqs, batch_els = next(gen)
+    assert batch_seqs.shape == encoded.shape
+    assert sorted(batch_els) == list(els)
+    assert batch_seqs.sum(axis=(1, 2)).min() >= 3  # at most 1 base lost
+    # Test case 3: batches drawn from a subset of the sequences
+    gen = test.batch_generator(encoded, els, batch_size=5, seed=0,
+                               indices=np.array([1, 3]))
+    batch_seqs, batch_els = next(gen)
+    assert sorted(batch_els) == [1.0, 3.0]
+
+    return
+
+
+def test_encode_seqs_to_uint8():
+    """
+    Tests the function that encodes a list of sequences into a uint8
+    array in one vectorized lookup.
+    """
+    seqs = ['ATGCNP', 'ccgtaa']
+    # Test case 1: One-Hot encoding matches one_hot_encode_sequence
+    out_1 = test.encode_seqs_to_uint8(seqs)
+    assert out_1.dtype == np.uint8 and out_1.shape == (2, 6, 5)
+    for seq, encoded_seq in zip(seqs, out_1):
+        assert np.array_equal(encoded_seq, test.one_hot_encode_sequence(seq))
+    # Test case 2: Integer encoding matches integer_encode_sequence
+    out_2 = test.encode_seqs_to_uint8(seqs, method='Integer')
+    assert out_2.shape == (2, 6)
+    for seq, encoded_seq in zip(seqs, out_2):
+        assert np.array_equal(encoded_seq, test.integer_encode_sequence(seq))
+    # Test case 3: invalid character
+    try:
+        test.encode_seqs_to_uint8(['ATGX'])
+    except Exception as e:
+        assert 'non ATGC' in str(e)
+    else:
+        raise AssertionError('Invalid character should raise.')
+
+    return
+
 # def test_resize_array():
 #     """
 #     Tests the function that resizes a 2D array to a specified
@@ -97,3 +281,59 @@ def test_one_hot_encode_sequence():
 #     out_5
 #
 #     return
+
+
+def read_dataset(dataset):
+    """
+    Reads every batch of a finite tf.data dataset into NumPy arrays,
+    eagerly or through a session.
+    """
+    import tensorflow as tf
+    batches = []
+    if tf.executing_eagerly():
+        for encoded_seqs, exp_levels in dataset:
+            batches.append((encoded_seqs.numpy(), exp_levels.numpy()))
+    else:
+        next_batch = tf.compat.v1.data.make_one_shot_iterator(
+            dataset).get_next()
+        with tf.compat.v1.Session() as sess:
+            while True:
+                try:
+                    batches.append(sess.run(next_batch))
+                except tf.errors.OutOfRangeError:
+                    break
+    encoded_seqs = np.concatenate([batch[0] for batch in batches])
+    exp_levels = np.concatenate([batch[1] for batch in batches])
+
+    return encoded_seqs, exp_levels
+
+
+def test_tfrecord_shards():
+    """
+    Tests that sequences written to TFRecord shards are read back by
+    the tf.data pipeline as encode_sequences_with_method encodes
+    them.
+    """
+    pytest.importorskip('tensorflow')
+    trial_path = 'trial_file.txt'
+    context.write_trial_file(trial_path, num_seqs=30, len_seq=20)
+    for method in ['One-Hot', 'Integer']:
+        expected_seqs, expected_els, abs_max_el = \
+            test.encode_sequences_with_method(trial_path, method)
+        shard_paths, len_seq, shard_abs_max_el = test.write_tfrecord_shards(
+            trial_path, 'trial_file_shards', method, num_shards=3)
+        assert len(shard_paths) == 3 and len_seq == 20
+        assert np.isclose(shard_abs_max_el, abs_max_el)
+        # Unshuffled, the shards are interleaved back into file order
+        dataset = test.make_tfrecord_dataset(shard_paths, len_seq, method,
+                                             batch_size=7, shuffle_buffer=0,
+                                             repeat=False)
+        encoded_seqs, exp_levels = read_dataset(dataset)
+        assert encoded_seqs.shape == np.shape(expected_seqs)
+        assert np.array_equal(encoded_seqs, expected_seqs)
+        assert np.allclose(exp_levels, expected_els, atol=1e-6)
+        for shard_path in shard_paths:
+            os.remove(shard_path)
+    os.remove(trial_path)
+
+    return
@@ -0,0 +1,90 @@
+"""
+A script containing unit tests for the functions in the
+generate_data.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+
+test = context.generate_data
+organize = context.organize_data
+utilities = context.utilities
+
+
+def test_get_flanks_from_scaffold():
+    """
+    Tests the function that retrieves the flanking sequences either
+    side of the variable region of a scaffold.
+    """
+    # Test case 1: pTpA scaffold
+    flank_A, flank_B, var_length = test.get_flanks_from_scaffold('pTpA')
+    assert flank_A == 'TGCATTTTTTTCACATC'
+    assert flank_B == 'GGTTACGGCTGTT'
+    assert var_length == 80
+    # Test case 2: Abf1TATA scaffold
+    flank_A, flank_B, var_length = test.get_flanks_from_scaffold('Abf1TATA')
+    assert flank_A == 'TCACGCAGTATAGTTC'
+    assert flank_B == 'GGTTTATTGTTTATAAAAA'
+    assert var_length == 80
+    # Test case 3: invalid scaffold type
+    try:
+        test.get_flanks_from_scaffold('made_up_scaffold')
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_generate_variable_regions():
+    """
+    Tests the function that generates random, optionally
+    motif-seeded, variable regions.
+    """
+    # Test case 1: shape and alphabet
+    random_state = np.random.RandomState(1)
+    regions, counts = test.generate_variable_regions(
+        100, 20, random_state=random_state)
+    assert regions.shape == (100, 20)
+    assert set(regions.tobytes().decode()) <= set('ATGC')
+    assert counts.sum() == 0
+    # Test case 2: every sequence seeded with a motif
+    motif = 'TTTTTTTT'
+    regions, counts = test.generate_variable_regions(
+        50, 20, base_probs=[0.5, 0, 0.5, 0], motifs=[motif], motif_rate=1.0,
+        random_state=random_state)
+    assert counts.sum() == 50
+    for row in regions:
+        assert motif in row.tobytes().decode()
+
+    return
+
+
+def test_generate_raw_library():
+    """
+    Tests the function that writes a synthetic library of raw
+    oligonucleotide sequences and expression levels to file.
+    """
+    # Test case 1: clean library passes the flank and length checks
+    num_seqs = 1000
+    out_path = test.generate_raw_library(num_seqs, 'pTpA', chunk_size=300,
+                                         seed=7)
+    assert utilities.get_seq_count(out_path) == num_seqs
+    assert len(organize.check_oligonucleotide_flanks(out_path, 'pTpA')) == 0
+    max_l, min_l, _ = organize.get_max_min_mode_length_of_seqs(out_path)
+    assert max_l == min_l == 110
+    os.remove(out_path)
+    # Test case 2: library with bad flanks and bad lengths
+    out_path = test.generate_raw_library(num_seqs, 'Abf1TATA',
+                                         bad_length_fraction=0.1,
+                                         bad_flank_fraction=0.1,
+                                         compress=True, seed=7)
+    assert out_path.endswith('.gz')
+    assert utilities.get_seq_count(out_path) == num_seqs
+    incorrect = organize.check_oligonucleotide_flanks(out_path, 'Abf1TATA')
+    assert 0 < len(incorrect) < num_seqs
+    max_l, min_l, mode = organize.get_max_min_mode_length_of_seqs(out_path)
+    assert mode == 115
+    assert max_l != min_l
+    os.remove(out_path)
+
+    return
@@ -0,0 +1,129 @@
+"""
+A script containing unit tests for the functions in the
+hyperparameter_sweep.py script.
+"""
+import expressyeaself.tests.context as context
+import json
+import numpy as np
+import os
+
+test = context.hyperparameter_sweep
+
+
+def train_toy_trial(model_type, params, data, epochs, initial_epoch,
+                    checkpoint, previous_checkpoint):
+    """
+    A stand-in for train_keras_trial, whose loss is lowest for x = 3
+    and falls with the epochs trained. Checks that promoted trials
+    continue from the checkpoint of their previous rung.
+    """
+    if initial_epoch > 0:
+        with open(previous_checkpoint) as f:
+            assert int(f.read()) == initial_epoch
+    with open(checkpoint, 'w') as f:
+        f.write(str(epochs))
+    if params['x'] == 0:
+        raise ValueError('Diverged')
+
+    return (params['x'] - 3) ** 2 + 1.0 / epochs + len(data[0])
+
+
+def train_thread_cap_trial(model_type, params, data, epochs, initial_epoch,
+                           checkpoint, previous_checkpoint):
+    """
+    A stand-in for train_keras_trial whose loss is the thread cap its
+    worker was started with.
+    """
+
+    return float(os.environ['OMP_NUM_THREADS'])
+
+
+def test_sample_configs():
+    """
+    Tests the function that samples configurations from a search
+    space.
+    """
+    space = {'a': [1, 2, 3], 'b': ['x', 'y']}
+    # Test case 1: full grid
+    configs = test.sample_configs(space)
+    assert len(configs) == 6 and configs[0] == {'a': 1, 'b': 'x'}
+    # Test case 2: distinct random sample
+    configs = test.sample_configs(space, num_trials=4, seed=0)
+    assert len(configs) == 4
+    assert len(set(json.dumps(c, sort_keys=True) for c in configs)) == 4
+
+    return
+
+
+def test_get_rung_budgets():
+    """
+    Tests the budgets of the rungs of successive halving.
+    """
+    assert test.get_rung_budgets(1, 9, 3) == [1, 3, 9]
+    assert test.get_rung_budgets(1, 10, 3) == [1, 3, 9, 10]
+    assert test.get_rung_budgets(5, 5) == [5]
+
+    return
+
+
+def test_run_sweep():
+    """
+    Tests running, resuming and parallelizing a sweep.
+    """
+    data = (np.zeros((2, 1)), None, None, None)
+    space = {'x': [0, 1, 2, 3, 4, 5, 6, 7, 8]}
+    log_path = os.path.abspath('trial_file.jsonl')
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    # Test case 1: successive halving keeps the best trials
+    leaderboard, _ = test.run_sweep(None, search_space=space, min_epochs=1,
+                                    max_epochs=9, eta=3, log_path=log_path,
+                                    train_fn=train_toy_trial, data=data)
+    assert leaderboard[0]['params'] == {'x': 3}
+    assert leaderboard[0]['epochs'] == 9
+    assert [r['epochs'] for r in leaderboard].count(3) == 2
+    assert leaderboard[-1]['val_loss'] == float('inf')
+    header, results = test.read_trial_log(log_path)
+    assert len(results) == 9 + 3 + 1
+    assert 'error' in results[(0, 0)]
+    # Test case 2: resuming an interrupted sweep only runs what is left
+    with open(log_path) as f:
+        lines = f.readlines()
+    with open(log_path, 'w') as f:
+        f.writelines(lines[:-2] + ['{"trial": 3, "ru'])
+    resumed, _ = test.run_sweep(None, log_path=log_path,
+                                train_fn=train_toy_trial, data=data)
+    assert [(r['params'], r['val_loss']) for r in resumed] == \
+        [(r['params'], r['val_loss']) for r in leaderboard]
+    assert resumed[0]['checkpoint'].endswith('_trial_3_rung_2.hdf5')
+    with open(log_path) as f:
+        records = [json.loads(line) for line in f][1:]
+    assert len(records) == 9 + 3 + 1
+    assert [(r['trial'], r['rung']) for r in records[-2:]] == \
+        [(record['trial'], record['rung'])
+         for record in map(json.loads, lines[-2:])]
+    # Test case 3: multiple workers give the same result
+    for path in os.listdir('.'):
+        if path.startswith('trial_file_trial_'):
+            os.remove(path)
+    os.remove(log_path)
+    parallel, _ = test.run_sweep(None, search_space=space, log_path=log_path,
+                                 num_workers=2, train_fn=train_toy_trial,
+                                 data=data)
+    assert [r['params'] for r in parallel] == \
+        [r['params'] for r in leaderboard]
+    for path in os.listdir('.'):
+        if path.startswith('trial_file_trial_'):
+            os.remove(path)
+    os.remove(log_path)
+    # Test case 4: workers are started with the thread cap, and this
+    # process's environment is left as it was
+    omp_threads = os.environ.get('OMP_NUM_THREADS')
+    capped, _ = test.run_sweep(None, search_space=space, log_path=log_path,
+                               num_workers=2, threads_per_worker=3,
+                               train_fn=train_thread_cap_trial, data=data)
+    assert all(r['val_loss'] == 3.0 for r in capped)
+    assert os.environ.get('OMP_NUM_THREADS') == omp_threads
+    os.remove(log_path)
+
+    return
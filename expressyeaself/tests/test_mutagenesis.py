@@ -0,0 +1,127 @@
+"""
+A script containing unit tests for the functions in the
+mutagenesis.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+
+test = context.mutagenesis
+encode = context.encode_sequences
+
+
+class PositionWeightModel(object):
+    """
+    A stand-in for a Keras model, scoring One-Hot encoded sequences
+    by a position weight matrix, that counts its predict() calls.
+    """
+    def __init__(self, weights):
+        self.weights = weights
+        self.input_shape = (None,) + weights.shape
+        self.calls = 0
+
+    def predict(self, encoded_seqs, batch_size=32):
+        self.calls += 1
+        return (encoded_seqs * self.weights).sum(axis=(1, 2))[:, None]
+
+
+def test_encode_parent_seqs():
+    """
+    Tests the function that One-Hot encodes parent sequences.
+    """
+    # Test case 1: valid input
+    encoded = test.encode_parent_seqs(['ATGC', 'NNAA'])
+    assert encoded.shape == (2, 4, 5)
+    assert encoded.dtype == np.float32
+    # Test case 2: sequences of different lengths
+    try:
+        test.encode_parent_seqs(['ATGC', 'AT'])
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_build_mutants():
+    """
+    Tests the function that builds every single-base mutant of the
+    encoded parents.
+    """
+    encoded = test.encode_parent_seqs(['ATGC'])
+    # Test case 1: substitutions and deletions
+    mutants = test.build_mutants(encoded)
+    assert mutants.shape == (1, 1 + 16 + 4, 4, 5)
+    assert np.array_equal(mutants[0, 0], encoded[0])
+    assert np.array_equal(mutants[0, 1 + 4 * 2 + 3],
+                          test.encode_parent_seqs(['ATCC'])[0])
+    assert np.array_equal(mutants[0, 17 + 1],
+                          test.encode_parent_seqs(['AGCP'])[0])
+    # Test case 2: deletions padded at the front
+    mutants = test.build_mutants(encoded, pad_front=True)
+    assert np.array_equal(mutants[0, 17 + 3],
+                          test.encode_parent_seqs(['PATG'])[0])
+    # Test case 3: no deletions
+    mutants = test.build_mutants(encoded, deletions=False)
+    assert mutants.shape == (1, 17, 4, 5)
+
+    return
+
+
+def test_format_model_input():
+    """
+    Tests the function that converts One-Hot encoded sequences to
+    the input form of a model.
+    """
+    encoded = test.encode_parent_seqs(['ATGCNP'])
+    # Test case 1: One-Hot input model
+    model = PositionWeightModel(np.zeros((6, 5)))
+    assert test.format_model_input(model, encoded) is encoded
+    # Test case 2: Integer input model
+    model.input_shape = (None, 6)
+    token_ids = test.format_model_input(model, encoded)
+    assert np.array_equal(token_ids[0],
+                          encode.integer_encode_sequence('ATGCNP'))
+    # Test case 3: flattened input model
+    model.input_shape = (None, 30, 1)
+    assert test.format_model_input(model, encoded).shape == (1, 30, 1)
+
+    return
+
+
+def test_saturation_mutagenesis():
+    """
+    Tests the function that predicts the effect of every single-base
+    substitution and deletion of the parent sequences.
+    """
+    random_state = np.random.RandomState(0)
+    weights = random_state.rand(10, 5)
+    model = PositionWeightModel(weights)
+    parents = [''.join(random_state.choice(list('ATGC'), size=10))
+               for i in range(0, 50)]
+    # Test case 1: effects match scoring each mutant separately
+    parent_preds, sub_effects, del_effects = test.saturation_mutagenesis(
+        model, parents, batch_size=1000)
+    assert model.calls == 3
+    assert sub_effects.shape == (50, 10, 4)
+    assert del_effects.shape == (50, 10)
+    seq = parents[7]
+    wt = model.predict(test.encode_parent_seqs([seq]))[0, 0]
+    assert np.isclose(parent_preds[7], wt)
+    for i in range(0, 10):
+        for j, base in enumerate(encode.BASES):
+            mutant = seq[:i] + base + seq[i + 1:]
+            pred = model.predict(test.encode_parent_seqs([mutant]))[0, 0]
+            assert np.isclose(sub_effects[7, i, j], pred - wt, atol=1e-5)
+        mutant = seq[:i] + seq[i + 1:] + 'P'
+        pred = model.predict(test.encode_parent_seqs([mutant]))[0, 0]
+        assert np.isclose(del_effects[7, i], pred - wt, atol=1e-5)
+    # Test case 2: no deletions
+    _, _, del_effects = test.saturation_mutagenesis(model, parents,
+                                                    deletions=False)
+    assert del_effects is None
+    # Test case 3: object without a predict method
+    try:
+        test.saturation_mutagenesis(weights, parents)
+    except AssertionError:
+        pass
+
+    return
@@ -0,0 +1,240 @@
+"""
+A script containing unit tests for the functions in the
+numpy_inference.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+import pandas as pd
+import pytest
+
+test = context.numpy_inference
+KERAS_PREDICTIONS = {'1d_cnn_sequential': 'expressyeaself/models/1d_cnn/',
+                     'lstm_sequential_2d': 'expressyeaself/models/lstm/'}
+
+
+def test_conv1d():
+    """
+    Tests the NumPy Conv1D layer against a direct loop.
+    """
+    random_state = np.random.RandomState(0)
+    x = random_state.rand(2, 11, 3).astype(np.float32)
+    weights = [random_state.rand(3, 3, 4).astype(np.float32),
+               random_state.rand(4).astype(np.float32)]
+    # Test case 1: valid padding, strides and dilation
+    config = {'strides': [2], 'dilation_rate': [2], 'padding': 'valid',
+              'activation': 'linear'}
+    out, _ = test.conv1d(x, config, weights)
+    assert out.shape == (2, 4, 4)
+    for t in range(0, 4):
+        expected = weights[1].copy()
+        for k in range(0, 3):
+            expected = expected + x[:, 2 * t + 2 * k].dot(weights[0][k])
+        assert np.allclose(out[:, t], expected, atol=1e-5)
+    # Test case 2: same padding keeps the number of steps
+    config = {'padding': 'same', 'activation': 'relu'}
+    out, _ = test.conv1d(x, config, weights)
+    assert out.shape == (2, 11, 4)
+    assert out.min() >= 0
+
+    return
+
+
+def test_pooling1d():
+    """
+    Tests the NumPy pooling layers.
+    """
+    x = np.arange(12, dtype=np.float32).reshape(1, 6, 2)
+    # Test case 1: max pooling
+    config = {'class_name': 'MaxPooling1D', 'pool_size': [3],
+              'strides': [1], 'padding': 'valid'}
+    out, _ = test.pooling1d(x, config, [])
+    assert np.array_equal(out[0, :, 0], [4, 6, 8, 10])
+    # Test case 2: average pooling with default strides
+    config = {'class_name': 'AveragePooling1D', 'pool_size': [2],
+              'strides': None, 'padding': 'valid'}
+    out, _ = test.pooling1d(x, config, [])
+    assert np.array_equal(out[0, :, 0], [1, 5, 9])
+    # Test case 3: global pooling
+    config = {'class_name': 'GlobalAveragePooling1D'}
+    out, _ = test.global_pooling1d(x, config, [])
+    assert np.array_equal(out, [[5, 6]])
+
+    return
+
+
+def test_lstm():
+    """
+    Tests the NumPy LSTM layer against a step by step loop over a
+    single sequence.
+    """
+    random_state = np.random.RandomState(0)
+    units = 3
+    x = random_state.randn(2, 5, 4).astype(np.float32)
+    weights = [random_state.randn(4, 4 * units).astype(np.float32),
+               random_state.randn(units, 4 * units).astype(np.float32),
+               random_state.randn(4 * units).astype(np.float32)]
+    config = {'activation': 'tanh', 'recurrent_activation': 'hard_sigmoid'}
+    out, _ = test.lstm(x, config, weights)
+    assert out.shape == (2, units)
+    for n in range(0, 2):
+        h = np.zeros(units)
+        c = np.zeros(units)
+        for t in range(0, 5):
+            z = x[n, t].dot(weights[0]) + h.dot(weights[1]) + weights[2]
+            gates = [test.hard_sigmoid(z[j * units:(j + 1) * units])
+                     for j in range(0, 4)]
+            c = gates[1] * c + gates[0] * np.tanh(z[2 * units:3 * units])
+            h = gates[3] * np.tanh(c)
+        assert np.allclose(out[n], h, atol=1e-5)
+    # Test case 2: masked steps carry the state forward
+    mask = np.array([[True] * 5, [True, True, False, False, False]])
+    out, _ = test.lstm(x, config, weights, mask)
+    short, _ = test.lstm(x[1:, :2], config, weights)
+    assert np.allclose(out[1], short[0], atol=1e-5)
+
+    return
+
+
+def test_load_numpy_model():
+    """
+    Tests the function that loads saved models into the NumPy
+    runtime.
+    """
+    seqs = np.array([context.encode_sequences.one_hot_encode_sequence(
+        'ATGC' * 20)] * 3)
+    for model_to_use in ['1d_cnn_sequential', 'lstm_sequential_2d']:
+        saved_model = test.get_saved_model_path(model_to_use)
+        model = test.load_numpy_model(saved_model)
+        assert model.input_shape == (None, 80, 5)
+        preds = model.predict(seqs, batch_size=2)
+        assert preds.shape == (3, 1)
+        assert np.allclose(preds, preds[0])
+        assert (preds > 0).all() and (preds < 1).all()
+    # Test case 2: missing file
+    try:
+        test.load_numpy_model('not_a_model.hdf5')
+    except AssertionError:
+        pass
+
+    return
+
+
+def get_reference_seqs():
+    """
+    Returns the fixed One-Hot encoded sequences that the stored
+    Keras predictions of the saved models were made for.
+    """
+    random_state = np.random.RandomState(0)
+    codes = random_state.randint(0, 4, size=(64, 80))
+
+    return np.eye(5, dtype=np.float32)[codes]
+
+
+def test_numpy_model_matches_keras():
+    """
+    Tests that the NumPy runtime gives the same predictions as
+    TensorFlow for the saved models.
+    """
+    tf = pytest.importorskip('tensorflow')
+    seqs = get_reference_seqs()
+    for model_to_use in KERAS_PREDICTIONS:
+        saved_model = test.get_saved_model_path(model_to_use)
+        keras_model = tf.keras.models.load_model(saved_model, compile=False)
+        numpy_model = test.load_numpy_model(saved_model)
+        assert np.allclose(numpy_model.predict(seqs, batch_size=16),
+                           keras_model.predict(seqs, batch_size=16),
+                           atol=1e-5)
+
+    return
+
+
+def test_numpy_model_matches_stored_keras_predictions():
+    """
+    Tests that the NumPy runtime gives the predictions that Keras
+    (TensorFlow 1.13.1) made for the saved models, stored in
+    keras_predictions.txt, and those of the saved results of the
+    native sample, without needing TensorFlow.
+    """
+    seqs = get_reference_seqs()
+    results = {'1d_cnn_sequential': 'cnn_result.csv',
+               'lstm_sequential_2d': 'lstm_result.csv'}
+    for model_to_use, model_dir in KERAS_PREDICTIONS.items():
+        model_dir = context.utilities.ROOT_DIR + model_dir
+        numpy_model = test.load_numpy_model(
+            test.get_saved_model_path(model_to_use))
+        keras_preds = np.loadtxt(model_dir + 'keras_predictions.txt')
+        assert np.allclose(numpy_model.predict(seqs, batch_size=16)[:, 0],
+                           keras_preds, atol=1e-5)
+        df = test.get_numpy_predictions_for_input_file(
+            model_dir + 'native_sample.txt', model_to_use)
+        saved_df = pd.read_csv(model_dir + results[model_to_use],
+                               index_col=0)
+        merged = saved_df.merge(df, on='seq')
+        assert len(merged) == len(saved_df)
+        assert np.allclose(merged['el_prediction_x'],
+                           merged['el_prediction_y'], atol=1e-5)
+
+    return
+
+
+def test_get_numpy_predictions_for_input_file():
+    """
+    Tests the function that predicts expression levels for every
+    sequence in an input file with the NumPy runtime.
+    """
+    trial_path = 'trial_file.txt'
+    with open(trial_path, 'w') as f:
+        f.write('A' * 80 + '\n' + 'ATGC' * 20 + '\n' + 'G' * 80 + '\n')
+    df = test.get_numpy_predictions_for_input_file(trial_path,
+                                                   '1d_cnn_sequential')
+    assert len(df) == 3
+    assert df['el_prediction'].is_monotonic_decreasing
+    # Test case 2: only the highest and lowest, streamed in batches
+    with open(trial_path, 'w') as f:
+        f.write('\n'.join(['A' * 80, 'ATGC' * 20, 'G' * 80, 'ATGC' * 20,
+                           'C' * 80, 'A' * 80]) + '\n')
+    full = test.get_numpy_predictions_for_input_file(trial_path,
+                                                     '1d_cnn_sequential')
+    df = test.get_numpy_predictions_for_input_file(
+        trial_path, '1d_cnn_sequential', batch_size=2, top_k=2, bottom_k=1)
+    assert list(df.columns) == ['index', 'seq', 'el_prediction']
+    assert list(df['index']) == list(full['index'][:2]) + \
+        list(full['index'][-1:])
+    assert np.allclose(df['el_prediction'], list(full['el_prediction'][:2]) +
+                       list(full['el_prediction'][-1:]))
+    # Test case 3: overlapping top and bottom keep each sequence once
+    df = test.get_numpy_predictions_for_input_file(
+        trial_path, '1d_cnn_sequential', top_k=5, bottom_k=5)
+    assert sorted(df['index']) == list(range(0, 6))
+    assert df['el_prediction'].is_monotonic_decreasing
+    os.remove(trial_path)
+
+    return
+
+
+def test_predict_mc_dropout():
+    """
+    Tests Monte Carlo dropout predictions in the NumPy runtime.
+    """
+    saved_model = test.get_saved_model_path('1d_cnn_sequential')
+    model = test.load_numpy_model(saved_model)
+    seqs = np.array([context.encode_sequences.one_hot_encode_sequence(seq)
+                     for seq in ['ATGC' * 20, 'A' * 80, 'G' * 80]])
+    # Test case 1: a mean and a spread for each sequence
+    mean, std = model.predict_mc_dropout(seqs, num_samples=20, batch_size=2,
+                                         seed=0)
+    assert mean.shape == (3, 1) and std.shape == (3, 1)
+    assert (std > 0).all()
+    # Test case 2: reproducible with a seed
+    mean_2, std_2 = model.predict_mc_dropout(seqs, num_samples=20, seed=0)
+    assert np.allclose(mean, mean_2) and np.allclose(std, std_2)
+    # Test case 3: without dropout, every sample is the prediction
+    layers = [(dict(config, rate=0.0) if config['class_name'] == 'Dropout'
+               else config, weights) for config, weights in model.layers]
+    model = test.NumpyModel(layers, model.input_shape)
+    mean, std = model.predict_mc_dropout(seqs, num_samples=5)
+    assert np.allclose(mean, model.predict(seqs), atol=1e-6)
+    assert np.allclose(std, 0, atol=1e-6)
+
+    return
@@ -161,6 +161,134 @@ def test_check_oligonucleotide_flanks():
     return
 
 
+def test_get_seq_hash():
+    """
+    Tests the function that returns a deterministic 64-bit hash of
+    a nucleotide sequence.
+    """
+    # Test case 1: same sequence, same hash
+    seq_hash = test.get_seq_hash('ATGC')
+    assert seq_hash == test.get_seq_hash('ATGC')
+    assert 0 <= seq_hash < 2 ** 64
+    # Test case 2: different sequences, different hashes
+    assert seq_hash != test.get_seq_hash('ATGG')
+
+    return
+
+
+def test_aggregate_els():
+    """
+    Tests the function that aggregates the expression levels of
+    replicates of the same sequence.
+    """
+    # Test case 1: mean and median
+    assert test.aggregate_els([1.0, 2.0, 9.0], 'mean') == 4.0
+    assert test.aggregate_els([1.0, 2.0, 9.0], 'median') == 2.0
+    # Test case 2: invalid method
+    try:
+        test.aggregate_els([1.0], 'mode')
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_deduplicate_seqs():
+    """
+    Tests the function that merges repeated sequences in an input
+    file and aggregates their expression levels.
+    """
+    trial_path = 'trial_file.txt'
+    with open(trial_path, 'w') as f:
+        f.write('AAAA\t1.0\n')
+        f.write('TTTT\t2.0\n')
+        f.write('AAAA\t3.0\n')
+        f.write('GGGG\t4.0\n')
+        f.write('AAAA\t8.0\n')
+        f.write('TTTT\t4.0\n')
+        f.write('This is an invalid line.')
+    expected = {'AAAA': (4.0, 3), 'TTTT': (3.0, 2), 'GGGG': (4.0, 1)}
+    # Test case 1: all distinct sequences held in memory
+    out_path = test.deduplicate_seqs(trial_path, write_counts=True)
+    with open(out_path, 'r') as f:
+        lines = [line.rstrip().split('\t') for line in f]
+    assert [line[0] for line in lines] == ['AAAA', 'TTTT', 'GGGG']
+    for seq, el, count in lines:
+        assert (float(el), int(count)) == expected[seq]
+    os.remove(out_path)
+    # Test case 2: spilling partitions to disk, median aggregation
+    out_path = test.deduplicate_seqs(trial_path, aggregate='median',
+                                     max_seqs_in_memory=1, num_partitions=2)
+    with open(out_path, 'r') as f:
+        results = dict(utilities.separate_seq_and_el_data(line)
+                       for line in f)
+    assert results == {'AAAA': 3.0, 'TTTT': 3.0, 'GGGG': 4.0}
+    assert not os.path.exists(out_path.replace('_deduplicated_seqs.txt',
+                                               '_dedup_partition_0.txt'))
+    os.remove(out_path)
+    os.remove(trial_path)
+
+    return
+
+
+def test_stream_native_data():
+    """
+    Tests the generator that streams sequences and one column of
+    expression levels out of the multi-column native data format.
+    """
+    trial_path = 'trial_file.txt'
+    flank_A = 'AACTGCATTTTTTTCACATC'
+    flank_B = 'GGTTACGGCTGTTTCTTAAT'
+    with open(trial_path, 'w') as f:
+        f.write('\t'.join(test.NATIVE_COLUMNS) + '\n')
+        f.write(flank_A + 'AAAA' + flank_B + '\tTRUE\t1.0\t2\t3\t4.5\n')
+        f.write(flank_A + 'TTTT' + flank_B + '\tFALSE\t1.5\t2\t3\t5.5\n')
+        f.write(flank_A + 'GGGG' + flank_B + '\tTRUE\tNA\t2\t3\tNA\n')
+    # Test case 1: all sequences, default column
+    data = list(test.stream_native_data(trial_path))
+    assert data == [(flank_A + 'AAAA' + flank_B, 4.5),
+                    (flank_A + 'TTTT' + flank_B, 5.5)]
+    # Test case 2: filtering on isNative, another column, deflanked
+    data = list(test.stream_native_data(trial_path, 'EL.originalHQ',
+                                        is_native=False, deflank=True))
+    assert data == [('TTTT', 1.5)]
+    # Test case 3: column not in header
+    try:
+        list(test.stream_native_data(trial_path, 'EL.made_up'))
+    except AssertionError:
+        pass
+    # Test case 4: several columns at once
+    data = list(test.stream_native_data(trial_path, ['EL.rep1', 'EL.rep2'],
+                                        deflank=True))
+    assert data == [('AAAA', [2.0, 3.0]), ('TTTT', [2.0, 3.0]),
+                    ('GGGG', [2.0, 3.0])]
+    data = list(test.stream_native_data(trial_path, test.NATIVE_EL_COLUMNS,
+                                        deflank=True))
+    assert [seq for seq, _ in data] == ['AAAA', 'TTTT']
+    os.remove(trial_path)
+
+    return
+
+
+def test_write_native_data_to_file():
+    """
+    Tests the function that writes one column of the native data
+    format to a file ready for encoding.
+    """
+    # Test case 1: the example native data file
+    native_path = os.path.join(test.ROOT_DIR,
+                               'example/native_data/native_data.txt.gz')
+    out_path = test.write_native_data_to_file(native_path, 'EL.rep1',
+                                              is_native=False, deflank=True)
+    num, leng = test.get_num_and_len_of_seqs_from_file(out_path)
+    assert num == utilities.get_seq_count(out_path) - 2
+    assert num > 0
+    assert leng == 80
+    os.remove(out_path)
+
+    return
+
+
 def test_remove_files():
     """
     Tests the function that takes as input a list containing the
@@ -0,0 +1,102 @@
+"""
+A script containing unit tests for the functions in the
+prediction_cache.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+
+test = context.prediction_cache
+
+
+def test_get_model_fingerprint():
+    """
+    Tests the function that fingerprints a saved model file.
+    """
+    trial_path = 'trial_file.txt'
+    # Test case 1: same contents give the same fingerprint
+    with open(trial_path, 'wb') as f:
+        f.write(b'weights')
+    fingerprint = test.get_model_fingerprint(trial_path)
+    assert isinstance(fingerprint, str)
+    assert fingerprint == test.get_model_fingerprint(trial_path)
+    # Test case 2: changed contents give a new fingerprint
+    with open(trial_path, 'wb') as f:
+        f.write(b'new weights')
+    os.utime(trial_path, (0, 12345))
+    assert fingerprint != test.get_model_fingerprint(trial_path)
+    os.remove(trial_path)
+    # Test case 3: missing file
+    try:
+        test.get_model_fingerprint(trial_path)
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_prediction_cache():
+    """
+    Tests the LRU and on-disk prediction store.
+    """
+    db_path = 'trial_cache.db'
+    seqs = ['AAAA', 'TTTT', 'GGGG']
+    # Test case 1: misses, then hits after storing
+    cache = test.PredictionCache(db_path, max_memory_items=2)
+    preds, misses = cache.get_many('model_a', seqs)
+    assert list(misses) == [0, 1, 2]
+    assert np.isnan(preds).all()
+    cache.put_many('model_a', seqs, [0.1, 0.2, 0.3])
+    assert len(cache.memory) == 2
+    preds, misses = cache.get_many('model_a', seqs + ['CCCC'])
+    assert list(misses) == [3]
+    assert np.allclose(preds[:3], [0.1, 0.2, 0.3])
+    assert cache.get_hit_rate() == 3 / 7
+    # Test case 2: predictions are keyed by model fingerprint
+    assert cache.get('model_b', 'AAAA') is None
+    cache.put('model_b', 'AAAA', 0.9)
+    assert cache.get('model_b', 'AAAA') == 0.9
+    assert cache.get('model_a', 'AAAA') == 0.1
+    cache.close()
+    # Test case 3: predictions persist on disk
+    cache = test.PredictionCache(db_path)
+    assert cache.get('model_a', 'GGGG') == 0.3
+    cache.close()
+    # Test case 4: a sequence whose hash collides with a cached one
+    # is a miss, not the other sequence's prediction
+    get_seq_hash = test.get_seq_hash
+    test.get_seq_hash = lambda seq: 7
+    try:
+        cache = test.PredictionCache(db_path, max_memory_items=0)
+        cache.put('model_c', 'AAAA', 0.4)
+        assert cache.get('model_c', 'TTTT') is None
+        assert cache.get('model_c', 'AAAA') == 0.4
+        cache.close()
+    finally:
+        test.get_seq_hash = get_seq_hash
+    for path in os.listdir('.'):
+        if path.startswith(db_path):
+            os.remove(path)
+
+    return
+
+
+def test_warm_up_from_file():
+    """
+    Tests the function that bulk loads prediction results files
+    into the cache.
+    """
+    trial_path = 'trial_file.txt'
+    with open(trial_path, 'w') as f:
+        f.write('1\tAAAA\t0.5\n0\tTTTT\t0.25\n')
+    cache = test.PredictionCache(':memory:')
+    assert cache.warm_up_from_file(trial_path, 'model_a') == 2
+    assert cache.get('model_a', 'TTTT') == 0.25
+    with open(trial_path, 'w') as f:
+        f.write('GGGG\t0.75\n')
+    assert cache.warm_up_from_file(trial_path, 'model_a') == 1
+    assert cache.get('model_a', 'GGGG') == 0.75
+    cache.close()
+    os.remove(trial_path)
+
+    return
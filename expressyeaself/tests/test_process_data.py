@@ -62,7 +62,7 @@ def test_process_raw_data():
             exp_seq = scaff_pre + oligo + scaff_post
             assert seq == exp_seq
     os.remove(processed)
-    idx = processed.find('20') + 21
+    idx = processed.find('20') + 30
     os.remove(processed[:idx] + 'process_report.txt')
     # Test case 3: extra padding at front
     processed = test.process_raw_data(trial_path, scaffold_type=scaff,
@@ -93,7 +93,7 @@ def test_process_raw_data():
             g.readline()  # skip first 2 info lines
             assert f.read() == g.read()
     os.remove(trial_path)
-    idx = processed.find('20') + 21
+    idx = processed.find('20') + 30
     os.remove(processed[:idx] + 'process_report.txt')
     os.remove(processed)
     # Test case 4: pulling out top and bottom percentiles, and sample data
@@ -118,7 +118,26 @@ def test_process_raw_data():
     os.remove(trial_path)
     os.remove(processed)
     os.remove(sample)
-    idx = processed.find('20') + 21
+    idx = processed.find('20') + 30
     os.remove(processed[:idx] + 'process_report.txt')
 
+    # Test case 5: merging repeated sequences before processing
+    trial_path = 'trial_file.txt'
+    with open(trial_path, 'w') as f:
+        f.write('ATGC\t5.0\n')
+        f.write('ATGG\t6.0\n')
+        f.write('ATGC\t7.0\n')
+    processed = test.process_raw_data(trial_path, scaff, deflank=False,
+                                      insert_into_scaffold=False,
+                                      report_times=False, report_loss=False,
+                                      deduplicate=True)
+    assert processed.find('_deduplicated') != -1
+    assert utilities.get_seq_count(processed) - 2 == 2
+    with open(processed, 'r') as g:
+        g.readline()
+        g.readline()  # skip first 2 info lines
+        assert g.readline() == 'ATGC\t6.0\n'
+    os.remove(trial_path)
+    os.remove(processed)
+
     return
@@ -0,0 +1,92 @@
+"""
+A script containing unit tests for the functions in the
+prune_model.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+
+test = context.prune_model
+numpy_inference = context.numpy_inference
+
+
+def load_trial_model():
+    """
+    Loads the saved 1d_cnn_sequential model into the NumPy runtime.
+    """
+    saved_model = context.utilities.get_saved_model_path('1d_cnn_sequential')
+
+    return numpy_inference.load_numpy_model(saved_model)
+
+
+def test_get_next_weighted_layer():
+    """
+    Tests the function that finds the layer taking a layer's outputs.
+    """
+    layers = [({'class_name': 'Conv1D'}, []),
+              ({'class_name': 'MaxPooling1D'}, []),
+              ({'class_name': 'Conv1D'}, []),
+              ({'class_name': 'Flatten'}, []),
+              ({'class_name': 'Dense'}, [])]
+    assert test.get_next_weighted_layer(layers, 0) == 2
+    assert test.get_next_weighted_layer(layers, 2) is None
+    assert test.get_next_weighted_layer(layers, 4) is None
+
+    return
+
+
+def test_prune_layers():
+    """
+    Tests that pruning rebuilds smaller layers, and that removing
+    dead filters leaves the predictions unchanged.
+    """
+    model = load_trial_model()
+    len_seq = model.input_shape[1]
+    random_state = np.random.RandomState(0)
+    x = np.eye(5, dtype=np.float32)[random_state.randint(0, 4, (20,
+                                                                len_seq))]
+    # Test case 1: smaller layers, the output layer is kept
+    pruned_layers = test.prune_layers(model.layers, amount=0.5)
+    assert test.count_params(pruned_layers) < test.count_params(model.layers)
+    for (config, weights), (pruned_config, pruned_weights) in zip(
+            model.layers, pruned_layers):
+        if config['class_name'] == 'Conv1D':
+            assert pruned_weights[0].shape[-1] == pruned_config['filters']
+    assert pruned_layers[-1][1][0].shape[-1] == 1
+    pruned_model = numpy_inference.NumpyModel(pruned_layers,
+                                              model.input_shape)
+    assert pruned_model.predict(x).shape == (20, 1)
+    # Test case 2: the original model is not changed
+    assert np.allclose(model.predict(x), load_trial_model().predict(x))
+    # Test case 3: removing filters that are all zeros changes nothing
+    layers = test.prune_layers(model.layers, amount=0.0)
+    config, weights = layers[0]
+    filters = config['filters']
+    weights[0][..., :filters // 2] = 0
+    weights[1][:filters // 2] = 0
+    dead_model = numpy_inference.NumpyModel(layers, model.input_shape)
+    amount = {config['name']: (filters // 2) / float(filters)}
+    pruned_layers = test.prune_layers(layers, amount=amount)
+    assert pruned_layers[0][0]['filters'] == filters - filters // 2
+    assert test.count_params(pruned_layers) < test.count_params(layers)
+    pruned_model = numpy_inference.NumpyModel(pruned_layers,
+                                              model.input_shape)
+    assert np.allclose(pruned_model.predict(x), dead_model.predict(x),
+                       atol=1e-5)
+
+    return
+
+
+def test_format_table():
+    """
+    Tests the table comparing the original and pruned models.
+    """
+    metrics = {'loss': 0.5, 'pearson_r': 0.9, 'seqs_per_second': 1000.0}
+    table = test.format_table([('model', 100, metrics),
+                               ('model_pruned', 40,
+                                dict(metrics, loss=0.6))])
+    lines = table.splitlines()
+    assert lines[0].split('\t')[:3] == ['model', 'params', 'loss']
+    assert lines[2].split('\t')[:4] == ['model_pruned', '40', '0.600000',
+                                        '+0.100000']
+
+    return
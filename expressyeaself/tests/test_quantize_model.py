@@ -0,0 +1,103 @@
+"""
+A script containing unit tests for the functions in the
+quantize_model.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+
+test = context.quantize_model
+numpy_inference = test.numpy_inference
+
+
+def write_trial_file(trial_path, num_seqs=20):
+    """
+    Writes a processed-style trial file of random sequences of
+    length 80 and their expression levels.
+    """
+    random_state = np.random.RandomState(0)
+    with open(trial_path, 'w') as f:
+        f.write('number_of_seqs_in_file\t' + str(num_seqs) + '\n')
+        f.write('length_of_each_sequence\t80\n')
+        for i in range(0, num_seqs):
+            seq = ''.join(random_state.choice(list('ATGC'), size=80))
+            f.write(seq + '\t' + str(float(i)) + '\n')
+
+    return
+
+
+def test_get_calibration_seqs():
+    """
+    Tests the function that samples and encodes calibration
+    sequences from a processed data file.
+    """
+    trial_path = 'trial_file.txt'
+    write_trial_file(trial_path)
+    # Test case 1: sample smaller than the file
+    seqs = test.get_calibration_seqs(trial_path, num_seqs=5, seed=0)
+    assert seqs.shape == (5, 80, 5)
+    assert np.array_equal(seqs, test.get_calibration_seqs(trial_path, 5,
+                                                          seed=0))
+    # Test case 2: sample larger than the file skips the info lines
+    seqs = test.get_calibration_seqs(trial_path, num_seqs=100)
+    assert seqs.shape == (20, 80, 5)
+    os.remove(trial_path)
+
+    return
+
+
+def test_quantize_weights():
+    """
+    Tests the per-channel int8 quantization of a kernel.
+    """
+    random_state = np.random.RandomState(0)
+    kernel = random_state.randn(3, 5, 4).astype(np.float32)
+    kernel[..., 3] = 0
+    quantized_kernel, scale = test.quantize_weights(kernel)
+    assert quantized_kernel.dtype == np.int8 and scale.shape == (4,)
+    assert np.abs(quantized_kernel[..., :3]).max(axis=(0, 1)).tolist() == \
+        [127, 127, 127]
+    assert np.allclose(quantized_kernel * scale, kernel, atol=scale.max())
+
+    return
+
+
+def test_quantize_numpy_model():
+    """
+    Tests quantizing a saved model and saving and loading the
+    quantized model.
+    """
+    saved_model = numpy_inference.get_saved_model_path('1d_cnn_sequential')
+    float_model = numpy_inference.load_numpy_model(saved_model)
+    calibration_seqs = test.get_calibration_seqs(
+        test.ROOT_DIR + test.CALIBRATION_DATA, num_seqs=50, seed=0)
+    # Test case 1: int8 and float16 predictions stay close to float
+    for mode in test.MODES:
+        quantized_model = test.quantize_numpy_model(float_model,
+                                                    calibration_seqs, mode)
+        report = test.compare_to_float_model(float_model, quantized_model)
+        values = report.split()
+        assert float(values[values.index('max_abs_delta:') + 1]) < 0.05
+        assert test.get_model_size(quantized_model) < \
+            test.get_model_size(float_model)
+    int8_model = test.quantize_numpy_model(float_model, calibration_seqs)
+    class_names = [config['class_name'] for config, weights
+                   in int8_model.layers]
+    assert 'QuantizedConv1D' in class_names and 'Conv1D' not in class_names
+    # The int8 kernels are stored as int8, and converted once to compute
+    i = class_names.index('QuantizedConv1D')
+    assert int8_model.layers[i][1][0].dtype == np.int8
+    assert int8_model.compute_layers[i][1][0].dtype == np.float32
+    # Test case 2: the saved quantized model gives the same predictions
+    out_path = test.save_quantized_model(quantized_model, 'trial_file.npz')
+    loaded_model = test.load_quantized_model(out_path)
+    assert np.array_equal(loaded_model.predict(calibration_seqs),
+                          quantized_model.predict(calibration_seqs))
+    os.remove(out_path)
+    # Test case 3: int8 requires calibration sequences
+    try:
+        test.quantize_numpy_model(float_model)
+    except AssertionError:
+        pass
+
+    return
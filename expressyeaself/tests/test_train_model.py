@@ -0,0 +1,55 @@
+"""
+A script containing unit tests for the functions in the
+train_model.py script.
+"""
+import expressyeaself.tests.context as context
+import numpy as np
+import os
+import shutil
+
+test = context.train_model
+
+
+def test_train_with_checkpoints():
+    """
+    Tests that interrupted training resumes exactly where it stopped,
+    and warm-starting from a saved model.
+    """
+    trial_path = 'trial_file.txt'
+    context.write_trial_file(trial_path, len_seq=20)
+    kwargs = {'epochs': 3, 'batch_size': 8, 'checkpoint_every': 2,
+              'params': {'learning_rate': 0.008, 'momentum': 0.9},
+              'build_fn': context.build_toy_model,
+              'load_fn': context.load_toy_model}
+    for directory in ['trial_full', 'trial_resumed', 'trial_tuned']:
+        shutil.rmtree(directory, ignore_errors=True)
+    # Test case 1: uninterrupted training
+    full, state = test.train_with_checkpoints(trial_path, 'trial_full',
+                                              **kwargs)
+    assert state['finished'] and len(state['history']) == 3
+    assert state['history'][-1] < state['history'][0]
+    # Test case 2: interrupted every 5 batches, then resumed
+    runs = 0
+    finished = False
+    while not finished:
+        resumed, state_2 = test.train_with_checkpoints(
+            trial_path, 'trial_resumed', max_batches=5, **kwargs)
+        finished = state_2['finished']
+        runs += 1
+    assert runs == 5  # 7 batches per epoch
+    assert np.allclose(resumed.weights, full.weights)
+    assert np.allclose(state_2['history'], state['history'])
+    # Only the last checkpoint is kept
+    assert [name for name in os.listdir('trial_resumed') if
+            name.startswith('model')] == [state_2['model']]
+    # Test case 3: warm-starting from a saved model
+    saved_model = os.path.join('trial_full', state['model'])
+    tuned, state_3 = test.train_with_checkpoints(
+        trial_path, 'trial_tuned', warm_start=saved_model,
+        **dict(kwargs, epochs=1))
+    assert state_3['history'][0] < state['history'][0]
+    for directory in ['trial_full', 'trial_resumed', 'trial_tuned']:
+        shutil.rmtree(directory)
+    os.remove(trial_path)
+
+    return
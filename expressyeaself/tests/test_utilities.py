@@ -3,7 +3,11 @@ This script contains the unit tests for the functions found in
 the utilities.py script.
 """
 import expressyeaself.tests.context as context
+import json
 import os
+import shutil
+import subprocess
+import sys
 
 test = context.utilities
 
@@ -34,6 +38,74 @@ def test_smart_open():
     return
 
 
+def test_set_work_dir():
+    """
+    Tests the functions that set and get the work directory that
+    output files are written under.
+    """
+    # Test case 1: default, set and in-memory work directories
+    assert test.get_work_dir() == test.ROOT_DIR
+    work_dir = test.set_work_dir('trial_work_dir')
+    assert work_dir == os.path.abspath('trial_work_dir') + '/'
+    path = test.get_output_path('example/processed_data/trial_file.txt')
+    assert path == work_dir + 'example/processed_data/trial_file.txt'
+    assert os.path.isdir(os.path.dirname(path))
+    in_memory = test.set_work_dir(in_memory=True)
+    assert test.get_work_dir() == in_memory and os.path.isdir(in_memory)
+    os.rmdir(in_memory)
+    # Test case 2: the environment variable applies to other modules
+    test.set_work_dir(None)
+    os.environ[test.WORK_DIR_ENV] = work_dir
+    try:
+        raw_path = context.generate_data.generate_raw_library(10, seed=0)
+    finally:
+        del os.environ[test.WORK_DIR_ENV]
+    assert raw_path.startswith(work_dir) and os.path.exists(raw_path)
+    shutil.rmtree(work_dir)
+
+    return
+
+
+def test_atomic_open():
+    """
+    Tests the function that opens a file for writing atomically.
+    """
+    filename = 'trial_file.txt'
+    if os.path.exists(filename):
+        os.remove(filename)
+    # Test case 1: the file only appears once closed
+    with test.atomic_open(filename, 'w') as f:
+        f.write('This is a test')
+        assert not os.path.exists(filename)
+    with test.smart_open(filename, 'r') as f:
+        assert f.read() == 'This is a test'
+    # Test case 2: an error leaves the existing file untouched
+    try:
+        with test.atomic_open(filename, 'w') as f:
+            f.write('Partial')
+            raise ValueError
+    except ValueError:
+        pass
+    with test.smart_open(filename, 'r') as f:
+        assert f.read() == 'This is a test'
+    assert not [name for name in os.listdir('.')
+                if name.startswith('.') and name.endswith(filename)]
+    # Test case 3: compressed files
+    with test.atomic_open(filename + '.gz', 'w') as f:
+        f.write(b'This is a test')
+    with test.smart_open(filename + '.gz', 'r') as f:
+        assert f.read() == b'This is a test'
+    os.remove(filename)
+    os.remove(filename + '.gz')
+    # Test case 4: temporary paths are unique, beside the file
+    temp_path = test.get_temp_path(os.path.abspath('model.hdf5'))
+    assert os.path.dirname(temp_path) == os.path.abspath('.')
+    assert temp_path.endswith('_model.hdf5')
+    assert temp_path != test.get_temp_path(os.path.abspath('model.hdf5'))
+
+    return
+
+
 def test_get_time_stamp():
     """
     Tests the function that produces a unique time stamp.
@@ -50,6 +122,9 @@ def test_get_time_stamp():
         if idx != -1:
             raise AssertionError('Function not removing non-digit characters\
                                  correctly.')
+    # Test case 3: the time is followed by a random suffix
+    time_part, suffix = test_stamp_1.split('_')
+    assert time_part.isdigit() and len(suffix) == 8
 
     return
 
@@ -82,6 +157,19 @@ def test_get_seq_count():
     return
 
 
+def test_read_seq_batches():
+    """
+    Tests the generator that reads batches of sequences from an open
+    file.
+    """
+    lines = ['number_of_seqs_in_file\t3\n', 'length_of_each_sequence\t4\n',
+             'ATGC\t1.0\n', '\n', b'AAAA\n', 'CCCC\t2.0\n']
+    batches = list(test.read_seq_batches(iter(lines), 2))
+    assert batches == [['ATGC', 'AAAA'], ['CCCC']]
+
+    return
+
+
 def test_separate_seq_and_e_data():
     """
     Test the function that takes a line of an input file and
@@ -111,6 +199,26 @@ def test_separate_seq_and_e_data():
     return
 
 
+def test_separate_seq_and_els_data():
+    """
+    Tests the function that separates a sequence from several tab
+    separated expression levels.
+    """
+    # Test case 1: known line, extra columns ignored
+    seq, els = test.separate_seq_and_els_data('ATGC\t1\t2.5\t3\t7', 3)
+    assert seq == 'ATGC'
+    assert els == [1.0, 2.5, 3.0]
+    # Test case 2: too few expression levels
+    try:
+        test.separate_seq_and_els_data('ATGC\t1', 2)
+    except IndexError:
+        pass
+    else:
+        raise AssertionError('Missing expression levels should raise.')
+
+    return
+
+
 def test_check_valid_line():
     """
     Tests the function that checks the validity of a line from an
@@ -131,3 +239,45 @@ def test_check_valid_line():
     assert test.check_valid_line(trial_line.encode()) == trial_line
 
     return
+
+
+def test_get_saved_model_path():
+    """
+    Tests the function that returns the path of a pre-trained model.
+    """
+    # Test case 1: valid model
+    saved_model = test.get_saved_model_path('1d_cnn_sequential')
+    assert saved_model.startswith(test.ROOT_DIR)
+    assert os.path.exists(saved_model)
+    # Test case 2: unknown model
+    try:
+        test.get_saved_model_path('not_a_model')
+    except AssertionError:
+        pass
+
+    return
+
+
+def test_startup_time():
+    """
+    Benchmarks the time taken to import the preprocessing modules in
+    a fresh interpreter, and checks that no heavy dependencies are
+    imported with them.
+    """
+    heavy = ['matplotlib', 'numpy', 'pandas', 'scipy', 'sklearn',
+             'tensorflow']
+    code = ('import json, sys, time\n'
+            't = time.time()\n'
+            'import expressyeaself.utilities\n'
+            'import expressyeaself.build_promoter\n'
+            'import expressyeaself.organize_data\n'
+            'import expressyeaself.process_data\n'
+            'print(json.dumps([time.time() - t, '
+            '[m for m in %s if m in sys.modules]]))' % (heavy))
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=test.ROOT_DIR)
+    seconds, loaded = json.loads(output.decode().strip().split('\n')[-1])
+    assert loaded == [], 'Heavy modules imported at startup: %s' % (loaded)
+    assert seconds < 0.5, 'Startup took %.3f s' % (seconds)
+
+    return
@@ -0,0 +1,275 @@
+"""
+This script contains a training driver for the neural network models
+that can be interrupted and resumed exactly. Training runs batch by
+batch over a memory mapped copy of the encoded data, in an order
+fixed by the seed and the epoch, and is regularly checkpointed to a
+directory: the model (with its optimizer state) and the position in
+the data (epoch and batch) are saved together, so a resumed run
+carries on from the last checkpoint as if it had never stopped.
+Training can also be warm-started from an existing saved model, to
+fine-tune it on only a new batch of sequencing data.
+"""
+import expressyeaself.cross_validation as cross_validation
+from expressyeaself.utilities import atomic_open as atomic_open
+from expressyeaself.utilities import get_output_path as get_output_path
+from expressyeaself.utilities import (get_saved_model_path as
+                                      get_saved_model_path)
+from expressyeaself.utilities import get_temp_path as get_temp_path
+from expressyeaself.utilities import get_time_stamp as get_time_stamp
+from expressyeaself.utilities import MODELS_TO_USE as MODELS_TO_USE
+import json
+import numpy as np
+import os
+
+STATE_FILE = 'training_state.json'
+
+
+def get_epoch_order(num_seqs, epoch, seed):
+    """
+    Returns the order the sequences are trained on in an epoch,
+    which depends only on the seed and the epoch, so that it can be
+    reproduced when training is resumed.
+    """
+    return np.random.RandomState([seed, epoch]).permutation(num_seqs)
+
+
+def build_keras_model(model_type, len_seq, params=None):
+    """
+    Builds a new Keras model with one of the builders of
+    construct_neural_net (see hyperparameter_sweep.BUILDERS).
+    """
+    import expressyeaself.construct_neural_net as construct
+    import expressyeaself.hyperparameter_sweep as sweep
+    builder = getattr(construct, sweep.BUILDERS[model_type])
+
+    return builder(len_seq, **(params or {}))
+
+
+def load_keras_model(saved_model):
+    """
+    Loads a Keras model, with its optimizer state, from a .hdf5
+    file.
+    """
+    import expressyeaself.construct_neural_net as construct
+
+    return construct.load_saved_model(saved_model)
+
+
+def set_learning_rate(model, learning_rate):
+    """
+    Sets the learning rate of a compiled Keras model's optimizer.
+    """
+    import tensorflow as tf
+    tf.keras.backend.set_value(model.optimizer.lr, learning_rate)
+
+    return
+
+
+def read_training_state(checkpoint_dir):
+    """
+    Returns the training state saved in a checkpoint directory, or
+    None if there is no checkpoint to resume from.
+    """
+    state_path = os.path.join(checkpoint_dir, STATE_FILE)
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, 'r') as f:
+        state = json.load(f)
+
+    return state
+
+
+def save_checkpoint(model, state, checkpoint_dir):
+    """
+    Saves a checkpoint: the model (with its optimizer state) to a new
+    .hdf5 file, then the training state pointing to it. The state is
+    only replaced once the model is completely written, so a run
+    killed mid-save resumes from the previous checkpoint.
+
+    Returns:
+    -----
+        state (dict) -- the training state, pointing to the new
+        model file.
+    """
+    model_name = 'model_epoch_%d_batch_%d.hdf5' % (state['epoch'],
+                                                   state['batch'])
+    model_path = os.path.join(checkpoint_dir, model_name)
+    temp_path = get_temp_path(model_path)
+    try:
+        model.save(temp_path)
+        os.replace(temp_path, model_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    old_model = state.get('model')
+    state = dict(state, model=model_name)
+    with atomic_open(os.path.join(checkpoint_dir, STATE_FILE), 'w') as f:
+        json.dump(state, f, indent=1)
+    if old_model and old_model != model_name:
+        old_path = os.path.join(checkpoint_dir, old_model)
+        if os.path.exists(old_path):
+            os.remove(old_path)
+
+    return state
+
+
+def train_with_checkpoints(input_seqs, checkpoint_dir=None,
+                           model_type='1d_cnn', params=None, warm_start=None,
+                           learning_rate=None, epochs=10, batch_size=128,
+                           checkpoint_every=500, max_batches=None,
+                           scale_els=True, num_targets=1, seed=0,
+                           build_fn=build_keras_model,
+                           load_fn=load_keras_model):
+    """
+    Trains a model on a processed data file, checkpointing as it
+    goes. If the checkpoint directory already holds a checkpoint,
+    training is resumed from it: the model and its optimizer state
+    are reloaded and the remaining batches are trained in exactly the
+    order they would have been had the run not been interrupted.
+
+    Args:
+    -----
+        input_seqs (str) -- the absolute path of the processed data
+        file to train on, i.e. only the new records when
+        fine-tuning.
+
+        checkpoint_dir (str) -- the absolute path of the directory
+        the checkpoints are saved in, and resumed from. Default:
+        None (a new time stamped directory in
+        expressyeaself/models/checkpoints/ under the work
+        directory).
+
+        model_type (str) -- the model to build, '1d_cnn',
+        '1d_loccon' or 'lstm'. Ignored if warm-starting.
+        Default: '1d_cnn'.
+
+        params (dict) -- keyword arguments of the model's builder.
+        Default: None.
+
+        warm_start (str) -- one of MODELS_TO_USE, or the absolute
+        path of a saved .hdf5 model, to start training from instead
+        of a new model. Default: None.
+
+        learning_rate (float) -- if given, the learning rate of the
+        optimizer is set to this at the start of training, i.e. a
+        lower rate for fine-tuning. Default: None.
+
+        epochs (int) -- the number of epochs to train for.
+        Default: 10.
+
+        batch_size (int) -- the number of sequences per batch.
+        Default: 128.
+
+        checkpoint_every (int) -- the number of batches between
+        checkpoints. A checkpoint is also saved at the end of every
+        epoch. Default: 500.
+
+        max_batches (int) -- if given, training stops (with a
+        checkpoint) after this many batches in this call, i.e. to
+        fit a run into a fixed time slot. Default: None.
+
+        scale_els (bool) -- if True, scales the expression levels to
+        between -1 and 1, as encode_sequences_with_method does.
+        When fine-tuning, use the same scaling as the original
+        model was trained with. Default: True.
+
+        num_targets (int) -- the number of expression levels after
+        each sequence, all learned by one multi-output model (built
+        with 'num_outputs=num_targets'). Default: 1.
+
+        seed (int) -- the seed of the order of the sequences.
+        Default: 0.
+
+        build_fn (function) -- builds a new model, called as
+        build_fn(model_type, len_seq, params). Default:
+        build_keras_model.
+
+        load_fn (function) -- loads a model from a saved file.
+        Default: load_keras_model.
+
+    Returns:
+    -----
+        model (tensorflow.keras.Model) -- the trained model.
+
+        state (dict) -- the training state, with the mean loss of
+        each completed epoch ('history'), whether training has
+        finished ('finished') and the model file of the last
+        checkpoint ('model').
+    """
+    # Assertions
+    assert isinstance(epochs, int) and epochs > 0, 'epochs must be a \
+    positive integer.'
+    assert isinstance(batch_size, int) and batch_size > 0, 'batch_size must \
+    be a positive integer.'
+    assert isinstance(checkpoint_every, int) and checkpoint_every > 0, \
+        'checkpoint_every must be a positive integer.'
+    assert isinstance(seed, int), 'seed must be an integer, so that the \
+    order of the sequences can be reproduced.'
+    # Functionality
+    if checkpoint_dir is None:
+        checkpoint_dir = get_output_path('expressyeaself/models/checkpoints/'
+                                         + get_time_stamp() + '_' +
+                                         model_type + '/')
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    state = read_training_state(checkpoint_dir)
+    if state is None:
+        seqs_path, els_path = cross_validation.encode_to_memmap(
+            input_seqs, os.path.join(checkpoint_dir, 'data'), scale_els,
+            num_targets=num_targets)
+        state = {'input_seqs': os.path.abspath(input_seqs),
+                 'seqs_path': seqs_path, 'els_path': els_path,
+                 'epochs': epochs, 'batch_size': batch_size, 'seed': seed,
+                 'epoch': 0, 'batch': 0, 'loss_sum': 0.0, 'history': [],
+                 'warm_start': warm_start, 'model': None}
+    else:
+        assert state['input_seqs'] == os.path.abspath(input_seqs), 'The \
+        checkpoint is of training on %s.' % (state['input_seqs'])
+        state['epochs'] = epochs
+    encoded_seqs = np.load(state['seqs_path'], mmap_mode='r')
+    exp_levels = np.load(state['els_path'], mmap_mode='r')
+    num_seqs, len_seq = encoded_seqs.shape[0], encoded_seqs.shape[1]
+    if state['model'] is not None:
+        model = load_fn(os.path.join(checkpoint_dir, state['model']))
+    elif warm_start is not None:
+        if warm_start in MODELS_TO_USE:
+            warm_start = get_saved_model_path(warm_start)
+        model = load_fn(warm_start)
+        if learning_rate is not None:
+            set_learning_rate(model, learning_rate)
+    else:
+        if num_targets > 1:
+            params = dict(params or {}, num_outputs=num_targets)
+        model = build_fn(model_type, len_seq, params)
+        if learning_rate is not None:
+            set_learning_rate(model, learning_rate)
+    num_batches = int(np.ceil(num_seqs / state['batch_size']))
+    batches_run = 0
+    while state['epoch'] < state['epochs']:
+        order = get_epoch_order(num_seqs, state['epoch'], state['seed'])
+        while state['batch'] < num_batches:
+            start = state['batch'] * state['batch_size']
+            indices = np.sort(order[start:start + state['batch_size']])
+            loss = model.train_on_batch(
+                encoded_seqs[indices].astype(np.float32),
+                np.asarray(exp_levels[indices], dtype=np.float32))
+            state['loss_sum'] += float(np.ravel(loss)[0]) * len(indices)
+            state['batch'] += 1
+            batches_run += 1
+            if state['batch'] == num_batches:
+                break
+            if batches_run == max_batches:
+                state = save_checkpoint(model, state, checkpoint_dir)
+                state['finished'] = False
+                return model, state
+            if state['batch'] % checkpoint_every == 0:
+                state = save_checkpoint(model, state, checkpoint_dir)
+        state['history'].append(state['loss_sum'] / num_seqs)
+        state['epoch'] += 1
+        state['batch'] = 0
+        state['loss_sum'] = 0.0
+        state = save_checkpoint(model, state, checkpoint_dir)
+        if batches_run == max_batches:
+            break
+    state['finished'] = state['epoch'] >= state['epochs']
+
+    return model, state
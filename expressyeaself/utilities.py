@@ -5,6 +5,21 @@ of the project.
 import datetime as dt
 import gzip
 import os
+import uuid
+
+# The root directory of the repository, containing example/ and expressyeaself/
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/'
+# Environment variable that relocates all output files (see get_work_dir)
+WORK_DIR_ENV = 'EXPRESSYEASELF_WORK_DIR'
+MODELS_TO_USE = ['1d_cnn_classifier',
+                 '1d_cnn_sequential',
+                 '1d_cnn_parallel',
+                 '1d_cnn_student',
+                 '1d_loccon_classifier',
+                 'lstm_sequential_2d',
+                 'lstm_sequential_3d']
+
+work_dir = None  # set by set_work_dir()
 
 
 def smart_open(filename, mode='r'):
@@ -45,12 +60,179 @@ def smart_open(filename, mode='r'):
     return file
 
 
+def set_work_dir(path=None, in_memory=False):
+    """
+    Sets the work directory that all output and intermediate files
+    are written under (in place of the repository checkout), i.e.
+    a directory on a local NVMe disk or tmpfs. Takes precedence over
+    the EXPRESSYEASELF_WORK_DIR environment variable.
+
+    Args:
+    -----
+        path (str) -- the path of the work directory, created if it
+        does not exist. If None (and not 'in_memory'), the work
+        directory is reset to its default. Default: None.
+
+        in_memory (bool) -- if True, a new, uniquely named work
+        directory is created on the in-memory /dev/shm file system
+        (or the default temporary directory if there is none), so
+        that intermediate files never touch disk. Default: False.
+
+    Returns:
+    -----
+        work_dir (str) -- the absolute path of the work directory,
+        or None if it was reset.
+    """
+    import tempfile
+    global work_dir
+    # Assertions
+    assert isinstance(path, (str, type(None))), 'Work directory path must \
+    be passed as a string.'
+    assert path is None or not in_memory, 'Cannot give both a path and \
+    in_memory=True.'
+    # Functionality
+    if in_memory:
+        shm = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        path = tempfile.mkdtemp(prefix='expressyeaself_', dir=shm)
+    if path is None:
+        work_dir = None
+    else:
+        work_dir = os.path.join(os.path.abspath(path), '')
+        os.makedirs(work_dir, exist_ok=True)
+
+    return work_dir
+
+
+def get_work_dir():
+    """
+    Returns the absolute path (ending in '/') of the work directory
+    that output files are written under: the directory given to
+    set_work_dir() if any, else the EXPRESSYEASELF_WORK_DIR
+    environment variable if set, else the repository root.
+    """
+    if work_dir is not None:
+        return work_dir
+    if os.environ.get(WORK_DIR_ENV):
+        return os.path.join(os.path.abspath(os.environ[WORK_DIR_ENV]), '')
+
+    return ROOT_DIR
+
+
+def get_output_path(relative_path):
+    """
+    Returns the absolute path of an output file (or directory, if
+    'relative_path' ends in '/') under the work directory, creating
+    its parent directories if needed.
+
+    Args:
+    -----
+        relative_path (str) -- the path relative to the work
+        directory, i.e. 'example/processed_data/<stamp>_seqs.txt'.
+
+    Returns:
+    -----
+        absolute_path (str) -- the absolute path of the output.
+    """
+    # Assertions
+    assert isinstance(relative_path, str), 'Relative path must be passed \
+    as a string.'
+    # Functionality
+    absolute_path = os.path.join(get_work_dir(), relative_path)
+    os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
+
+    return absolute_path
+
+
+def get_temp_path(filename):
+    """
+    Returns a temporary path in the same directory as 'filename',
+    unique across processes and hosts, to write a file to before
+    moving it to 'filename' with os.replace(). Keeps the name of the
+    file as a suffix, so its extension (i.e. '.gz' or '.hdf5') is
+    kept.
+    """
+    directory, name = os.path.split(os.path.abspath(filename))
+
+    return os.path.join(directory, '.%d_%s_%s' % (
+        os.getpid(), uuid.uuid4().hex[:12], name))
+
+
+class AtomicFile(object):
+    """
+    A file opened for writing that only appears at its path once it
+    is closed without error. Data is written to a uniquely named
+    temporary file in the same directory, which is then renamed
+    over the path with os.replace(), so concurrent processes and
+    readers never see a partially written file. Compressed with gzip
+    if the path ends in '.gz', as with smart_open().
+
+    Args:
+    -----
+        filename (str) -- the absolute path of the file.
+
+        mode (str) -- the opening mode, as for smart_open(), i.e.
+        'w' or 'wb'. Default: 'w'.
+    """
+    def __init__(self, filename, mode='w'):
+        # Assertions
+        assert isinstance(filename, str), 'Output file pathname must be a \
+        string.'
+        assert mode.startswith('w'), 'Atomic files can only be opened for \
+        writing.'
+        # Functionality
+        self.name = filename
+        self.temp_name = get_temp_path(filename)
+        self.file = smart_open(self.temp_name, mode)
+
+    def __getattr__(self, attr):
+        return getattr(self.file, attr)
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def close(self):
+        """
+        Closes the temporary file and moves it to the file's path.
+        """
+        if not self.file.closed:
+            self.file.close()
+            os.replace(self.temp_name, self.name)
+
+    def discard(self):
+        """
+        Closes and removes the temporary file, leaving the file's
+        path untouched.
+        """
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.temp_name):
+            os.remove(self.temp_name)
+
+
+def atomic_open(filename, mode='w'):
+    """
+    Opens a file for writing atomically (see AtomicFile).
+    """
+    return AtomicFile(filename, mode)
+
+
 def get_time_stamp():
     """
-    Creates a unique time stamp number containing no other character
-    than digits 0~9.
+    Creates a unique time stamp of digits 0~9, followed by an
+    underscore and 8 random hex characters so that runs started in
+    the same microsecond (in other processes, or on other hosts
+    sharing the work directory) never name their outputs the same.
     For instance:
-    '2019-05-17 17:04:19.923192' ---> '20190517170419923192'
+    '2019-05-17 17:04:19.923192' ---> '20190517170419923192_3f2a9c01'
 
     Args:
     -----
@@ -58,12 +240,12 @@ def get_time_stamp():
 
     Returns:
     -----
-        time_stamp (str) -- a unique numerical string of the
-        current time.
+        time_stamp (str) -- a unique string of the current time.
     """
     time_stamp = str(dt.datetime.now())
     time_stamp = time_stamp.replace(' ', '').replace('-', '')
     time_stamp = time_stamp.replace('.', '').replace(':', '')
+    time_stamp += '_' + uuid.uuid4().hex[:8]
 
     return time_stamp
 
@@ -97,6 +279,27 @@ def get_seq_count(infile):
     return count
 
 
+def read_seq_batches(infile, batch_size):
+    """
+    A generator that reads batches of sequences (the first tab
+    separated field of each non-empty line) from an open file.
+    """
+    batch = []
+    for line in infile:
+        if isinstance(line, bytes):
+            line = line.decode()
+        seq = line.rstrip('\n').split('\t')[0].strip()
+        if seq == '' or seq in ('number_of_seqs_in_file',
+                                'length_of_each_sequence'):
+            continue
+        batch.append(seq)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
 def separate_seq_and_el_data(line):
     """
     Takes a string containing a nucleotide sequence and its expression
@@ -128,6 +331,42 @@ def separate_seq_and_el_data(line):
     return seq, exp_level
 
 
+def separate_seq_and_els_data(line, num_els):
+    """
+    Takes a string containing a nucleotide sequence followed by
+    several expression levels (i.e. one per replicate or growth
+    condition) - all tab separated - and returns the sequence as a
+    string and the expression levels as a list of floats.
+
+    Args:
+    -----
+        line (str) -- the input line containing the sequence and
+        expression levels (tab separated) to be separated.
+
+        num_els (int) -- the number of expression levels to read
+        after the sequence.
+
+    Returns:
+    -----
+        seq (str) -- the nucleotide sequence.
+
+        exp_levels (list) -- the expression levels of the sequence.
+    """
+    # Assertions
+    assert isinstance(line, str), 'Input line must be passed as a string.'
+    assert isinstance(num_els, int) and num_els > 0, 'num_els must be a \
+    positive integer.'
+    # Functionality
+    data = line.rstrip().split('\t')
+    if len(data) < num_els + 1:
+        raise IndexError('Input line must have the sequence and %s \
+                         expression levels tab separated.' % (num_els))
+    seq = data[0]
+    exp_levels = [float(el) for el in data[1:num_els + 1]]
+
+    return seq, exp_levels
+
+
 def check_valid_line(line):
     """
     Takes an line from an input file containing sequence and
@@ -159,3 +398,39 @@ def check_valid_line(line):
         line = 'skip_line'
 
     return line
+
+
+def get_saved_model_path(model_to_use):
+    """
+    Returns the absolute file path of one of ExpressYeaself's
+    pre-trained models, based on the choice of model to use.
+
+    Args:
+    -----
+        model_to_use (str) -- the type of pre-existing model to
+        load.
+
+    Returns:
+    -----
+        saved_model_json (str) -- the absolute file path of the
+        saved model json file.
+
+        saved_model_weights (str) -- the absolute file path of
+        saved model weights.
+    """
+    # Assertions
+    assert isinstance(model_to_use, str)
+    assert model_to_use in MODELS_TO_USE
+    # Functionality
+    saved_model = ROOT_DIR + 'expressyeaself/models/'
+    if model_to_use.startswith('1d_cnn'):
+        saved_model += '1d_cnn/'
+        saved_model += 'saved_models/' + model_to_use + '_onehot.hdf5'
+    elif model_to_use.startswith('1d_loccon'):
+        saved_model += '1d_loccon/'
+        saved_model += 'saved_models/' + model_to_use + '_onehot.hdf5'
+    elif model_to_use.startswith('lstm'):
+        saved_model += 'lstm/'
+        saved_model += 'saved_models/' + model_to_use + '_onehot.hdf5'
+
+    return saved_model